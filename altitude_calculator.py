@@ -1,24 +1,51 @@
 '''
     File name: altitude_calculator.py
     Author: Jason Scharff
-    Python Version: 2.7
+    Python Version: 3.6
     Description: Provides a series of functions to add altitude to all of the data even though
     the pressure data was stored in a separate file from the rest of the sensors. 
     All data matching is done using UNIX timestamps expected in each dataset.
 
-    There is no entry point for this program. Functions are designed to be called as needed.
+    There is no entry point for this program. Functions are designed to be called as needed,
+    or chained together from the command line with pipeline.py.
 '''
 
+#import binascii to write the digests of rows as text while deduplicating large files.
+import binascii
+#import collections for the deque used to remember the most recent rows while deduplicating.
+import collections
 #import the python CSV module to interface with the datasets which are all csvs.
 import csv
+#import hashlib to keep fixed size digests of rows while deduplicating.
+import hashlib
+#import the heapq module to merge the time sorted sensor files with a heap.
+import heapq
+#import json to store rows in the temporary files used to deduplicate files too big for memory.
+import json
 #implement the math module to gain access to the logarithm function for the calculation of 
 #altitude per the NASA model.
 import math
+#import operator for itemgetter, used to get the time out of both dictionaries and compact rows.
+import operator
+#import os and shutil to manage the temporary files used to deduplicate files too big for memory.
+import os
+import shutil
 #import the system module to get access to the MAX_INT property used in the function fill_in_missing_points
 #usage explained in the documentation for that function.
 import sys
+#import tempfile to create a directory for the temporary files used to deduplicate files too big for memory.
+import tempfile
 #import the uuid module to append to csvs to guarantee uniqueness in filenames avoiding ovewrwrites.
 import uuid
+#import numpy to calculate altitude for a whole batch of pressures at once.
+import numpy
+
+#import the compact_rows module to read and write the large files as lists of cells rather than dictionaries.
+import compact_rows
+#import the csv_cache module to load the columns of the sensor csvs as numpy arrays without parsing them every time.
+import csv_cache
+#import the instrumentation module to record the rows, bytes and time of each function when it is enabled.
+import instrumentation
 
 #A list of all keys to use in a master file containing all of the data
 #this list will in turn be the header row on any master csv files created.
@@ -28,6 +55,13 @@ KEYS = ['time', 'calculated_altitude', 'interior_temperature', 'interior_pressur
         'gps_timestamp', 'lat', 'lat_direction', 'lng', 'lng_direction',
         'fix_quality', 'num_satelites', 'hdop', 'height_geoid_ellipsoid']
 
+#the approximation of sea level pressure in pascals from the NASA model.
+#for relative altitude this should be replaced by the pressure at launch.
+SEA_LEVEL_PRESSURE = 101290.0
+
+#the number of rows to calculate altitude for at once in the functions that read a CSV.
+CHUNK_SIZE = 4096
+
 
 #function to concatinate all of the CSV files created during the launch into one
 #single CSV. The output of this function will contain many rows with empty keys.
@@ -35,83 +69,153 @@ KEYS = ['time', 'calculated_altitude', 'interior_temperature', 'interior_pressur
 #arg, pressure: the filename of the csv with the data from the pressure arduino.
 #arg, gps: the filename of the csv with the data from the gps arduino.
 #arg interior, the filename of the csv with the data from the interior pressure/temperature/humidity sensor.
+@instrumentation.instrumented(inputs=('geiger', 'pressure', 'gps', 'interior'),
+                              outputs=(lambda arguments: 'master_unprocessed.csv',))
 def generate_combined_spreadsheet(geiger, pressure, gps, interior):
-    #open the geiger counter file as a list of dictionaries.
-    geiger_reader = csv.DictReader(open(geiger))
-    #open the pressure file as a list of dictionaries.
-    pressure_reader = csv.DictReader(open(pressure))
-    #open the gps file as a list of dictionaries.
-    gps_reader = csv.DictReader(open(gps))
-    #open the interior pressure/humidity/temperature file as a list of dictionaries.
-    interior_reader = csv.DictReader(open(interior))
-
+    name = 'altitude_calculator.generate_combined_spreadsheet'
+    #each sensor file with the columns to rename in it (see the *_RENAMES variables below).
+    sources = [(geiger, GEIGER_RENAMES), (pressure, PRESSURE_RENAMES), (gps, GPS_RENAMES),
+               (interior, INTERIOR_RENAMES)]
 
     #create a new file to use as the master concatenation of all.
     with open ('master_unprocessed.csv', 'w') as new_file:
-        #open this new file as a dictionary writer so rows can be written in the form of a dictionary.
         #the keys for this csv is the KEYS global variable.
-        writer = csv.DictWriter(new_file, KEYS)
+        writer = csv.writer(new_file)
         #write header row (the top row listing the keys) into the newly created csv
-        writer.writeheader()
-        #iterate through the geiger counter file
-        for row in geiger_reader:
-            #add each row for the geiger counter into the master list.
-            writer.writerow(row)
-        for row in pressure_reader:
-            #rename estimated_altitude (altitude calculation from Adafruit BME280) to estimated_bme_altitude
-            #by adding a new item into the dictionary called estimated_bme_altitude equal to estimated_altitude
-            row['estimated_bme_altitude'] = row['estimated_altitude']
-            #remove the old name for estimated_bme_altitude from the dictionary
-            row.pop('estimated_altitude')
-            #write the row into the new csv.
-            writer.writerow(row)
-        #iterate through the gps csv.
-        for row in gps_reader:
-            #rename altitude (taken from gps) to estimated_gps_altitude by adding a new item
-            #into the dictionary called estimated_gps_altitude equal to altitude
-            row['estimated_gps_altitude'] = row['altitude']
-            #remove the old name for estimated_gps_altitude from the dictionary
-            row.pop('altitude')
-            #write the row into the new CSV.
-            writer.writerow(row)
-        #iterate through the interior temperature/pressure/humidity sensor gps.
-        for row in interior_reader:
-            #rename temperature to interior_temperature to distinguish it from exterior_temperature
-            #by adding a new key called interior_temperature equal to temperature
-            row['interior_temperature'] = row['temperature']
-            #remove old name for interior_temperature
-            row.pop('temperature')
-
-            #rename humidity to interior_humidity to distinguish it from exterior_humidity
-            #by adding a new key called interior_humidity equal to humidity
-            row['interior_humidity'] = row['humidity']
-            #remove old name for interior_humidity
-            row.pop('humidity')
-
-            #rename pressure to interior_pressure to distinguish it from exterior_pressure
-            #by adding a new key called interior_pressure equal to pressure
-            row['interior_pressure'] = row['pressure']
-            #remove old name for interior_pressure
-            row.pop('pressure')
-
-            #write row into the new CSV.
-            writer.writerow(row)
-
-
-generate_combined_spreadsheet('geiger.csv', 'pressure.csv', 'gps.csv', 'interior.csv')
+        writer.writerow(KEYS)
+        #write the rows of each file one file after another, with their columns renamed and moved to
+        #where they are in KEYS (a compact row projection compiled once per file).
+        for filename, renames in sources:
+            writer.writerows(instrumentation.counted(name, 'rows_in',
+                                                     compact_rows.read_projected_rows(filename, KEYS, renames)))
+
+
+#the columns to rename in each sensor file when combining them into a master file
+#(the same renames generate_combined_spreadsheet does one row at a time).
+#the geiger counter file needs no renames.
+GEIGER_RENAMES = {}
+#rename estimated_altitude (altitude calculation from Adafruit BME280) to estimated_bme_altitude
+PRESSURE_RENAMES = {'estimated_altitude': 'estimated_bme_altitude'}
+#rename altitude (taken from gps) to estimated_gps_altitude
+GPS_RENAMES = {'altitude': 'estimated_gps_altitude'}
+#rename temperature, humidity and pressure to distinguish them from the exterior measurements.
+INTERIOR_RENAMES = {'temperature': 'interior_temperature', 'humidity': 'interior_humidity',
+                    'pressure': 'interior_pressure'}
+
+
+#function to read a sensor csv as a stream of dictionaries with its columns renamed
+#to the names used in KEYS.
+#arg, filename: the filename of the sensor csv.
+#arg, renames: a dictionary of original column name to the column name in KEYS.
+def read_sensor_rows(filename, renames):
+    with open(filename, 'r') as sensor_file:
+        for row in csv.DictReader(sensor_file):
+            #add each renamed column and remove the old name.
+            for old_key, new_key in renames.items():
+                row[new_key] = row.pop(old_key)
+            yield row
+
+
+#function to merge several time sorted streams of rows into one time sorted stream
+#the same way a heap merge works. only one row from each stream is held at a time.
+#rows with the same time are taken in the order of the streams so the output matches
+#a stable sort of the streams written one after another.
+#arg, streams: a list of iterables of dictionaries that each have a time.
+#arg, out_of_order: a list with a counter for each stream. each counter is increased every time a row
+#has an earlier time than the row before it in the same stream (meaning that stream isn't sorted).
+#arg, time_of: a function getting the text of the time from a row (row['time'] by default). compact rows
+#pass operator.itemgetter of the position of the time.
+#arg, strict: if True raise a ValueError at the first row out of time order (after counting it) instead of
+#merging it.
+def merge_by_time(streams, out_of_order, time_of=None, strict=False):
+    if time_of is None:
+        time_of = operator.itemgetter('time')
+    #the heap holds (time, stream number, row) for the next row of every stream.
+    heap = []
+    #the time of the previous row read from each stream to check that every stream is sorted.
+    previous_times = [None] * len(streams)
+    iterators = [iter(stream) for stream in streams]
+
+    #function to push the next row from stream number index onto the heap (if there is one).
+    def push_next(index):
+        for row in iterators[index]:
+            time = float(time_of(row))
+            #report rows that go back in time.
+            if previous_times[index] is not None and time < previous_times[index]:
+                out_of_order[index] += 1
+                if strict:
+                    raise ValueError('stream %d is not sorted by time: %r comes after %r'
+                                     % (index, time, previous_times[index]))
+            previous_times[index] = time
+            heapq.heappush(heap, (time, index, row))
+            return
+
+    for index in range(len(iterators)):
+        push_next(index)
+    while len(heap) > 0:
+        #take the earliest row out of the heap and replace it with the next row from the same stream.
+        time, index, row = heapq.heappop(heap)
+        yield row
+        push_next(index)
+
+
+#function to concatinate all of the CSV files created during the launch into one
+#single CSV sorted by time without having to sort the output afterwards.
+#works like generate_combined_spreadsheet except that the rows of the four files are interleaved by time.
+#each of the input files must already be sorted by time.
+#arg, geiger: the filename of the csv with the data from the geiger arduino
+#arg, pressure: the filename of the csv with the data from the pressure arduino.
+#arg, gps: the filename of the csv with the data from the gps arduino.
+#arg interior, the filename of the csv with the data from the interior pressure/temperature/humidity sensor.
+#arg, output_name: the filename of the sorted master csv to create.
+#arg, strict: if True raise a ValueError as soon as an input file turns out not to be sorted by time,
+#and remove the part of the output written so far.
+#returns a dictionary of input filename to the number of rows in it that were out of time order.
+@instrumentation.instrumented(inputs=('geiger', 'pressure', 'gps', 'interior'), outputs=('output_name',))
+def generate_sorted_combined_spreadsheet(geiger, pressure, gps, interior, output_name='master_sorted.csv',
+                                         strict=False):
+    name = 'altitude_calculator.generate_sorted_combined_spreadsheet'
+    #each sensor file with its renames
+    sources = [(geiger, GEIGER_RENAMES), (pressure, PRESSURE_RENAMES), (gps, GPS_RENAMES),
+               (interior, INTERIOR_RENAMES)]
+    #read each file as compact rows already in the order of KEYS, so rows can be written as they come out of the heap.
+    streams = [instrumentation.counted(name, 'rows_in', compact_rows.read_projected_rows(filename, KEYS, renames))
+               for filename, renames in sources]
+    out_of_order = [0] * len(sources)
+    with open(output_name, 'w') as new_file:
+        try:
+            #the keys for this csv is the KEYS global variable.
+            writer = csv.writer(new_file)
+            writer.writerow(KEYS)
+            writer.writerows(instrumentation.counted(name, 'rows_out', merge_by_time(
+                streams, out_of_order, operator.itemgetter(KEYS.index('time')), strict)))
+        except Exception:
+            #don't leave a partial output behind.
+            new_file.close()
+            os.remove(output_name)
+            if strict and sum(out_of_order) > 0:
+                raise ValueError('input files are not sorted by time: ' +
+                                 ', '.join(sorted(filename for (filename, renames), count
+                                                  in zip(sources, out_of_order) if count > 0)))
+            raise
+    return dict((filename, count) for (filename, renames), count in zip(sources, out_of_order))
+
 
 #function to get altitude in meters from a given pressure using the NASA model
 #arg pressure, the pressure to get the altitude from in pascals
-def get_altitude_from_pressure(pressure):
+#arg reference_pressure, the pressure in pascals at altitude 0.
+def get_altitude_from_pressure(pressure, reference_pressure=SEA_LEVEL_PRESSURE):
     #convert pressure from pascals to kilopascals 
     pressure /= 1000
+    #convert the reference pressure from pascals to kilopascals
+    reference_pressure /= 1000
     #the NASA model is a piecewise function
     #if pressure is above 22.7 kilopascals apply certain function to get altitude
     if pressure > 22.707:
         #apply pressure function for pressure > 22.7 kilopascals.
         #note that for relative altitude the 101.29 should be the initial pressure
         #101.29 is just an approximation of sea level pressure from NASA.
-        altitude = 44397.5-44388.3 * ((pressure/101.29) ** .19026)
+        altitude = 44397.5-44388.3 * ((pressure/reference_pressure) ** .19026)
     #if the pressure is less than 2.48 kilo pascals apply another function to get altitude
     elif pressure < 2.483:
         #apply pressure function for <2.483 kilopascals
@@ -124,32 +228,288 @@ def get_altitude_from_pressure(pressure):
     return altitude
 
 
+#function to get altitudes in meters for a whole array of pressures at once using the NASA model.
+#gives the same results as calling get_altitude_from_pressure on each pressure, but evaluates each
+#piece of the piecewise function on every pressure it applies to at once.
+#arg pressures, a list or numpy array of pressures in pascals.
+#arg reference_pressure, the pressure in pascals at altitude 0.
+#returns a numpy array of altitudes in meters.
+def get_altitudes_from_pressures(pressures, reference_pressure=SEA_LEVEL_PRESSURE):
+    #convert pressures from pascals to kilopascals
+    pressures = numpy.asarray(pressures, dtype=numpy.float64) / 1000
+    #convert the reference pressure from pascals to kilopascals
+    reference_pressure /= 1000
+    altitudes = numpy.empty_like(pressures)
+    #the pressures above 22.7 kilopascals
+    high = pressures > 22.707
+    #the pressures below 2.483 kilopascals
+    low = pressures < 2.483
+    #the pressures between 2.48 and 22.7 kilopascals
+    middle = ~(high | low)
+    altitudes[high] = high_altitudes(pressures[high], reference_pressure)
+    altitudes[low] = low_altitudes(pressures[low], reference_pressure)
+    altitudes[middle] = middle_altitudes(pressures[middle], reference_pressure)
+    return altitudes
+
+
+#the three pieces of the NASA model for numpy arrays of pressures and a reference pressure in kilopascals.
+#pressures above 22.707 kilopascals
+def high_altitudes(pressures, reference_pressure):
+    return 44397.5 - 44388.3 * ((pressures / reference_pressure) ** .19026)
+
+
+#pressures below 2.483 kilopascals
+def low_altitudes(pressures, reference_pressure):
+    return 72441.47 * ((pressures / 2.488) ** -.0878) - 47454.96
+
+
+#pressures from 2.483 to 22.707 kilopascals
+def middle_altitudes(pressures, reference_pressure):
+    return 11019.12 - 6369.43 * numpy.log(pressures / 22.65)
+
+
+#the range of pressures in pascals covered by the lookup table of new_altitude_table.
+#altitudes for pressures outside it (including 0, where the model goes to infinity) are calculated exactly.
+TABLE_MIN_PRESSURE = 1.0
+TABLE_MAX_PRESSURE = 110000.0
+#the default largest error in meters of an altitude looked up in the table.
+TABLE_MAX_ERROR = 0.01
+#the default number of pressures new_altitude_evaluator remembers the altitude of.
+ALTITUDE_CACHE_SIZE = 65536
+
+
+#function to create a lookup table of altitudes to interpolate in instead of evaluating the NASA model.
+#each piece of the model gets its own table with knots spread evenly over the logarithm of the pressure
+#(in which the middle piece is a straight line and the other two are very nearly straight) and a knot
+#exactly on each boundary at 22.707 and 2.483 kilopascals. a pressure is only ever interpolated between
+#knots of its own piece, so the table never blends across a boundary and agrees with the model on both
+#sides of each one. the pieces of the model don't meet at the boundaries, and the table keeps the jumps
+#rather than smoothing them over: the altitude jumps by about 100 meters (from about 24,999 to 25,100)
+#just above 2.483 kilopascals and by about 3 meters (from about 11,000 to 11,003) at 22.707 kilopascals.
+#the knots are doubled until the error between every pair of knots is at most max_error.
+#arg reference_pressure: the pressure in pascals at altitude 0.
+#arg max_error: the largest error in meters allowed in the looked up altitudes.
+#returns the table, a dictionary to pass to table_altitudes.
+def new_altitude_table(reference_pressure=SEA_LEVEL_PRESSURE, max_error=TABLE_MAX_ERROR):
+    if max_error <= 0:
+        raise ValueError('max_error must be more than 0')
+    reference_kilopascals = reference_pressure / 1000
+    #each piece is (its function, its lowest and highest pressure in kilopascals).
+    pieces = [(low_altitudes, TABLE_MIN_PRESSURE / 1000, 2.483), (middle_altitudes, 2.483, 22.707),
+              (high_altitudes, 22.707, TABLE_MAX_PRESSURE / 1000)]
+    tables = []
+    for piece, lowest, highest in pieces:
+        knot_count = 2
+        while True:
+            logs = numpy.linspace(math.log(lowest), math.log(highest), knot_count)
+            values = piece(numpy.exp(logs), reference_kilopascals)
+            #the boundaries themselves, rather than the exponential of their logarithm.
+            values[0] = piece(numpy.array([lowest]), reference_kilopascals)[0]
+            values[-1] = piece(numpy.array([highest]), reference_kilopascals)[0]
+            #check the error a quarter, half and three quarters of the way between every pair of knots.
+            samples = numpy.concatenate([logs[:-1] + (logs[1:] - logs[:-1]) * fraction for fraction in (.25, .5, .75)])
+            error = numpy.max(numpy.abs(numpy.interp(samples, logs, values) -
+                                        piece(numpy.exp(samples), reference_kilopascals)))
+            if error <= max_error:
+                break
+            knot_count = 2 * knot_count - 1
+        tables.append({'logs': logs, 'values': values, 'error': float(error)})
+    return {
+        'reference_pressure': reference_pressure,
+        'max_error': max_error,
+        #the tables for pressures below 2.483, from 2.483 to 22.707 and above 22.707 kilopascals.
+        'low': tables[0],
+        'middle': tables[1],
+        'high': tables[2],
+    }
+
+
+#function to get altitudes in meters for an array of pressures from a table made by new_altitude_table.
+#arg table: the table.
+#arg pressures: a list or numpy array of pressures in pascals.
+#returns a numpy array of altitudes in meters, within the max_error of the table of get_altitudes_from_pressures.
+def table_altitudes(table, pressures):
+    pressures = numpy.asarray(pressures, dtype=numpy.float64)
+    kilopascals = pressures / 1000
+    altitudes = numpy.empty_like(kilopascals)
+    in_table = (pressures >= TABLE_MIN_PRESSURE) & (pressures <= TABLE_MAX_PRESSURE)
+    #the same pieces as get_altitudes_from_pressures.
+    high = kilopascals > 22.707
+    low = kilopascals < 2.483
+    middle = ~(high | low)
+    for name, piece in (('high', high), ('low', low), ('middle', middle)):
+        piece = piece & in_table
+        altitudes[piece] = numpy.interp(numpy.log(kilopascals[piece]), table[name]['logs'], table[name]['values'])
+    altitudes[~in_table] = get_altitudes_from_pressures(pressures[~in_table], table['reference_pressure'])
+    return altitudes
+
+
+#function to create an evaluator that remembers the altitude of the most recently used pressures, since
+#sensor files are full of the same pressure repeated. once cache_size pressures are remembered the least
+#recently used one is forgotten for each new one. the evaluator is a plain dictionary, and counts its
+#hits (pressures whose altitude was served from the cache), misses (pressures whose altitude had to be
+#calculated) and evictions (see altitude_cache_statistics).
+#arg reference_pressure: the pressure in pascals at altitude 0.
+#arg cache_size: the most pressures to remember (0 to remember none).
+#arg table: if True the altitudes that aren't remembered are looked up in a table from new_altitude_table
+#instead of being calculated exactly.
+#arg max_error: the largest error in meters of the table.
+def new_altitude_evaluator(reference_pressure=SEA_LEVEL_PRESSURE, cache_size=ALTITUDE_CACHE_SIZE, table=False,
+                           max_error=TABLE_MAX_ERROR):
+    return {
+        'reference_pressure': reference_pressure,
+        'cache_size': cache_size,
+        #pressure to altitude, least recently used first.
+        'cache': collections.OrderedDict(),
+        'table': new_altitude_table(reference_pressure, max_error) if table else None,
+        'hits': 0,
+        'misses': 0,
+        'evictions': 0,
+    }
+
+
+#function to get altitudes in meters for a list of pressures with an evaluator from new_altitude_evaluator.
+#each different pressure in the list is only looked up once, and only the ones that aren't remembered are
+#calculated (all at once). without a table the altitudes are exactly those of get_altitudes_from_pressures.
+#arg evaluator: the evaluator (updated in place).
+#arg pressures: a list or numpy array of pressures in pascals.
+#returns a list of altitudes in meters.
+def evaluate_altitudes(evaluator, pressures):
+    cache = evaluator['cache']
+    #the different pressures, and which of them each pressure in the list is.
+    unique, positions = numpy.unique(numpy.asarray(pressures, dtype=numpy.float64), return_inverse=True)
+    altitudes = numpy.empty(len(unique))
+    missing = []
+    for index, pressure in enumerate(unique.tolist()):
+        if pressure in cache:
+            #move the pressure to the most recently used end.
+            altitude = cache.pop(pressure)
+            cache[pressure] = altitude
+            altitudes[index] = altitude
+        else:
+            missing.append(index)
+    #only the pressures in the list that were remembered before this call are hits. a pressure repeated
+    #in the list but not remembered is calculated once, but every use of it is a miss (so an evaluator
+    #with a cache_size of 0 never has a hit).
+    uses = numpy.bincount(positions, minlength=len(unique))
+    misses = int(uses[missing].sum())
+    evaluator['misses'] += misses
+    evaluator['hits'] += len(positions) - misses
+    if len(missing) > 0:
+        if evaluator['table'] is not None:
+            calculated = table_altitudes(evaluator['table'], unique[missing])
+        else:
+            calculated = get_altitudes_from_pressures(unique[missing], evaluator['reference_pressure'])
+        altitudes[missing] = calculated
+        if evaluator['cache_size'] > 0:
+            for pressure, altitude in zip(unique[missing].tolist(), calculated.tolist()):
+                cache[pressure] = altitude
+                if len(cache) > evaluator['cache_size']:
+                    cache.popitem(last=False)
+                    evaluator['evictions'] += 1
+    return altitudes[positions].tolist()
+
+
+#function to get the hits, misses, evictions, hit rate and number of pressures remembered by an evaluator.
+def altitude_cache_statistics(evaluator):
+    lookups = evaluator['hits'] + evaluator['misses']
+    return {
+        'hits': evaluator['hits'],
+        'misses': evaluator['misses'],
+        'evictions': evaluator['evictions'],
+        'hit_rate': evaluator['hits'] / float(lookups) if lookups > 0 else 0.0,
+        'size': len(evaluator['cache']),
+    }
+
+
+#function to split an iterable of rows into lists of at most chunk_size rows.
+#arg rows, the iterable to split (such as a csv.DictReader).
+#arg chunk_size, the maximum number of rows in each list.
+def read_in_chunks(rows, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
 #function to add the altitude into the a CSV of the format generated
 #by generate_combined_spreadsheet.
 #arg, filename: the filename of the output from generate_combined_spreadsheet
-def add_altitude_if_pressure_present(filename):
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'altitude_added.csv',))
+def add_altitude_if_pressure_present(filename, reference_pressure=SEA_LEVEL_PRESSURE):
+    name = 'altitude_calculator.add_altitude_if_pressure_present'
     #open the filename of the CSV in the format of the output from generate_combined_spreadsheet
-    with open(filename, 'r') as original_file:
-        #convert original_file as a list of dictionaries.
-        reader = csv.DictReader(original_file)
-        #create a new file called altitude_added
-        with open('altitude_added.csv', 'w') as new_file:
-            #open the new file in a manner to write dictionaries to it.
-            #use the global variable KEYS (same as the output of generate_combined_spreadsheet)
-            #as the keys for the new CSV
-            writer = csv.DictWriter(new_file, KEYS)
-            #write the header row into the CSV to define each column.
-            writer.writeheader()
-            #iterate through the original_file
-            for row in reader:
-                #if the row has real value (non-empty) value for calibrated_pressure
-                if row['calibrated_pressure'] is not None and len(row['calibrated_pressure']) > 0:
-                    #set the value of calculated_altitude equal to the output of the NASA model from the pressure.
-                    row['calculated_altitude'] = get_altitude_from_pressure(float(row['calibrated_pressure']))
-                #write the row into the new csv.
-                writer.writerow(row)
+    #and read it as compact rows in the order of the global variable KEYS.
+    rows = compact_rows.read_projected_rows(filename, KEYS)
+    #create a new file called altitude_added
+    with open('altitude_added.csv', 'w') as new_file:
+        #use the global variable KEYS (same as the output of generate_combined_spreadsheet)
+        #as the keys for the new CSV
+        writer = csv.writer(new_file)
+        #write the header row into the CSV to define each column.
+        writer.writerow(KEYS)
+        #write every row into the new csv with its altitude.
+        writer.writerows(instrumentation.counted(name, 'rows_out', add_altitude_compact_rows(
+            instrumentation.counted(name, 'rows_in', rows), KEYS, reference_pressure)))
+
 
-add_altitude_temperature('master_unprocessed.csv')
+#the columns add_altitude_rows passes to add_altitude_compact_rows.
+ALTITUDE_FIELDNAMES = ['calibrated_pressure', 'calculated_altitude']
+
+
+#function to add the altitude to a stream of rows in the format generated by generate_combined_spreadsheet
+#(the rows written by add_altitude_if_pressure_present).
+#this is an adapter over add_altitude_compact_rows for rows that are dictionaries: each row is updated in place.
+#arg, rows: an iterable of dictionaries in the format generated by generate_combined_spreadsheet.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+def add_altitude_rows(rows, reference_pressure=SEA_LEVEL_PRESSURE):
+    #the dictionaries read but not given their altitude yet, oldest first
+    #(add_altitude_compact_rows reads a chunk of rows ahead).
+    waiting = collections.deque()
+
+    #function to turn each dictionary into a compact row of its pressure and an empty altitude.
+    def pressure_rows():
+        for row in rows:
+            waiting.append(row)
+            pressure = row['calibrated_pressure']
+            yield ('' if pressure is None else pressure, '')
+    for pressure, altitude in add_altitude_compact_rows(pressure_rows(), ALTITUDE_FIELDNAMES, reference_pressure):
+        row = waiting.popleft()
+        #only the rows with a pressure were given an altitude.
+        if len(altitude) > 0:
+            row['calculated_altitude'] = altitude
+        yield row
+
+
+#function to add the altitude to a stream of compact rows (see compact_rows.py).
+#arg, rows: an iterable of compact rows with the columns of fieldnames.
+#arg, fieldnames: the columns of the rows, which must include calibrated_pressure and calculated_altitude.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+#yields the rows with calculated_altitude set where there is a pressure (as new rows of
+#compact_rows.row_type(fieldnames), the others as they were). the altitude is the text the csv module
+#would write for it, so the rows look the same as rows read back from a csv.
+def add_altitude_compact_rows(rows, fieldnames=KEYS, reference_pressure=SEA_LEVEL_PRESSURE):
+    pressure_position = fieldnames.index('calibrated_pressure')
+    altitude_position = fieldnames.index('calculated_altitude')
+    make_row = compact_rows.row_maker(fieldnames)
+    #iterate through the rows a chunk of rows at a time
+    for chunk in read_in_chunks(rows):
+        #the positions in the chunk of the rows with a pressure.
+        positions = [position for position, row in enumerate(chunk) if len(row[pressure_position]) > 0]
+        #calculate the altitude for all of those rows at once using the NASA model.
+        altitudes = get_altitudes_from_pressures([float(chunk[position][pressure_position]) for position in positions],
+                                                 reference_pressure)
+        for position, altitude in zip(positions, altitudes.tolist()):
+            row = list(chunk[position])
+            row[altitude_position] = repr(altitude)
+            chunk[position] = make_row(row)
+        for row in chunk:
+            yield row
 
 #function to fill in missing data for a given column measurement_key in a
 #csv of the format outputted by generate_combined_spreadsheet.
@@ -158,11 +518,13 @@ add_altitude_temperature('master_unprocessed.csv')
 #arg, measurement_key: the name of the column to fill in missing values of.
 #arg, output_name the name of the file to output with no values missing in the given column.
 #precondition: the CSV filename is sorted by time and all rows must have a time.
+@instrumentation.instrumented(inputs=('filename',), outputs=('output_name',))
 def fill_in_missing_points(filename, measurement_key, output_name):
+    name = 'altitude_calculator.fill_in_missing_points'
     #open the original file
     with open(filename, 'r') as original_file:
         #convert the original file into a list of dictionaries.
-        reader = csv.DictReader(original_file)
+        reader = instrumentation.counted(name, 'rows_in', csv.DictReader(original_file))
         #create a new file with the given filename
         with open (output_name, 'w') as new_file:
             #open the newly created file as a CSV to write dictionary rows into it.
@@ -176,11 +538,14 @@ def fill_in_missing_points(filename, measurement_key, output_name):
             #initialize a variable previous_point to store the previously recorded value in the column measurement_key
             previous_point = 0
             #initialize the a variable to store the time in which previous_point was taken.
-            #initialized to the max integer so that the first time on the CSV is closer to the time 
+            #initialized to the max integer (sys.maxsize, python 3 has no sys.maxint)
+            #so that the first time on the CSV is closer to the time 
             #for the first datapoint than the initialized value so the initialization value of
             #previous_point is not used ever.
             #this actually isn't necessary based on the values of the timestamps, but is a bit better practice.
-            previous_time = sys.maxint
+            previous_time = sys.maxsize
+            #the most rows that had to wait for a value, recorded once the file has been read.
+            largest_buffer = 0
             #iterate through the original file
             for row in reader:
                 #check if there is a value in the column measurement_key for the given row
@@ -211,94 +576,334 @@ def fill_in_missing_points(filename, measurement_key, output_name):
                     #append the current row to the variable rows_missing_point before
                     #writing to CSV.
                     rows_missing_point.append(row)
+                    #keep track of the most rows that had to wait for a value.
+                    largest_buffer = max(largest_buffer, len(rows_missing_point))
                     #write everything from rows_missing_point into the CSV.
-                    writer.writerows(rows_missing_point)
+                    writer.writerows(instrumentation.counted(name, 'rows_out', rows_missing_point))
                     #reset rows_missing_point.
                     rows_missing_point = []
                 else: #no measurement of interest found
                     #add the row into a list to populate with the next (or previous)
                     #occurrence of a value in the column measurement_key.
                     rows_missing_point.append(row)
+            #record the most rows that had to wait for a value.
+            instrumentation.record_peak(name, 'peak_buffer', largest_buffer)
+
+
+#function to create the state used by fill_rows to fill every column of a CSV
+#in the format outputted by generate_combined_spreadsheet in a single pass.
+#the state is a plain dictionary so that it can be inspected (or saved) between calls to fill_rows.
+#arg keys: the columns to fill in, in the order fill_in_missing_points used to be applied to them.
+def new_fill_state(keys):
+    return {
+        #the columns to fill in.
+        'keys': list(keys),
+        #the most recently seen value in each column (the previous_point of fill_in_missing_points).
+        'previous_points': dict((key, None) for key in keys),
+        #the time each value in previous_points was taken (the previous_time of fill_in_missing_points).
+        #None stands for the max integer used to initialize previous_time.
+        'previous_times': dict((key, None) for key in keys),
+        #the rows read but not yet written, oldest first.
+        'pending': [],
+        #the row number (counting every row passed to fill_rows) of the first row in pending.
+        'first_pending': 0,
+        #the row numbers of the pending rows still missing a value in each column.
+        'missing': dict((key, []) for key in keys),
+        #boundaries[i] is the row number of the first pending row that still has to wait for a value in
+        #keys[i] (see fill_rows). boundaries[len(keys)] is the row number of the next row to be read.
+        'boundaries': [0] * (len(keys) + 1),
+    }
+
+
+#function to fill in missing values for every column of state['keys'] in one pass over rows.
+#this produces exactly what applying fill_in_missing_points to each column in turn produces, including
+#the fact that each fill_in_missing_points drops the rows after the last value in its column.
+#a row is dropped by that chain of files if there is no value for the last key at or after it,
+#or no value for the key before that at or after that value, and so on down to the first key.
+#every pending row is therefore waiting on one key of that chain, and since rows further ahead in the chain
+#are always older, the rows waiting on each key are a contiguous block described by state['boundaries'].
+#a row is only written once it has made it through the whole chain, at which point every column has also
+#been filled, so memory is bounded by the longest stretch of rows the chain has to wait through
+#rather than by the size of the file.
+#arg state: the state created by new_fill_state (updated in place).
+#arg rows: an iterable of dictionaries in the format outputted by generate_combined_spreadsheet.
+#precondition: rows must be sorted by time and all rows must have a time.
+#yields each row once all of its columns are filled in.
+def fill_rows(state, rows):
+    keys = state['keys']
+    previous_points = state['previous_points']
+    previous_times = state['previous_times']
+    pending = state['pending']
+    missing = state['missing']
+    boundaries = state['boundaries']
+    #the most rows pending at once, recorded for the instrumentation once the rows stop being read
+    #(when they run out or the caller stops asking for rows) rather than for every row.
+    largest_pending = 0
+    try:
+        for row in rows:
+            #the row number of the current row.
+            row_number = boundaries[-1]
+            #add the row to the end of the pending rows. it starts off waiting on the last key.
+            pending.append(row)
+            boundaries[-1] = row_number + 1
+            #the time of the current row (only parsed if a value is found, like fill_in_missing_points).
+            time = None
+            #walk backwards through the keys so a row released from one key can be released
+            #from the previous key by the same row.
+            for index in range(len(keys) - 1, -1, -1):
+                key = keys[index]
+                #check if there is a value in the column key for the given row
+                if row[key] is not None and len(row[key]) > 0:
+                    if time is None:
+                        time = float(row['time'])
+                    previous_time = previous_times[key]
+                    #fill in every row missing a value in the column key since the last value.
+                    for missing_row_number in missing[key]:
+                        missing_row = pending[missing_row_number - state['first_pending']]
+                        missing_time = float(missing_row['time'])
+                        #same comparison as fill_in_missing_points, where previous_time starts at the max integer.
+                        if previous_time is None or time - missing_time <= previous_time - missing_time:
+                            missing_row[key] = row[key]
+                        else:
+                            missing_row[key] = previous_points[key]
+                    missing[key] = []
+                    #set the previous measurement to the current one.
+                    previous_points[key] = row[key]
+                    previous_times[key] = time
+                    #every row waiting on this key now waits on the key before it.
+                    boundaries[index] = boundaries[index + 1]
+                else: #no measurement of interest found
+                    missing[key].append(row_number)
+            #write out every row that is no longer waiting on any key.
+            released = boundaries[0] - state['first_pending']
+            #pending is at its largest just before rows are released from it.
+            if len(pending) > largest_pending:
+                largest_pending = len(pending)
+            if released > 0:
+                for ready_row in pending[:released]:
+                    yield ready_row
+                del pending[:released]
+                state['first_pending'] = boundaries[0]
+    finally:
+        instrumentation.record_peak('altitude_calculator.fill_rows', 'peak_buffer', largest_pending)
 
 
 #function to fill in all columns completely for a CSV in the format
 #outputted by generate_combined_spreadsheet.
 #arg filename, the filename to fill in the columns for.
+#arg output_name, the name of the file to output with no values missing.
 #precondition: the CSV filename must be sorted by time and all rows must have a time.
 
-#this functiion is structured by applying fill_in_missing_points to each column.
-def fill_in_missing_data(filename):
+#this function used to apply fill_in_missing_points to each column, writing an intermediate
+#file per column. fill_rows now fills every column in one pass with identical output.
+@instrumentation.instrumented(inputs=('filename',), outputs=('output_name',))
+def fill_in_missing_data(filename, output_name='filled.csv'):
+    name = 'altitude_calculator.fill_in_missing_data'
     #remove 'time' from the list of keys in a generate_combined_spreadsheet
     #formatted file because time must be filled in for this to work
     #(a precondition of this function)
     keys = list(filter(lambda x: x != 'time', KEYS))
-    #create a variable called count and set it equal to 0
-    #count will be used to generate intermediate CSV files
-    #with one column filled in at a time.
-    count = 0
-    #create a variable called previous_filename to keep track of the name of intermediate files
-    #created by filling in one col at a time.
-    previous_filename = filename
-    for key in keys:
-        #iterate through the list of keys to fill
-        #call the next file count.csv to keep track of progressively made files
-        #as each call to fill_in_missing_points fills only one column.
-        new_filename = str(count) + '.csv'
-        #completely fill the column key and name the resulting file new_filename (just the count)
-        #and use the previous filename as the file to fill from so that progressive filling
-        #leads to all columns being filled.
-        fill_in_missing_points(previous_filename, key, new_filename)
-        #set the previous_filename equal to the filename of the newly created file
-        previous_filename = new_filename
-        #increase the number of files created by 1. This count will then be be used for the next filename.
-        count += 1
+    #open the original file and create the file to write the filled in rows to.
+    with open(filename, 'r') as original_file, open(output_name, 'w') as new_file:
+        #convert the original file into a list of dictionaries.
+        reader = csv.DictReader(original_file)
+        #use the global variable KEYS as the columns (the output of generate_combined_spreadsheet)
+        writer = csv.DictWriter(new_file, KEYS)
+        #write the top row (column names) on the newly created CSV.
+        writer.writeheader()
+        #write every row once it has been filled in.
+        writer.writerows(instrumentation.counted(name, 'rows_out', fill_rows(
+            new_fill_state(keys), instrumentation.counted(name, 'rows_in', reader))))
+
+
+#the number of bytes of the digest kept for every row seen while deduplicating
+#instead of the whole row (an MD5 digest is 16 bytes no matter how long the row is).
+DIGEST_SIZE = 16
+
+
+#function to get the fixed size digest of a row (or any other text) used to detect duplicates.
+def digest(text):
+    return hashlib.md5(text.encode('utf-8')).digest()[:DIGEST_SIZE]
+
+
+#function to remove duplicates from a stream of rows, keeping the first occurrence of each.
+#only the digest of each key is kept rather than the key itself.
+#arg items: an iterable of rows (lines of text or dictionaries).
+#arg key: a function giving the text that makes two rows duplicates (such as the line or the time).
+#arg time_of: if the rows are sorted by time, a function giving the time of a row. only the rows from
+#the last window seconds are then remembered, so memory no longer grows with the length of the file.
+#arg window: how many seconds of rows to remember when time_of is given. duplicates always have the
+#same time when the key includes the time, so 0 (only the current time) is enough for sorted files.
+#arg statistics: an optional dictionary that is updated with the number of rows read, duplicates removed
+#and the largest number of digests remembered at once.
+#arg state: an optional dictionary holding the digests remembered so far (under 'seen' and 'recent'), so that
+#deduplication can carry on over several calls. it is filled in and updated in place.
+def deduplicate(items, key, time_of=None, window=0, statistics=None, state=None):
+    if statistics is None:
+        statistics = {}
+    statistics.setdefault('rows', 0)
+    statistics.setdefault('duplicates', 0)
+    statistics.setdefault('largest_seen', 0)
+    if state is None:
+        state = {}
+    #create a set to keep track of the digests of previously seen rows.
+    seen = state.setdefault('seen', set())
+    #the digests in seen in the order they were added with the time of their row (only used with time_of).
+    recent = state.setdefault('recent', collections.deque())
+    for item in items:
+        statistics['rows'] += 1
+        if time_of is not None:
+            time = time_of(item)
+            #forget the rows that are older than the window.
+            while len(recent) > 0 and recent[0][0] < time - window:
+                seen.discard(recent.popleft()[1])
+        item_digest = digest(key(item))
+        if item_digest in seen:
+            statistics['duplicates'] += 1
+            continue
+        seen.add(item_digest)
+        if time_of is not None:
+            recent.append((time, item_digest))
+        statistics['largest_seen'] = max(statistics['largest_seen'], len(seen))
+        yield item
+    instrumentation.record_peak('altitude_calculator.deduplicate', 'peak_dedup_size', statistics['largest_seen'])
+
+
+#function to write sorted runs of at most chunk_size items to temporary files for external_deduplicate.
+#arg items: an iterable of lists that can be compared (and stored with json).
+#arg directory: the directory to create the run files in.
+#returns the list of run filenames.
+def write_sorted_runs(items, chunk_size, directory):
+    filenames = []
+    for chunk in read_in_chunks(items, chunk_size):
+        chunk.sort()
+        handle, filename = tempfile.mkstemp(suffix='.json', dir=directory)
+        with os.fdopen(handle, 'w') as run_file:
+            for item in chunk:
+                run_file.write(json.dumps(item) + '\n')
+        filenames.append(filename)
+    return filenames
+
+
+#function to merge the sorted runs written by write_sorted_runs back into one sorted stream.
+#the run files are deleted once they have been read.
+def merge_sorted_runs(filenames):
+    files = [open(filename, 'r') for filename in filenames]
+    try:
+        for item in heapq.merge(*[map(json.loads, run_file) for run_file in files]):
+            yield item
+    finally:
+        for run_file in files:
+            run_file.close()
+            os.remove(run_file.name)
+
+
+#function to remove duplicates from a stream of rows that may not fit in memory, keeping the first
+#occurrence of each in the original order. this is an external sort-and-merge: the rows are sorted by
+#digest in runs of chunk_size written to disk and merged to find the first occurrence of each digest,
+#then the rows that are kept are sorted back into their original order the same way.
+#arg items: an iterable of rows (lines of text or dictionaries) that can be stored with json.
+#arg key: a function giving the text that makes two rows duplicates.
+#arg chunk_size: the most rows to hold in memory at once.
+#arg statistics: an optional dictionary that is updated with the number of rows read and duplicates removed.
+def external_deduplicate(items, key, chunk_size=100000, statistics=None):
+    if statistics is None:
+        statistics = {}
+    statistics.setdefault('rows', 0)
+    statistics.setdefault('duplicates', 0)
+    directory = tempfile.mkdtemp()
+    try:
+        #sort the rows by digest (and position, so the first occurrence comes first).
+        def by_digest():
+            for index, item in enumerate(items):
+                statistics['rows'] += 1
+                yield [binascii.hexlify(digest(key(item))).decode('ascii'), index, item]
+        runs = write_sorted_runs(by_digest(), chunk_size, directory)
+
+        #keep the first row with each digest, ready to be sorted back by position.
+        def first_occurrences():
+            previous_digest = None
+            for item_digest, index, item in merge_sorted_runs(runs):
+                if item_digest == previous_digest:
+                    statistics['duplicates'] += 1
+                    continue
+                previous_digest = item_digest
+                yield [index, item]
+        runs = write_sorted_runs(first_occurrences(), chunk_size, directory)
+
+        for index, item in merge_sorted_runs(runs):
+            yield item
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+#function to deduplicate a CSV into a file of the caller's choosing.
+#arg filename: the name of the file to deduplicate.
+#arg output_name: the name of the deduplicated file to create.
+#arg by_time: if True rows are duplicates when they have the same value in column time
+#(like time_based_deduplicate_csv), otherwise only completely duplicate rows are removed
+#(like fully_deduplicate_csv).
+#arg assume_sorted: if True the file is sorted by time, so only the last window seconds of rows are remembered.
+#arg window: how many seconds of rows to remember when assume_sorted is True.
+#arg chunk_size: if given (and the file isn't sorted), use external_deduplicate holding at most
+#this many rows in memory at once.
+#arg fieldnames: the columns to write when by_time is True. defaults to the global variable KEYS
+#(the output of generate_combined_spreadsheet) like time_based_deduplicate_csv, which only takes files
+#in that format. None writes the columns of the file's own header instead.
+#returns the number of duplicate rows removed.
+@instrumentation.instrumented(inputs=('filename',), outputs=('output_name',))
+def deduplicate_csv(filename, output_name, by_time=False, assume_sorted=False, window=0, chunk_size=None,
+                    fieldnames=KEYS):
+    statistics = {}
+    with open(filename, 'r') as in_file, open(output_name, 'w') as out_file:
+        if by_time:
+            #read and write the file as dictionaries and compare the column time.
+            reader = csv.DictReader(in_file)
+            writer = csv.DictWriter(out_file, reader.fieldnames if fieldnames is None else fieldnames)
+            writer.writeheader()
+            rows = reader
+            key = lambda row: row['time']
+            time_of = lambda row: float(row['time'])
+        else:
+            #compare the file line by line, copying the header line as is.
+            header = in_file.readline()
+            out_file.write(header)
+            rows = in_file
+            key = lambda line: line
+            time_index = next(csv.reader([header])).index('time') if assume_sorted else None
+            time_of = lambda line: float(next(csv.reader([line]))[time_index])
+        if assume_sorted:
+            unique = deduplicate(rows, key, time_of, window, statistics)
+        elif chunk_size is not None:
+            unique = external_deduplicate(rows, key, chunk_size, statistics)
+        else:
+            unique = deduplicate(rows, key, statistics=statistics)
+        if by_time:
+            writer.writerows(unique)
+        else:
+            out_file.writelines(unique)
+    instrumentation.add_count('altitude_calculator.deduplicate_csv', 'rows_in', statistics['rows'])
+    instrumentation.add_count('altitude_calculator.deduplicate_csv', 'rows_out',
+                              statistics['rows'] - statistics['duplicates'])
+    return statistics['duplicates']
 
 
 #function to do strict deduplication on CSV filename.
 #removes any completely duplicate rows.
 #arg filename: the name of the file to deduplicate.
-def fully_deduplicate_csv(filename):
-    #open the file to deduplicate and create a new file called 
-    #deduped for the deduped version
-    with open(filename, 'r') as in_file, open('deduped.csv', 'w') as out_file:
-        #create a set to keep track of previously seen rows.
-        #use a set over an array for efficient (O(1)) lookup.
-        seen = set() 
-        #iterate through the file to deduplicate line by line.
-        for line in in_file:
-            #check if we haven't seen the line before.
-            if line not in seen:
-                #add the line into the set seen to keep track
-                seen.add(line)
-                #write the line onto the new file.
-                out_file.write(line)
+#arg output_name: the name of the deduplicated file to create.
+#returns the number of duplicate rows removed.
+def fully_deduplicate_csv(filename, output_name='deduped.csv'):
+    return deduplicate_csv(filename, output_name)
 
 
 #function to deduplicate a CSV in the format
 #outputted by generate_combined_spreadsheet based on the value in column time.
 #arg filename: the name of the file to deduplicate
-def time_based_deduplicate_csv(filename):
-    #open the file to deduplicate and created a new file called time_deduped for the deduped version.
-    with open(filename, 'r') as in_file, open('time_deduped.csv', 'w') as out_file:
-        #open the original file as a list of dictionaries
-        reader = csv.DictReader(in_file)
-        #open the newly created file as a CSV with the columns equal to the global variable KEYS
-        #(the same as the output for generate_combined_spreadsheet)
-        writer = csv.DictWriter(out_file, KEYS)
-        #write the header row (column names) to the newly created CSV
-        writer.writeheader()
-        #create a set to store viewed times.
-        #use a set for fast lookup
-        seen = set()  
-        for row in reader: #iterate through the original file
-            #set the variable time = to the value of column time in the original file
-            time = row['time']
-            #check if this is the first time there has been an entry with the same timestamp
-            if time not in seen:
-                #add the time to the set seen.
-                seen.add(time)
-                #write the row into the deduplicated CSV.
-                writer.writerow(row)
+#arg output_name: the name of the deduplicated file to create.
+#returns the number of duplicate rows removed.
+def time_based_deduplicate_csv(filename, output_name='time_deduped.csv'):
+    return deduplicate_csv(filename, output_name, by_time=True)
 
 #function to create a spreadsheet with the results from simultaneously collected
 #data points (sensors on the same Arduino) and altitude.
@@ -307,93 +912,443 @@ def time_based_deduplicate_csv(filename):
 #arg, filename: the filename for the sorted output of generate_combined_spreadsheet
 #arg, keys_to_include: the keys to add to the CSV along with the altitude.
 #keys must be from the same Arduino so that all the data was logged together.
-def filter_file(filename, keys_to_include):
+#arg, output_name: the filename of the csv to create. a random (uuid) filename is used if not given.
+@instrumentation.instrumented(inputs=('filename',), outputs=('output_name',))
+def filter_file(filename, keys_to_include, output_name=None):
+    name = 'altitude_calculator.filter_file'
+    #use a random filename if no filename was given.
+    if output_name is None:
+        output_name = str(uuid.uuid4()) + '.csv'
     #open the base file to use as the central data soource and create a new file
-    with open (filename, 'r') as original_file, open(str(uuid.uuid4()) + '.csv', 'w') as out_file:
-        #create a variable called previous altitude to store the last altitude found.
-        previous_altitude = -1 
-        #open the original file as a list of dictionaries.
-        reader = csv.DictReader(original_file)
+    with open (filename, 'r') as original_file, open(output_name, 'w') as out_file:
+        #read the original file as its column names and a stream of compact rows.
+        fieldnames, reader = compact_rows.read_header_and_rows(original_file)
         #create a variable called all_csv_keys to use as the columns for the output csv.
         #use time and altitude in in addition to the specified keys
         all_csv_keys = ['time', 'altitude']
         #add the specified keys into the list of keys for the outputted CSV.
         all_csv_keys.extend(keys_to_include)
         #create a csv using the newly created file with the columns in all_csv_keys
-        writer = csv.DictWriter(out_file, all_csv_keys)
+        writer = csv.writer(out_file)
         #write the header row (the column names)
-        writer.writeheader()
-        #iterate through the original base file.
-        for row in reader:
-            #if an altitude is present in this row
-            if row['calculated_altitude'] is not None and len(row['calculated_altitude']) > 0:
-                #set previous_altitude equal to the altitude found
-                previous_altitude = row['calculated_altitude']
-
-            #create a dictionary to add to the csv with the timestamp of the current row
-            #and altitude to the most recently found altitude
-            dictionary = {
-                'time': row['time'],
-                'altitude': previous_altitude
-            }
-            #create a variable called error_found to set to True if this row does
-            #not contain all of the keys in keys_to_include
-            error_found = False
-            #iterate through the keys that we want to add the altitude for.
-            for key in keys_to_include:
-                #set the variable val equal to the cell in the current row with the column name key
-                val = row[key]
-                #check if there is any measurement in the cell.
-                if val is not None and len(str(val)) > 0: 
-                    #add the measurement into the dictionary to write into a new CSV.
-                    dictionary[key] = val
-                else: #no measurement for the cell
-                    error_found = True #set error_found to False to indicate that a key was missing at this row.
-            if error_found == False: #if an error was not found
-                writer.writerow(dictionary) #write the dictionary into the output CSV.
+        writer.writerow(all_csv_keys)
+        #write every row with all of the keys into the output CSV.
+        writer.writerows(instrumentation.counted(name, 'rows_out', filter_compact_rows(
+            instrumentation.counted(name, 'rows_in', reader), fieldnames, keys_to_include)))
+
+
+#function to turn a stream of rows in the format of generate_combined_spreadsheet into a stream of
+#rows with just the time, the most recent altitude and keys_to_include (the rows filter_file writes).
+#rows that don't contain all of keys_to_include are left out.
+#this is an adapter over filter_compact_rows for rows that are dictionaries.
+#arg, rows: an iterable of dictionaries sorted by time.
+#arg, keys_to_include: the keys to include along with the altitude.
+#yields dictionaries of the time, the altitude and keys_to_include.
+def filter_rows(rows, keys_to_include):
+    fieldnames = ['time', 'calculated_altitude'] + list(keys_to_include)
+    filtered = filter_compact_rows(compact_rows.from_dicts(rows, fieldnames), fieldnames, keys_to_include)
+    return compact_rows.to_dicts(filtered, ['time', 'altitude'] + list(keys_to_include))
+
+
+#function to turn a stream of compact rows into a stream of compact rows with just the time, the most recent
+#altitude and keys_to_include (the rows filter_file writes).
+#rows that don't contain all of keys_to_include are left out.
+#arg, rows: an iterable of compact rows (see compact_rows.py) sorted by time.
+#arg, fieldnames: the columns of the rows.
+#arg, keys_to_include: the keys to include along with the altitude.
+#yields rows of compact_rows.row_type(['time', 'altitude'] + keys_to_include).
+def filter_compact_rows(rows, fieldnames, keys_to_include):
+    positions = compact_rows.positions_of(fieldnames)
+    time_position = positions['time']
+    altitude_position = positions['calculated_altitude']
+    #the positions of keys_to_include, compiled once into a projection.
+    get_values = compact_rows.compile_projection(fieldnames, keys_to_include, strict=False)
+    #a key missing from the file is an error, like it is for the rows of csv.DictReader.
+    missing = [key for key in keys_to_include if key not in positions]
+    if len(missing) > 0:
+        raise KeyError(missing[0])
+    make_row = compact_rows.row_maker(['time', 'altitude'] + list(keys_to_include))
+    #create a variable called previous altitude to store the last altitude found.
+    previous_altitude = -1
+    for row in rows:
+        #if an altitude is present in this row set previous_altitude equal to it.
+        if len(row[altitude_position]) > 0:
+            previous_altitude = row[altitude_position]
+        values = get_values(row)
+        #only rows with a measurement for every key are included.
+        if '' not in values:
+            yield make_row((row[time_position], previous_altitude) + values)
+
+
+#the size in bytes of the buffer of each file written by extract_rows, so that writing many outputs at once
+#doesn't turn into many small writes.
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+
+
+#function to give every row every column of keys, empty where the row doesn't have it
+#(like the rows read back from the output of generate_combined_spreadsheet).
+#arg, rows: an iterable of dictionaries.
+#arg, keys: the columns every row should have.
+def complete_rows(rows, keys=KEYS):
+    for row in rows:
+        for key in keys:
+            if key not in row:
+                row[key] = ''
+        yield row
+
+
+#function to write several subsets of a stream of rows at once, each exactly like filter_file would write it,
+#so the rows are only read and parsed once no matter how many outputs there are.
+#this is an adapter over extract_compact_rows for rows that are dictionaries.
+#arg, rows: an iterable of dictionaries in the format of generate_combined_spreadsheet, sorted by time.
+#arg, outputs: a dictionary of output filename to the keys to include in it (see filter_file).
+#arg, directory: the directory to write the outputs to, or None to use the filenames as they are.
+#returns a dictionary of output filename to the number of rows written to it.
+def extract_rows(rows, outputs, directory=None):
+    #just the columns some output uses.
+    fieldnames = ['time', 'calculated_altitude']
+    for output_name in sorted(outputs):
+        fieldnames.extend(key for key in outputs[output_name] if key not in fieldnames)
+    return extract_compact_rows(compact_rows.from_dicts(rows, fieldnames), fieldnames, outputs, directory)
 
 
+#function to write several subsets of a stream of compact rows at once, each exactly like filter_file would
+#write it (see filter_compact_rows).
+#arg, rows: an iterable of compact rows (see compact_rows.py) sorted by time.
+#arg, fieldnames: the columns of the rows.
+#arg, outputs: a dictionary of output filename to the keys to include in it (see filter_file).
+#arg, directory: the directory to write the outputs to, or None to use the filenames as they are.
+#returns a dictionary of output filename to the number of rows written to it.
+def extract_compact_rows(rows, fieldnames, outputs, directory=None):
+    positions = compact_rows.positions_of(fieldnames)
+    time_position = positions['time']
+    altitude_position = positions['calculated_altitude']
+    output_names = sorted(outputs)
+    counts = dict((output_name, 0) for output_name in output_names)
+    #a key missing from the rows is an error, like it is for filter_file.
+    for output_name in output_names:
+        missing = [key for key in outputs[output_name] if key not in positions]
+        if len(missing) > 0:
+            raise KeyError(missing[0])
+    files = []
+    try:
+        writers = []
+        for output_name in output_names:
+            path = output_name if directory is None else os.path.join(directory, output_name)
+            out_file = open(path, 'w', EXTRACT_BUFFER_SIZE)
+            files.append(out_file)
+            keys_to_include = list(outputs[output_name])
+            writer = csv.writer(out_file)
+            writer.writerow(['time', 'altitude'] + keys_to_include)
+            #the positions of keys_to_include, compiled once into a projection.
+            get_values = compact_rows.compile_projection(fieldnames, keys_to_include, strict=False)
+            writers.append((output_name, get_values, writer))
+        #the most recently found altitude (shared by every output, like filter_compact_rows).
+        previous_altitude = -1
+        for row in rows:
+            if len(row[altitude_position]) > 0:
+                previous_altitude = row[altitude_position]
+            for output_name, get_values, writer in writers:
+                values = get_values(row)
+                #only write the rows with a measurement for every key of the output.
+                if '' not in values:
+                    writer.writerow((row[time_position], previous_altitude) + values)
+                    counts[output_name] += 1
+    finally:
+        for out_file in files:
+            out_file.close()
+    return counts
+
+
+#function to write several subsets of the sorted master file in one pass, each output being exactly what
+#filter_file would write for it. this replaces calling filter_file once per group of keys.
+#arg, filename: the filename for the sorted output of generate_combined_spreadsheet with altitude added.
+#arg, outputs: a dictionary of output filename to the keys to include in it.
+#keys in each output must be from the same Arduino so that all the data was logged together.
+#arg, directory: the directory to write the outputs to, or None to use the filenames as they are.
+#returns a dictionary of output filename to the number of rows written to it.
+@instrumentation.instrumented(inputs=('filename',))
+def extract_files(filename, outputs, directory=None):
+    with open(filename, 'r') as original_file:
+        #read the file as its column names and a stream of compact rows.
+        fieldnames, reader = compact_rows.read_header_and_rows(original_file)
+        reader = instrumentation.counted('altitude_calculator.extract_files', 'rows_in', reader)
+        return extract_compact_rows(reader, fieldnames, outputs, directory)
+
+
+#function to write several subsets of the data straight from the four sensor files in one pass, without
+#writing a master file first. the outputs are the same as generating the sorted master file, adding the
+#altitude and then calling extract_files on it.
+#arg, geiger, pressure, gps, interior: the filenames of the sensor csvs (see generate_sorted_combined_spreadsheet).
+#arg, outputs: a dictionary of output filename to the keys to include in it.
+#arg, directory: the directory to write the outputs to, or None to use the filenames as they are.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+#returns a dictionary of output filename to the number of rows written to it.
+@instrumentation.instrumented(inputs=('geiger', 'pressure', 'gps', 'interior'))
+def extract_files_from_sensors(geiger, pressure, gps, interior, outputs, directory=None,
+                               reference_pressure=SEA_LEVEL_PRESSURE):
+    sources = [(geiger, GEIGER_RENAMES), (pressure, PRESSURE_RENAMES), (gps, GPS_RENAMES),
+               (interior, INTERIOR_RENAMES)]
+    #read each file as compact rows already in the order of KEYS, like generate_sorted_combined_spreadsheet.
+    streams = [instrumentation.counted('altitude_calculator.extract_files_from_sensors', 'rows_in',
+                                       compact_rows.read_projected_rows(filename, KEYS, renames))
+               for filename, renames in sources]
+    rows = merge_by_time(streams, [0] * len(sources), operator.itemgetter(KEYS.index('time')))
+    return extract_compact_rows(add_altitude_compact_rows(rows, KEYS, reference_pressure), KEYS, outputs, directory)
+
+
+
+#the ways asof_join can pick the reference value for a row.
+#backward: the last reference value taken at or before the row (what filter_file does).
+#forward: the first reference value taken at or after the row.
+#nearest: whichever of those two is closer in time (backward on a tie).
+#linear: linear interpolation between those two.
+ASOF_MODES = ('backward', 'forward', 'nearest', 'linear')
+
+
+#function to read the altitude calculated from the pressure in a sensor csv as a stream of (time, altitude)
+#to use as the reference series for asof_join.
+#arg, filename: the filename of a time sorted csv with a time and a pressure column.
+#arg, pressure_key: the column with the pressure in pascals.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+def read_altitude_series(filename, pressure_key='calibrated_pressure', reference_pressure=SEA_LEVEL_PRESSURE):
+    with open(filename, 'r') as original_file:
+        for chunk in read_in_chunks(csv.DictReader(original_file)):
+            #skip rows without a pressure.
+            chunk = [row for row in chunk if row[pressure_key] is not None and len(row[pressure_key]) > 0]
+            altitudes = get_altitudes_from_pressures([float(row[pressure_key]) for row in chunk], reference_pressure)
+            for row, altitude in zip(chunk, altitudes.tolist()):
+                yield float(row['time']), altitude
+
+
+#function to load the altitude calculated from the pressure in a sensor csv as numpy arrays, the same values as
+#read_altitude_series gives but ready for asof_join_arrays. the columns are parsed once and then read from a
+#cache next to the csv (see csv_cache.py), so loading the same file again doesn't parse any text.
+#arg, filename: the filename of a time sorted csv with a time and a pressure column.
+#arg, pressure_key: the column with the pressure in pascals.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+#arg, cache_directory: the directory to keep the cache in (see csv_cache.load_columns).
+#arg, verify: if True hash the csv on every load so a change that kept its size and modification time is seen.
+#returns a tuple of float numpy arrays of the times and the altitudes of the rows with a pressure.
+#raises ValueError if a row with a pressure has no time or a value isn't a number.
+def load_altitude_arrays(filename, pressure_key='calibrated_pressure', reference_pressure=SEA_LEVEL_PRESSURE,
+                         cache_directory=None, verify=False):
+    columns = csv_cache.load_columns(filename, cache_directory, verify)
+    #skip rows without a pressure.
+    present = ~numpy.ma.getmaskarray(columns[pressure_key])
+    if numpy.ma.getmaskarray(columns['time'])[present].any():
+        raise ValueError('a row of ' + filename + ' with a pressure has no time')
+    times = columns['time'].data[present].astype(numpy.float64)
+    pressures = columns[pressure_key].data[present].astype(numpy.float64)
+    return times, get_altitudes_from_pressures(pressures, reference_pressure)
+
+
+#function to pick the reference value for a time from the reference points just before and after it.
+#arg, time: the time to find a value for.
+#arg, before: the (time, value) of the last reference point at or before time, or None.
+#arg, after: the (time, value) of the first reference point at or after time, or None.
+#arg, mode: one of ASOF_MODES.
+#arg, tolerance: the furthest in seconds a reference point can be from time to be used, or None for no limit.
+#returns the value, or None if there is no reference point close enough.
+def pick_asof_value(time, before, after, mode, tolerance):
+    #drop the reference points that are too far away.
+    if before is not None and tolerance is not None and time - before[0] > tolerance:
+        before = None
+    if after is not None and tolerance is not None and after[0] - time > tolerance:
+        after = None
+    if mode == 'backward':
+        return None if before is None else before[1]
+    if mode == 'forward':
+        return None if after is None else after[1]
+    if mode == 'nearest':
+        if before is None or after is None:
+            return None if before is None and after is None else (before or after)[1]
+        return before[1] if time - before[0] <= after[0] - time else after[1]
+    #linear interpolation needs a point on each side (no extrapolation).
+    if before is None or after is None:
+        return None
+    if after[0] == before[0]:
+        return before[1]
+    return before[1] + (after[1] - before[1]) * (time - before[0]) / (after[0] - before[0])
+
+
+#function to attach a value from a reference series (such as altitude) to every row of a time sorted stream.
+#works like a sorted merge of the two streams so it runs in O(n + m) and only holds two reference points at once.
+#arg, rows: a time sorted iterable of dictionaries that each have a time.
+#arg, reference: a time sorted iterable of (time, value), such as read_altitude_series.
+#arg, mode: one of ASOF_MODES.
+#arg, tolerance: the furthest in seconds a reference point can be from a row to be used, or None for no limit.
+#yields (row, value) for every row, where value is None if no reference point was close enough.
+def asof_join(rows, reference, mode='backward', tolerance=None):
+    if mode not in ASOF_MODES:
+        raise ValueError('mode must be one of ' + ', '.join(ASOF_MODES))
+    reference = iter(reference)
+    #the last reference point at or before the current row.
+    before = None
+    #the first reference point after the current row.
+    after = next(reference, None)
+    for row in rows:
+        time = float(row['time'])
+        #move forward through the reference until the next point is after the current row.
+        while after is not None and after[0] <= time:
+            before = after
+            after = next(reference, None)
+        #a reference point at exactly the time of the row is both before and after it.
+        if before is not None and before[0] == time:
+            yield row, pick_asof_value(time, before, before, mode, tolerance)
+        else:
+            yield row, pick_asof_value(time, before, after, mode, tolerance)
+
+
+#function to attach a value from a reference series to a whole array of times at once using binary search.
+#gives the same values as asof_join for data that is already in numpy arrays (for example from load_altitude_arrays).
+#arg, times: a sorted numpy array of times.
+#arg, reference_times: a sorted numpy array of the times of the reference points.
+#arg, reference_values: a numpy array of the values of the reference points.
+#arg, mode: one of ASOF_MODES.
+#arg, tolerance: the furthest in seconds a reference point can be from a time to be used, or None for no limit.
+#returns a float numpy array of values with NaN where no reference point was close enough.
+def asof_join_arrays(times, reference_times, reference_values, mode='backward', tolerance=None):
+    if mode not in ASOF_MODES:
+        raise ValueError('mode must be one of ' + ', '.join(ASOF_MODES))
+    times = numpy.asarray(times, dtype=numpy.float64)
+    reference_times = numpy.asarray(reference_times, dtype=numpy.float64)
+    reference_values = numpy.asarray(reference_values, dtype=numpy.float64)
+    result = numpy.full(len(times), numpy.nan)
+    if len(reference_times) == 0:
+        return result
+    #the index of the last reference point at or before each time (-1 if there is none).
+    before = numpy.searchsorted(reference_times, times, side='right') - 1
+    #the index of the first reference point at or after each time (len(reference_times) if there is none).
+    after = numpy.searchsorted(reference_times, times, side='left')
+    #a reference point at exactly the time is both before and after it (the last one if there are several).
+    exact = (before >= 0) & (reference_times[numpy.clip(before, 0, None)] == times)
+    after[exact] = before[exact]
+    has_before = before >= 0
+    has_after = after < len(reference_times)
+    before_times = reference_times[numpy.clip(before, 0, None)]
+    after_times = reference_times[numpy.clip(after, None, len(reference_times) - 1)]
+    before_values = reference_values[numpy.clip(before, 0, None)]
+    after_values = reference_values[numpy.clip(after, None, len(reference_times) - 1)]
+    #drop the reference points that are too far away.
+    if tolerance is not None:
+        has_before &= times - before_times <= tolerance
+        has_after &= after_times - times <= tolerance
+    if mode == 'backward':
+        result[has_before] = before_values[has_before]
+    elif mode == 'forward':
+        result[has_after] = after_values[has_after]
+    elif mode == 'nearest':
+        use_before = has_before & (~has_after | (times - before_times <= after_times - times))
+        use_after = has_after & ~use_before
+        result[use_before] = before_values[use_before]
+        result[use_after] = after_values[use_after]
+    else:
+        both = has_before & has_after
+        span = after_times - before_times
+        #avoid dividing by zero where the time is exactly on a reference point.
+        fraction = numpy.where(span > 0, (times - before_times) / numpy.where(span > 0, span, 1), 0)
+        result[both] = (before_values + (after_values - before_values) * fraction)[both]
+    return result
+
+
+#function to create a spreadsheet of the measurements in a single sensor csv with the altitude
+#when each measurement was taken, straight from the raw sensor file (no master file needed).
+#the output is in the same format as filter_file: time, altitude and then keys_to_include.
+#rows missing a value for any of keys_to_include are left out, like filter_file.
+#arg, filename: the filename of the time sorted sensor csv (such as geiger.csv or pressure.csv).
+#arg, keys_to_include: the columns of the sensor csv to include along with the altitude.
+#arg, output_name: the filename of the csv to create (such as anemometer_only.csv).
+#arg, reference_filename: the time sorted csv with the pressure to calculate altitude from.
+#arg, pressure_key: the column of reference_filename with the pressure in pascals.
+#arg, mode: one of ASOF_MODES.
+#arg, tolerance: the furthest in seconds a pressure reading can be from a row to be used, or None for no limit.
+#rows with no pressure reading close enough get an empty altitude.
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+@instrumentation.instrumented(inputs=('filename', 'reference_filename'), outputs=('output_name',))
+def attach_altitude(filename, keys_to_include, output_name, reference_filename='interior.csv',
+                    pressure_key='calibrated_pressure', mode='backward', tolerance=None,
+                    reference_pressure=SEA_LEVEL_PRESSURE):
+    name = 'altitude_calculator.attach_altitude'
+    reference = read_altitude_series(reference_filename, pressure_key, reference_pressure)
+    with open(filename, 'r') as original_file, open(output_name, 'w') as out_file:
+        reader = instrumentation.counted(name, 'rows_in', csv.DictReader(original_file))
+        all_csv_keys = ['time', 'altitude']
+        all_csv_keys.extend(keys_to_include)
+        writer = csv.DictWriter(out_file, all_csv_keys)
+        writer.writeheader()
+        written = 0
+        for row, altitude in asof_join(reader, reference, mode, tolerance):
+            #skip rows without all of the measurements.
+            if any(row[key] is None or len(row[key]) == 0 for key in keys_to_include):
+                continue
+            dictionary = dict((key, row[key]) for key in keys_to_include)
+            dictionary['time'] = row['time']
+            dictionary['altitude'] = '' if altitude is None else altitude
+            writer.writerow(dictionary)
+            written += 1
+    instrumentation.add_count(name, 'rows_out', written)
+
 
 #function to add altitudes to use for the error bar graphs for the pressure calibration
 #arg, filename: the filename of the CSV containing the pressures for the original and 2.5% and 97.5% CIs.
-def confidence_interval_altitude(filename):
+#arg, reference_pressure: the pressure in pascals at altitude 0.
+#arg, evaluator: an optional evaluator from new_altitude_evaluator to calculate the altitudes with
+#(its own reference pressure is used). the rows repeat the same pressures a lot, so most are remembered.
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'altitude_' + arguments['filename'],))
+def confidence_interval_altitude(filename, reference_pressure=SEA_LEVEL_PRESSURE, evaluator=None):
+    name = 'altitude_calculator.confidence_interval_altitude'
+    #calculate every altitude exactly unless an evaluator was given.
+    if evaluator is None:
+        altitudes_of = lambda pressures: get_altitudes_from_pressures(pressures, reference_pressure).tolist()
+    else:
+        altitudes_of = lambda pressures: evaluate_altitudes(evaluator, pressures)
     #open the original file and create a new file with the altitudes
     with open (filename, 'r') as original_file, open('altitude_' + filename, 'w') as out_file:
         #the keys (column names) to use in the outputted CSV
         keys = ['interior_pressure','pressure_normal','pressure_2.5','pressure_97.5', 'altitude_50', 
         'altitude_2.5', 'altitude_97.5']
         #open the original file a list of dictionaries.
-        reader = csv.DictReader(original_file)
+        reader = instrumentation.counted(name, 'rows_in', csv.DictReader(original_file))
         #create a new CSV out of the newly created file with the columns keys
         writer = csv.DictWriter(out_file, keys)
         #write the header row (the column names) of the new csv.
         writer.writeheader()
-        #iterate through the input CSV.
-        for row in reader:
+        #iterate through the input CSV a chunk of rows at a time.
+        for chunk in read_in_chunks(reader):
             #calculate altitude from the 2.5% CI
-            row['altitude_2.5'] = get_altitude_from_pressure(float(row['pressure_2.5']))
+            lower = altitudes_of([float(row['pressure_2.5']) for row in chunk])
             #calculate altitude for the 97.5% CI
-            row['altitude_97.5'] = get_altitude_from_pressure(float(row['pressure_97.5']))
+            upper = altitudes_of([float(row['pressure_97.5']) for row in chunk])
             #calculate altitude for the normal calibration regression
-            row['altitude_50'] = get_altitude_from_pressure(float(row['pressure_normal']))
-            #write the row into the new CSV.
-            writer.writerow(row)
+            normal = altitudes_of([float(row['pressure_normal']) for row in chunk])
+            for row, altitude_lower, altitude_upper, altitude_normal in zip(chunk, lower, upper, normal):
+                row['altitude_2.5'] = altitude_lower
+                row['altitude_97.5'] = altitude_upper
+                row['altitude_50'] = altitude_normal
+            #write the rows into the new CSV.
+            writer.writerows(instrumentation.counted(name, 'rows_out', chunk))
 
 
-def add_altitude_temperature(filename):
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'altitude_' + arguments['filename'],))
+def add_altitude_temperature(filename, reference_pressure=SEA_LEVEL_PRESSURE):
+    name = 'altitude_calculator.add_altitude_temperature'
     with open(filename, 'r') as original_file, open('altitude_' + filename, 'w') as out_file:
-        reader = csv.DictReader(original_file)
+        reader = instrumentation.counted(name, 'rows_in', csv.DictReader(original_file))
         writer = csv.DictWriter(out_file, ['time', 'temperature', 'altitude'])
         writer.writeheader()
-        for row in reader:
-            time = row['time']
-            temperature = row['calibrated_temperature']
-            altitude = get_altitude_from_pressure(float(row['pressure']))
-            writer.writerow({'time' : time, 'temperature' : temperature, 'altitude' : altitude})
+        for chunk in read_in_chunks(reader):
+            altitudes = get_altitudes_from_pressures([float(row['pressure']) for row in chunk], reference_pressure)
+            for row, altitude in instrumentation.counted(name, 'rows_out', zip(chunk, altitudes.tolist())):
+                writer.writerow({'time' : row['time'], 'temperature' : row['calibrated_temperature'],
+                                 'altitude' : altitude})
 
+#function to write the rows of the descent every 1000 m below the burst (hard-coded at 20952 m).
+#flight_phases.analyze_flight finds the launch, burst and landing of any flight and summarizes every phase.
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'summary_' + arguments['filename'],))
 def summary_altitude(filename):
     with open(filename, 'r') as original_file, open('summary_' + filename, 'w') as out_file:
-        reader = csv.DictReader(original_file)
+        reader = instrumentation.counted('altitude_calculator.summary_altitude', 'rows_in', csv.DictReader(original_file))
         writer = csv.DictWriter(out_file, ['time', 'temperature', 'altitude'])
         last_alt = 0
         has_reached_descent = False
@@ -406,6 +1361,3 @@ def summary_altitude(filename):
                 last_alt = alt
                 writer.writerow(row)
 
-
-s#ummary_altitude('altitude_interior_temperature.csv')
-#add_altitude_temperature('interior_temperature.csv')
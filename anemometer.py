@@ -1,7 +1,7 @@
 '''
     File name: anemometer_correction.py
     Author: Jason Scharff
-    Python Version: 2.7
+    Python Version: 3.6
     Description: The anemometer rpm data was collected by recording the number
     of rotations in a one minute period. However, during the launch, the variable
     to keep track of rpm was never reset to 0 after each one minute interval.
@@ -14,77 +14,306 @@
     and then finding the difference between the cumulative rotations at each minute.
 
     This file provides functions to fix both of the aforementioned issues to recover the data.
+
+    correct_overflows only corrects a cumulative count that has wrapped around once (into the negatives).
+    recover_rpm does both corrections in a single pass by unwrapping the counter however many times it
+    has wrapped, uses the real time between readings rather than assuming exactly one minute, and flags
+    readings where the counter went back to 0 because the Arduino restarted.
 '''
 
+#import collections for the deque reset_corrected_rows keeps its rows in.
+import collections
 #import csv module to interface with the input CSVs for the anemometer data
 import csv
 
+#import numpy for the batch version of recover_rpm.
+import numpy
+
+#import the compact_rows module to read the files as lists of cells rather than dictionaries.
+import compact_rows
+#import the csv_cache module to load the raw readings as numpy arrays without parsing them every time.
+import csv_cache
+#import the instrumentation module to record the rows, bytes and time of each function when it is enabled.
+import instrumentation
+
 #declare a variable for the max 16 bit integer (max Arduino int)
 #to correct integer overflow errors
 MAX_16_BIT_INTEGER = 2 ** 15 - 1
 #declare a variable for the minimum 16 bit integer (min Arduino int)
 #to correct integer overflow errors
 MIN_16_BIT_INTEGER = -2 ** 15
+#declare a variable for the number of different values a 16 bit integer can hold
+#(how much the cumulative count drops by every time it wraps around)
+COUNTER_RANGE = 2 ** 16
+#the time in seconds each reading was meant to cover.
+NOMINAL_INTERVAL = 60.0
+#the fastest rpm that is physically plausible for the anemometer. a bigger jump in the count than this
+#allows for can only be the counter starting again from 0 after the Arduino restarted.
+MAX_PLAUSIBLE_RPM = 10000
+#the columns written by recover_rpm.
+#anemometer_rpm: the rotations per minute over the time since the previous reading.
+#rotations: the number of rotations since the previous reading.
+#interval: the number of seconds since the previous reading.
+#wraps: how many times the counter has wrapped around since the Arduino started.
+#reset: 1 if the counter was reset to 0 (the Arduino restarted) since the previous reading, otherwise 0.
+RECOVERED_KEYS = ['time', 'anemometer_rpm', 'rotations', 'interval', 'wraps', 'reset']
+#the columns written by correct_overflows and correct_lack_of_reset.
+ANEMOMETER_KEYS = ['time', 'anemometer_rpm']
 
 
 #function to correct integer overpower errors
 #in anemometer data
 #arg filename, the filename of the raw data to correct.
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'overflow_corrected.csv',))
 def correct_overflows(filename):
+    name = 'anemometer.correct_overflows'
 	#open the original file
     with open(filename, 'r') as original_file:
-    	#convert the original file into a list of dictionaries.
-        list_of_entries = csv.DictReader(original_file)
+    	#read the original file as its column names and a stream of compact rows.
+        fieldnames, list_of_entries = compact_rows.read_header_and_rows(original_file)
         #create a new file called overflow_corrected to use for the corrected data
         with open ('overflow_corrected.csv', 'w') as new_file:
         	#open the newly created file as a CSV with columns for time and corrected overflow anemometer_rpm
-            writer = csv.DictWriter(new_file, ['time', 'anemometer_rpm'])
+            writer = csv.writer(new_file)
             #write the header (the column names)
-            writer.writeheader()
-            #iterate through the original file
-            for dictionary in list_of_entries:
-            	#set variable rpm equal to the rpm in the current row.
-                rpm = int(dictionary['anemometer_rpm'])
-                #if the rpm is negative then an overflow occurred.
-                if rpm < 0:
-                	#set the rpm equal to the max integer + the difference between the value and the min value
-                	#as overflow causes a cycle.
-                    rpm = MAX_16_BIT_INTEGER + (rpm - MIN_16_BIT_INTEGER)
-                #create a dictionary to write to the new CSV with the overflow corrected value and the timestamp.
-                new_dictionary = {'time' : dictionary['time'], 'anemometer_rpm' : rpm}
-                #write the new row onto the output file.
-                writer.writerow(new_dictionary)
+            writer.writerow(ANEMOMETER_KEYS)
+            #write every row of the original file with the overflow corrected.
+            writer.writerows(instrumentation.counted(name, 'rows_out', overflow_corrected_compact_rows(
+                instrumentation.counted(name, 'rows_in', list_of_entries), fieldnames)))
+
+
+#function to correct integer overflow errors in a stream of anemometer rows
+#(the rows correct_overflows writes).
+#arg rows, an iterable of dictionaries with a time and an anemometer_rpm.
+#yields dictionaries with just the time and the corrected anemometer_rpm.
+def overflow_corrected_rows(rows):
+    #move the rows to compact rows of the time and anemometer_rpm, correct them and move them back.
+    corrected = overflow_corrected_compact_rows(compact_rows.from_dicts(rows, ANEMOMETER_KEYS), ANEMOMETER_KEYS)
+    return compact_rows.to_dicts(corrected, ANEMOMETER_KEYS)
+
+
+#function to correct integer overflow errors in a stream of compact rows (see compact_rows.py), like
+#overflow_corrected_rows.
+#arg rows, an iterable of compact rows.
+#arg fieldnames, the columns of the rows, which must include time and anemometer_rpm.
+#yields rows of compact_rows.row_type(ANEMOMETER_KEYS): the time and the corrected anemometer_rpm.
+def overflow_corrected_compact_rows(rows, fieldnames):
+    positions = compact_rows.positions_of(fieldnames)
+    time_position = positions['time']
+    rpm_position = positions['anemometer_rpm']
+    make_row = compact_rows.row_maker(ANEMOMETER_KEYS)
+    #iterate through the rows
+    for row in rows:
+        #set variable rpm equal to the rpm in the current row.
+        rpm = int(row[rpm_position])
+        #if the rpm is negative then an overflow occurred.
+        if rpm < 0:
+            #set the rpm equal to the max integer + the difference between the value and the min value
+            #as overflow causes a cycle.
+            rpm = MAX_16_BIT_INTEGER + (rpm - MIN_16_BIT_INTEGER)
+        #create a row with the timestamp and the overflow corrected value.
+        yield make_row((row[time_position], rpm))
 
 
 #function to correct the fact that the anemometer rpm was never reset to 0
 #by finding differences between consecutive rows.
 #input file must be formatted as a CSV with columns just for time and anemometer rpm.
+@instrumentation.instrumented(inputs=('filename',), outputs=(lambda arguments: 'reset_corrected.csv',))
 def correct_lack_of_reset(filename):
-	#open the original file to correct.
-    with open(filename, 'r') as original_file:
-    	#open the original file as a list of dictionaries.
-        list_of_entries = csv.DictReader(original_file)
-        #create a new file called reset_corrected to use for the corrected version.
-        with open ('reset_corrected.csv', 'w') as new_file:
-        	#open the newly created file as a CSV with columns for time and corrected overflow anemometer_rpm
-            writer = csv.DictWriter(new_file, ['time', 'anemometer_rpm'])
-            #write the header (the column names)
-            writer.writeheader()
-            #set a variable previous rpm to 0.
-            #the values are corrected by finding differences between consecutive rows, but the first row is correct
-            #as the anemometer_rpm was initialized 0 at the beginning.
-            previous_rpm = 0
-            #iterate through the original dictionary.
-            for dictionary in list_of_entries:
-            	#set integer rpm equal to the rpm at the current row.
-                rpm = int(dictionary['anemometer_rpm'])
-                #correct this rpm by subtracting the previous row to get the difference.
-                rpm -= previous_rpm
-                #set variable previous_rpm to the raw (uncorrected) rpm in the row
-                previous_rpm = int(dictionary['anemometer_rpm'])
-                #set the value for anemometer_rpm in the row to the corrected rpm
-                dictionary['anemometer_rpm'] = rpm
-                #write the original row to the new CSV, but with the corrected anemometer value.
-                writer.writerow(dictionary)
+    name = 'anemometer.correct_lack_of_reset'
+    #read the original file as compact rows of the time and anemometer_rpm
+    #(a ValueError is raised if it has any other columns).
+    list_of_entries = instrumentation.counted(name, 'rows_in',
+                                              compact_rows.read_projected_rows(filename, ANEMOMETER_KEYS))
+    #create a new file called reset_corrected to use for the corrected version.
+    with open ('reset_corrected.csv', 'w') as new_file:
+        #open the newly created file as a CSV with columns for time and corrected overflow anemometer_rpm
+        writer = csv.writer(new_file)
+        #write the header (the column names)
+        writer.writerow(ANEMOMETER_KEYS)
+        #write every row to the new CSV, but with the corrected anemometer value.
+        writer.writerows(instrumentation.counted(name, 'rows_out', reset_corrected_compact_rows(list_of_entries)))
+
+
+#function to create the state used by reset_corrected_rows.
+#the state is a plain dictionary so that it can be saved between runs over a growing file.
+def new_reset_state():
+    #set previous rpm to 0.
+    #the values are corrected by finding differences between consecutive rows, but the first row is correct
+    #as the anemometer_rpm was initialized 0 at the beginning.
+    return {'previous_rpm': 0}
+
+
+#function to correct the lack of a reset in a stream of overflow corrected anemometer rows
+#(the rows correct_lack_of_reset writes).
+#this is an adapter over reset_corrected_compact_rows for rows that are dictionaries: each row is updated in place.
+#arg rows, an iterable of dictionaries with an anemometer_rpm.
+#arg state, the state from new_reset_state carrying the rpm of the last row between calls (updated in place).
+def reset_corrected_rows(rows, state=None):
+    #the dictionary read for the row reset_corrected_compact_rows is correcting.
+    waiting = collections.deque()
+
+    #function to turn each dictionary into a compact row of its time and anemometer_rpm.
+    def rpm_rows():
+        for dictionary in rows:
+            waiting.append(dictionary)
+            yield (dictionary.get('time'), dictionary['anemometer_rpm'])
+    for time, rpm in reset_corrected_compact_rows(rpm_rows(), state):
+        dictionary = waiting.popleft()
+        #set the value for anemometer_rpm in the row to the corrected rpm
+        dictionary['anemometer_rpm'] = rpm
+        yield dictionary
+
+
+#function to correct the lack of a reset in a stream of compact rows of the time and anemometer_rpm
+#(see compact_rows.py).
+#arg rows, an iterable of (time, anemometer_rpm) rows.
+#arg state, the state from new_reset_state carrying the rpm of the last row between calls (updated in place).
+#yields rows of compact_rows.row_type(ANEMOMETER_KEYS): the time and the corrected anemometer_rpm.
+def reset_corrected_compact_rows(rows, state=None):
+    if state is None:
+        state = new_reset_state()
+    make_row = compact_rows.row_maker(ANEMOMETER_KEYS)
+    #iterate through the rows.
+    for time, text in rows:
+        #set integer rpm equal to the rpm at the current row.
+        rpm = int(text)
+        #correct this rpm by subtracting the previous row to get the difference.
+        corrected = rpm - state['previous_rpm']
+        #set previous_rpm to the raw (uncorrected) rpm in the row
+        state['previous_rpm'] = rpm
+        yield make_row((time, corrected))
+
+
+#function to create the state used by recover_rpm_rows.
+#the state is a plain dictionary so that it can be saved between runs over a growing file.
+def new_recovery_state():
+    return {
+        #the raw count in the previous reading (the counter starts at 0).
+        'previous_count': 0,
+        #the time of the previous reading (None before the first reading).
+        'previous_time': None,
+        #the unwrapped count of rotations since the Arduino started.
+        'unwrapped': 0,
+    }
+
+
+#function to find the number of rotations between two raw readings of the counter.
+#the counter is a 16 bit integer, so the difference is taken modulo COUNTER_RANGE (a true modular unwrap).
+#if that is more rotations than the anemometer could make in the time between the readings the counter
+#must have started again from 0, so the rotations are just the count since it restarted.
+#arg previous_count, count: the raw counts of the two readings.
+#arg interval: the seconds between the two readings.
+#arg max_rpm: the fastest plausible rpm.
+#returns a tuple of the rotations and whether the counter was reset.
+def rotations_between(previous_count, count, interval, max_rpm):
+    rotations = (count - previous_count) % COUNTER_RANGE
+    if rotations > max_rpm * max(interval, NOMINAL_INTERVAL) / 60.0:
+        return count % COUNTER_RANGE, True
+    return rotations, False
+
+
+#function to recover the rpm from a stream of raw anemometer readings in a single pass, fixing both the
+#overflows and the lack of a reset (what correct_overflows followed by correct_lack_of_reset does).
+#arg rows, an iterable of dictionaries with a time and the raw anemometer_rpm (such as the rows of geiger.csv).
+#arg state, the state from new_recovery_state carried between calls (updated in place).
+#arg max_rpm, the fastest plausible rpm (see MAX_PLAUSIBLE_RPM).
+#yields dictionaries with the columns in RECOVERED_KEYS. the first reading is assumed to cover NOMINAL_INTERVAL
+#seconds since the counter started, and readings with no time since the previous one have an empty rpm.
+def recover_rpm_rows(rows, state=None, max_rpm=MAX_PLAUSIBLE_RPM):
+    if state is None:
+        state = new_recovery_state()
+    for dictionary in rows:
+        time = float(dictionary['time'])
+        count = int(dictionary['anemometer_rpm'])
+        if state['previous_time'] is None:
+            interval = NOMINAL_INTERVAL
+        else:
+            interval = time - state['previous_time']
+        rotations, reset = rotations_between(state['previous_count'], count, interval, max_rpm)
+        if reset:
+            state['unwrapped'] = rotations
+        else:
+            state['unwrapped'] += rotations
+        state['previous_count'] = count
+        state['previous_time'] = time
+        yield {
+            'time': dictionary['time'],
+            'anemometer_rpm': rotations * 60.0 / interval if interval > 0 else '',
+            'rotations': rotations,
+            'interval': interval,
+            #the number of times the signed counter has passed 32,767 and wrapped.
+            'wraps': (state['unwrapped'] - MIN_16_BIT_INTEGER) // COUNTER_RANGE,
+            'reset': 1 if reset else 0,
+        }
+
+
+#function to recover the rpm from a CSV of raw anemometer readings in one pass (see recover_rpm_rows).
+#arg filename, the filename of the raw data (such as geiger.csv).
+#arg output_name, the filename of the CSV to create with the columns in RECOVERED_KEYS.
+#arg max_rpm, the fastest plausible rpm (see MAX_PLAUSIBLE_RPM).
+@instrumentation.instrumented(inputs=('filename',), outputs=('output_name',))
+def recover_rpm(filename, output_name='rpm_recovered.csv', max_rpm=MAX_PLAUSIBLE_RPM):
+    name = 'anemometer.recover_rpm'
+    with open(filename, 'r') as original_file, open(output_name, 'w') as new_file:
+        writer = csv.DictWriter(new_file, RECOVERED_KEYS)
+        writer.writeheader()
+        rows = instrumentation.counted(name, 'rows_in', csv.DictReader(original_file))
+        writer.writerows(instrumentation.counted(name, 'rows_out', recover_rpm_rows(rows, max_rpm=max_rpm)))
+
+
+#function to load the times and raw counts of a CSV of raw anemometer readings as numpy arrays for
+#recover_rpm_arrays. the columns are parsed once and then read from a cache next to the CSV (see csv_cache.py).
+#arg filename, the filename of the raw data (such as geiger.csv).
+#arg cache_directory, the directory to keep the cache in (see csv_cache.load_columns).
+#arg verify, if True hash the CSV on every load so a change that kept its size and modification time is seen.
+#returns a tuple of a float numpy array of the times and an integer numpy array of the raw counts.
+#raises ValueError if a reading has no time or no count, which recover_rpm_rows can't recover either.
+def load_readings(filename, cache_directory=None, verify=False):
+    columns = csv_cache.load_columns(filename, cache_directory, verify)
+    for key in ANEMOMETER_KEYS:
+        if numpy.ma.getmaskarray(columns[key]).any():
+            raise ValueError('a reading in ' + filename + ' has no ' + key)
+    #int would refuse a count that isn't a whole number, so the cast to integers must not round one.
+    if len(columns['anemometer_rpm']) > 0 and columns['anemometer_rpm'].dtype.kind != 'i':
+        raise ValueError('the counts in ' + filename + ' are not all whole numbers')
+    return columns['time'].data.astype(numpy.float64), columns['anemometer_rpm'].data.astype(numpy.int64)
 
 
+#function to recover the rpm from whole arrays of raw anemometer readings at once with numpy.
+#gives the same results as recover_rpm_rows.
+#arg times, a numpy array of the times of the readings.
+#arg counts, a numpy array of the raw counts (the anemometer_rpm column of the raw data).
+#arg max_rpm, the fastest plausible rpm (see MAX_PLAUSIBLE_RPM).
+#returns a dictionary of numpy arrays for every column in RECOVERED_KEYS except time.
+#the rpm is NaN for readings with no time since the previous one.
+def recover_rpm_arrays(times, counts, max_rpm=MAX_PLAUSIBLE_RPM):
+    times = numpy.asarray(times, dtype=numpy.float64)
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    if len(counts) == 0:
+        empty = numpy.zeros(0)
+        return {'anemometer_rpm': empty, 'rotations': empty.astype(numpy.int64), 'interval': empty,
+                'wraps': empty.astype(numpy.int64), 'reset': empty.astype(numpy.int64)}
+    #the first reading covers NOMINAL_INTERVAL seconds since the counter started at 0.
+    intervals = numpy.concatenate(([NOMINAL_INTERVAL], numpy.diff(times)))
+    previous_counts = numpy.concatenate(([0], counts[:-1]))
+    rotations = numpy.mod(counts - previous_counts, COUNTER_RANGE)
+    resets = rotations > max_rpm * numpy.maximum(intervals, NOMINAL_INTERVAL) / 60.0
+    rotations[resets] = numpy.mod(counts[resets], COUNTER_RANGE)
+    #the unwrapped count is the running total of rotations, starting again at every reset.
+    totals = numpy.cumsum(rotations)
+    #the running total just before the start of the segment (since the last reset) each reading is in.
+    segment_starts = numpy.where(resets, numpy.arange(len(counts)), 0)
+    segment_starts = numpy.maximum.accumulate(segment_starts)
+    before_segment = totals[segment_starts] - rotations[segment_starts]
+    before_segment[segment_starts == 0] = 0
+    unwrapped = totals - before_segment
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        rpm = numpy.where(intervals > 0, rotations * 60.0 / intervals, numpy.nan)
+    return {
+        'anemometer_rpm': rpm,
+        'rotations': rotations,
+        'interval': intervals,
+        'wraps': (unwrapped - MIN_16_BIT_INTEGER) // COUNTER_RANGE,
+        'reset': resets.astype(numpy.int64),
+    }
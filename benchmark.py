@@ -0,0 +1,645 @@
+'''
+    File name: benchmark.py
+    Python Version: 3.6
+    Description: Provides functions to time the data cleaning functions on the launch data
+    so that changes to them can be compared against the way they used to run.
+
+    Running this file directly runs the altitude and parallel fill benchmarks on the files from the
+    launch. With --functions it instead times every public function of altitude_calculator.py and
+    anemometer.py on a synthetic flight (see synthetic_flight.py) of any size, each in its own process
+    so the peak memory of one function doesn't hide the next, and reports rows per second, wall time
+    and peak memory. The results can be saved as a baseline and later runs compared against it:
+    python benchmark.py --functions --flights 10 --save-baseline baseline.json
+    python benchmark.py --functions --flights 10 --compare baseline.json
+'''
+
+#import argparse to read the benchmark options from the command line.
+import argparse
+#import the python CSV module to read the pressures out of the datasets.
+import csv
+#import filecmp to check the parallel output is the same as the serial output.
+import filecmp
+#import inspect to find the public functions that have no benchmark.
+import inspect
+#import itertools to hold a sample of rows in memory.
+import itertools
+#import json to pass results between processes and to save and load baselines.
+import json
+#import os to remove the outputs of the benchmarks.
+import os
+#import resource to measure the peak memory of each benchmark.
+import resource
+#import shutil to copy the input of the compact row benchmark and remove its directory.
+import shutil
+#import subprocess to run each function benchmark in a fresh process.
+import subprocess
+#import sys to find the python interpreter and this file for the benchmark processes.
+import sys
+#import tempfile to create a directory for the compact row benchmark to write in.
+import tempfile
+#import timeit to get the most precise timer available on this platform.
+import timeit
+
+#import tracemalloc to measure the memory of each kind of row (it is only available from python 3.4).
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+#import numpy to compare the results of the scalar and batch altitude calculations.
+import numpy
+
+#import the altitude calculator module to benchmark its functions.
+import altitude_calculator
+#import the anemometer module to benchmark its functions.
+import anemometer
+#import the compact rows module to measure the memory of compact rows.
+import compact_rows
+#import the parallel module to benchmark running the functions on several processes.
+import parallel
+#import the synthetic flight module to generate the data for the function benchmarks.
+import synthetic_flight
+
+
+#function to time a function call the best out of repeat times.
+#arg function: the function to call with no arguments.
+#arg repeat: the number of times to call the function.
+#returns a tuple of the best time in seconds and the result of the last call.
+def best_time(function, repeat=3):
+    best = None
+    result = None
+    for attempt in range(repeat):
+        start = timeit.default_timer()
+        result = function()
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+#function to compare calculating altitude one pressure at a time with get_altitude_from_pressure
+#against calculating it for every pressure at once with get_altitudes_from_pressures.
+#arg filename: a CSV with pressure columns in pascals, such as confidence_pressure_final.csv.
+#arg columns: the pressure columns to calculate altitude for (like confidence_interval_altitude does).
+#arg repeat: the number of times to run each calculation (the best time is kept).
+#returns a dictionary with the number of pressures, both times and the speedup.
+def benchmark_altitude(filename='confidence_pressure_final.csv', columns=('pressure_normal', 'pressure_2.5', 'pressure_97.5'),
+                       repeat=3):
+    #read every pressure in the given columns.
+    with open(filename, 'r') as original_file:
+        pressures = []
+        for row in csv.DictReader(original_file):
+            for column in columns:
+                pressures.append(float(row[column]))
+
+    #the altitudes are the same either way (see tests/test_altitude_model.py), so only the time is kept.
+    scalar_time = best_time(
+        lambda: [altitude_calculator.get_altitude_from_pressure(pressure) for pressure in pressures], repeat)[0]
+    batch_time, batch_altitudes = best_time(
+        lambda: altitude_calculator.get_altitudes_from_pressures(pressures), repeat)
+
+    #function to calculate every altitude a chunk at a time with a new evaluator (like confidence_interval_altitude).
+    def evaluate(table):
+        evaluator = altitude_calculator.new_altitude_evaluator(table=table)
+        altitudes = []
+        for chunk in altitude_calculator.read_in_chunks(pressures):
+            altitudes.extend(altitude_calculator.evaluate_altitudes(evaluator, chunk))
+        return altitudes, altitude_calculator.altitude_cache_statistics(evaluator)
+    cached_time, (cached_altitudes, statistics) = best_time(lambda: evaluate(False), repeat)
+    if cached_altitudes != batch_altitudes.tolist():
+        raise AssertionError('cached altitudes do not match get_altitudes_from_pressures')
+    table_time, (table_altitudes, table_statistics) = best_time(lambda: evaluate(True), repeat)
+
+    return {
+        'pressures': len(pressures),
+        'scalar_seconds': scalar_time,
+        'batch_seconds': batch_time,
+        'speedup': scalar_time / batch_time,
+        'cached_seconds': cached_time,
+        'hit_rate': statistics['hit_rate'],
+        'table_seconds': table_time,
+        'table_max_error': float(numpy.max(numpy.abs(numpy.array(table_altitudes) - batch_altitudes))),
+    }
+
+
+#function to time parallel_fill_in_missing_data with different numbers of processes
+#against fill_in_missing_data, checking that every output is the same as the serial output.
+#arg filename: a time sorted master file such as altitude_added.csv.
+#arg worker_counts: the numbers of processes to try.
+#arg chunk_bytes: the size of the range of rows filled by each process (small enough to give every process work).
+#returns a dictionary of number of processes (0 for fill_in_missing_data itself) to the time in seconds.
+def benchmark_parallel_fill(filename='altitude_added.csv', worker_counts=(1, 2, 4, 8), chunk_bytes=1024 * 1024,
+                            repeat=1):
+    serial_name = 'benchmark_serial_filled.csv'
+    parallel_name = 'benchmark_parallel_filled.csv'
+    times = {}
+    try:
+        times[0] = best_time(lambda: altitude_calculator.fill_in_missing_data(filename, serial_name), repeat)[0]
+        for workers in worker_counts:
+            times[workers] = best_time(lambda: parallel.parallel_fill_in_missing_data(
+                filename, parallel_name, workers, chunk_bytes), repeat)[0]
+            if not filecmp.cmp(serial_name, parallel_name, shallow=False):
+                raise AssertionError('parallel fill with %d processes does not match the serial fill' % workers)
+    finally:
+        for name in (serial_name, parallel_name):
+            if os.path.exists(name):
+                os.remove(name)
+    return times
+
+
+#function to time writing a file from dictionaries (csv.DictReader, csv.DictWriter and the dictionary adapters
+#add_altitude_rows and filter_rows) against writing it from compact rows (see compact_rows.py), for
+#add_altitude_if_pressure_present and filter_file, checking that both ways write the same bytes. also measures the memory taken by the rows themselves.
+#arg filename: a time sorted master file such as altitude_added.csv.
+#arg keys: the keys to filter out of it (FILTER_KEYS by default).
+#arg repeat: the number of times to run each way (the best time is kept).
+#arg sample_rows: the number of rows held in memory at once to measure the memory of each kind of row.
+#returns a dictionary of the number of rows, the time of each way for each function, and the bytes allocated per
+#row held as a dictionary and as a compact row (None without tracemalloc).
+def benchmark_compact_rows(filename='altitude_added.csv', keys=None, repeat=3, sample_rows=10000):
+    if keys is None:
+        keys = FILTER_KEYS
+    #add_altitude_if_pressure_present always writes altitude_added.csv, so run in a temporary directory
+    #to leave the files in this one alone.
+    directory = tempfile.mkdtemp()
+    source_name = os.path.join(directory, 'source.csv')
+    shutil.copy(filename, source_name)
+    original_directory = os.getcwd()
+    os.chdir(directory)
+
+    #function to add the altitude from dictionaries.
+    def add_altitude_from_dictionaries():
+        with open(source_name, 'r') as original_file, open('dict_rows.csv', 'w') as new_file:
+            writer = csv.DictWriter(new_file, altitude_calculator.KEYS)
+            writer.writeheader()
+            writer.writerows(altitude_calculator.add_altitude_rows(csv.DictReader(original_file)))
+
+    #function to filter the file from dictionaries.
+    def filter_from_dictionaries():
+        with open(source_name, 'r') as original_file, open('dict_rows.csv', 'w') as new_file:
+            writer = csv.DictWriter(new_file, ['time', 'altitude'] + list(keys))
+            writer.writeheader()
+            writer.writerows(altitude_calculator.filter_rows(csv.DictReader(original_file), keys))
+
+    try:
+        result = {'rows': count_rows(source_name)}
+        comparisons = [
+            ('add_altitude', add_altitude_from_dictionaries,
+             lambda: altitude_calculator.add_altitude_if_pressure_present(source_name), 'altitude_added.csv'),
+            ('filter', filter_from_dictionaries,
+             lambda: altitude_calculator.filter_file(source_name, keys, 'filtered.csv'), 'filtered.csv'),
+        ]
+        for label, dictionary_way, compact_way, compact_name in comparisons:
+            result[label + '_dict_seconds'] = best_time(dictionary_way, repeat)[0]
+            result[label + '_compact_seconds'] = best_time(compact_way, repeat)[0]
+            result[label + '_speedup'] = result[label + '_dict_seconds'] / result[label + '_compact_seconds']
+            if not filecmp.cmp('dict_rows.csv', compact_name, shallow=False):
+                raise AssertionError(label + ' from compact rows does not match the output from dictionaries')
+
+        result['dict_row_bytes'] = None
+        result['compact_row_bytes'] = None
+        if tracemalloc is not None:
+            #function to measure the bytes allocated to hold up to sample_rows rows at once.
+            def bytes_per_row(rows):
+                tracemalloc.start()
+                try:
+                    held = list(itertools.islice(rows, sample_rows))
+                    size = tracemalloc.get_traced_memory()[0]
+                finally:
+                    tracemalloc.stop()
+                return size / float(max(len(held), 1))
+            with open(source_name, 'r') as original_file:
+                result['dict_row_bytes'] = bytes_per_row(csv.DictReader(original_file))
+            result['compact_row_bytes'] = bytes_per_row(compact_rows.read_projected_rows(
+                source_name, altitude_calculator.KEYS))
+    finally:
+        os.chdir(original_directory)
+        shutil.rmtree(directory)
+    return result
+
+
+#the sensor files of the synthetic flight, in the order generate_combined_spreadsheet takes them.
+SENSOR_FILES = ('geiger.csv', 'pressure.csv', 'gps.csv', 'interior.csv')
+#the renames of the sensor files, in the same order.
+SENSOR_RENAMES = (altitude_calculator.GEIGER_RENAMES, altitude_calculator.PRESSURE_RENAMES,
+                  altitude_calculator.GPS_RENAMES, altitude_calculator.INTERIOR_RENAMES)
+#the keys the filter benchmark keeps.
+FILTER_KEYS = ['geiger_cpm', 'anemometer_rpm']
+#the outputs the extract benchmarks write (one per Arduino).
+EXTRACT_OUTPUTS = {
+    'benchmark_extract_geiger.csv': ['geiger_cpm', 'anemometer_rpm'],
+    'benchmark_extract_solar.csv': ['blue_voltage', 'red_voltage', 'white_voltage'],
+    'benchmark_extract_sound.csv': ['sound_time'],
+    'benchmark_extract_gps.csv': ['lat', 'lng'],
+}
+#the default fraction a function can get slower (or use more memory) than its baseline before it is a regression.
+REGRESSION_THRESHOLD = 0.25
+#times closer to the baseline than this many seconds are never a regression (they are mostly noise).
+MIN_REGRESSION_SECONDS = 0.05
+#peak memory closer to the baseline than this many kilobytes is never a regression.
+MIN_REGRESSION_KB = 1024
+
+
+#function to read one column of a CSV as floats, skipping rows where it is empty.
+def read_floats(filename, column):
+    with open(filename, 'r') as original_file:
+        return [float(row[column]) for row in csv.DictReader(original_file) if len(row[column]) > 0]
+
+
+#function to read a CSV as a stream of dictionaries, closing the file once it has been read.
+def read_rows(filename):
+    with open(filename, 'r') as original_file:
+        for row in csv.DictReader(original_file):
+            yield row
+
+
+#function to run a stream to the end without keeping its items.
+#returns the number of items.
+def consume(items):
+    count = 0
+    for item in items:
+        count += 1
+    return count
+
+
+#function to count the rows of a CSV (not including the header).
+def count_rows(filename):
+    with open(filename, 'rb') as data_file:
+        return max(0, sum(1 for line in data_file) - 1)
+
+
+#function to get the peak memory (resident set size) of this process so far in kilobytes.
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #macOS reports bytes rather than kilobytes.
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+#function to generate a synthetic flight in directory and every intermediate file the function benchmarks read.
+#arg directory: the directory to write the files to.
+#arg flights, duration, seed: passed to synthetic_flight.generate_flight.
+def prepare_benchmark_inputs(directory, flights=1, duration=synthetic_flight.FLIGHT_DURATION, seed=0):
+    synthetic_flight.generate_flight(directory, flights, duration, seed)
+    working_directory = os.getcwd()
+    #several of the functions write to fixed filenames in the working directory.
+    os.chdir(directory)
+    try:
+        altitude_calculator.generate_sorted_combined_spreadsheet(*SENSOR_FILES)
+        altitude_calculator.add_altitude_if_pressure_present('master_sorted.csv')
+        altitude_calculator.time_based_deduplicate_csv('altitude_added.csv')
+        anemometer.correct_overflows('geiger.csv')
+        #the pressures for the error bars and the temperatures come from the interior sensor.
+        with open('confidence_pressure.csv', 'w') as confidence_file, \
+                open('interior_temperature.csv', 'w') as temperature_file:
+            confidence_writer = csv.writer(confidence_file)
+            confidence_writer.writerow(['interior_pressure', 'pressure_normal', 'pressure_2.5', 'pressure_97.5'])
+            temperature_writer = csv.writer(temperature_file)
+            temperature_writer.writerow(['time', 'calibrated_temperature', 'pressure'])
+            for row in read_rows('interior.csv'):
+                calibrated = float(row['calibrated_pressure'])
+                confidence_writer.writerow([row['pressure'], row['calibrated_pressure'], repr(calibrated * .998),
+                                            repr(calibrated * 1.002)])
+                temperature_writer.writerow([row['time'], row['temperature'], row['calibrated_pressure']])
+        altitude_calculator.add_altitude_temperature('interior_temperature.csv')
+    finally:
+        os.chdir(working_directory)
+
+
+#the benchmarks of the public functions of altitude_calculator and anemometer, by function name.
+#each is a tuple of the input files (their rows are the rows processed), a function preparing anything
+#that shouldn't be timed (or None) and a function taking what it prepared and calling the function.
+#every benchmark runs in the directory prepared by prepare_benchmark_inputs.
+FUNCTION_BENCHMARKS = {
+    'altitude_calculator.generate_combined_spreadsheet': (
+        SENSOR_FILES, None, lambda prepared: altitude_calculator.generate_combined_spreadsheet(*SENSOR_FILES)),
+    'altitude_calculator.generate_sorted_combined_spreadsheet': (
+        SENSOR_FILES, None,
+        lambda prepared: altitude_calculator.generate_sorted_combined_spreadsheet(
+            *SENSOR_FILES, output_name='benchmark_master_sorted.csv')),
+    'altitude_calculator.merge_by_time': (
+        SENSOR_FILES, None,
+        lambda prepared: consume(altitude_calculator.complete_rows(altitude_calculator.merge_by_time(
+            [altitude_calculator.read_sensor_rows(filename, renames)
+             for filename, renames in zip(SENSOR_FILES, SENSOR_RENAMES)], [0] * len(SENSOR_FILES))))),
+    'altitude_calculator.get_altitude_from_pressure': (
+        ['interior.csv'], lambda: read_floats('interior.csv', 'calibrated_pressure'),
+        lambda pressures: [altitude_calculator.get_altitude_from_pressure(pressure) for pressure in pressures]),
+    'altitude_calculator.get_altitudes_from_pressures': (
+        ['interior.csv'], lambda: read_floats('interior.csv', 'calibrated_pressure'),
+        altitude_calculator.get_altitudes_from_pressures),
+    'altitude_calculator.evaluate_altitudes': (
+        ['interior.csv'], lambda: read_floats('interior.csv', 'calibrated_pressure'),
+        lambda pressures: altitude_calculator.evaluate_altitudes(altitude_calculator.new_altitude_evaluator(), pressures)),
+    'altitude_calculator.table_altitudes': (
+        ['interior.csv'],
+        lambda: (altitude_calculator.new_altitude_table(), read_floats('interior.csv', 'calibrated_pressure')),
+        lambda prepared: altitude_calculator.table_altitudes(*prepared)),
+    'altitude_calculator.add_altitude_if_pressure_present': (
+        ['master_sorted.csv'], None,
+        lambda prepared: altitude_calculator.add_altitude_if_pressure_present('master_sorted.csv')),
+    'altitude_calculator.fill_in_missing_points': (
+        ['time_deduped.csv'], None,
+        lambda prepared: altitude_calculator.fill_in_missing_points('time_deduped.csv', 'geiger_cpm',
+                                                                    'benchmark_geiger_filled.csv')),
+    'altitude_calculator.fill_in_missing_data': (
+        ['time_deduped.csv'], None,
+        lambda prepared: altitude_calculator.fill_in_missing_data('time_deduped.csv', 'benchmark_filled.csv')),
+    'altitude_calculator.deduplicate': (
+        ['altitude_added.csv'], None,
+        lambda prepared: consume(altitude_calculator.deduplicate(read_rows('altitude_added.csv'),
+                                                                 lambda row: row['time']))),
+    'altitude_calculator.external_deduplicate': (
+        ['altitude_added.csv'], None,
+        lambda prepared: consume(altitude_calculator.external_deduplicate(read_rows('altitude_added.csv'),
+                                                                          lambda row: row['time'], 10000))),
+    'altitude_calculator.fully_deduplicate_csv': (
+        ['altitude_added.csv'], None,
+        lambda prepared: altitude_calculator.fully_deduplicate_csv('altitude_added.csv', 'benchmark_deduped.csv')),
+    'altitude_calculator.time_based_deduplicate_csv': (
+        ['altitude_added.csv'], None,
+        lambda prepared: altitude_calculator.time_based_deduplicate_csv('altitude_added.csv',
+                                                                        'benchmark_time_deduped.csv')),
+    'altitude_calculator.filter_file': (
+        ['time_deduped.csv'], None,
+        lambda prepared: altitude_calculator.filter_file('time_deduped.csv', FILTER_KEYS, 'benchmark_filtered.csv')),
+    'altitude_calculator.extract_files': (
+        ['altitude_added.csv'], None,
+        lambda prepared: altitude_calculator.extract_files('altitude_added.csv', EXTRACT_OUTPUTS)),
+    'altitude_calculator.extract_files_from_sensors': (
+        SENSOR_FILES, None,
+        lambda prepared: altitude_calculator.extract_files_from_sensors(*SENSOR_FILES, outputs=EXTRACT_OUTPUTS)),
+    'altitude_calculator.asof_join': (
+        ['gps.csv', 'interior.csv'], None,
+        lambda prepared: consume(altitude_calculator.asof_join(
+            read_rows('gps.csv'), altitude_calculator.read_altitude_series('interior.csv')))),
+    'altitude_calculator.asof_join_arrays': (
+        ['gps.csv', 'interior.csv'],
+        lambda: (read_floats('gps.csv', 'time'), altitude_calculator.load_altitude_arrays('interior.csv')),
+        lambda prepared: altitude_calculator.asof_join_arrays(prepared[0], *prepared[1])),
+    'altitude_calculator.attach_altitude': (
+        ['gps.csv', 'interior.csv'], None,
+        lambda prepared: altitude_calculator.attach_altitude('gps.csv', ['lat', 'lng'], 'benchmark_gps_altitude.csv')),
+    'altitude_calculator.confidence_interval_altitude': (
+        ['confidence_pressure.csv'], None,
+        lambda prepared: altitude_calculator.confidence_interval_altitude('confidence_pressure.csv')),
+    'altitude_calculator.add_altitude_temperature': (
+        ['interior_temperature.csv'], None,
+        lambda prepared: altitude_calculator.add_altitude_temperature('interior_temperature.csv')),
+    'altitude_calculator.summary_altitude': (
+        ['altitude_interior_temperature.csv'], None,
+        lambda prepared: altitude_calculator.summary_altitude('altitude_interior_temperature.csv')),
+    'anemometer.correct_overflows': (
+        ['geiger.csv'], None, lambda prepared: anemometer.correct_overflows('geiger.csv')),
+    'anemometer.correct_lack_of_reset': (
+        ['overflow_corrected.csv'], None, lambda prepared: anemometer.correct_lack_of_reset('overflow_corrected.csv')),
+    'anemometer.recover_rpm': (
+        ['geiger.csv'], None, lambda prepared: anemometer.recover_rpm('geiger.csv', 'benchmark_rpm_recovered.csv')),
+    'anemometer.recover_rpm_arrays': (
+        ['geiger.csv'], lambda: anemometer.load_readings('geiger.csv'),
+        lambda prepared: anemometer.recover_rpm_arrays(*prepared)),
+}
+
+#the public functions without a benchmark of their own, and the benchmark they are timed as part of.
+COVERED_BY = {
+    'altitude_calculator.read_sensor_rows': 'altitude_calculator.merge_by_time',
+    'altitude_calculator.high_altitudes': 'altitude_calculator.get_altitudes_from_pressures',
+    'altitude_calculator.middle_altitudes': 'altitude_calculator.get_altitudes_from_pressures',
+    'altitude_calculator.low_altitudes': 'altitude_calculator.get_altitudes_from_pressures',
+    'altitude_calculator.new_altitude_table': 'altitude_calculator.table_altitudes',
+    'altitude_calculator.new_altitude_evaluator': 'altitude_calculator.evaluate_altitudes',
+    'altitude_calculator.altitude_cache_statistics': 'altitude_calculator.evaluate_altitudes',
+    'altitude_calculator.read_in_chunks': 'altitude_calculator.add_altitude_if_pressure_present',
+    'altitude_calculator.add_altitude_rows': 'altitude_calculator.add_altitude_if_pressure_present',
+    'altitude_calculator.add_altitude_compact_rows': 'altitude_calculator.add_altitude_if_pressure_present',
+    'altitude_calculator.new_fill_state': 'altitude_calculator.fill_in_missing_data',
+    'altitude_calculator.fill_rows': 'altitude_calculator.fill_in_missing_data',
+    'altitude_calculator.digest': 'altitude_calculator.deduplicate',
+    'altitude_calculator.write_sorted_runs': 'altitude_calculator.external_deduplicate',
+    'altitude_calculator.merge_sorted_runs': 'altitude_calculator.external_deduplicate',
+    'altitude_calculator.deduplicate_csv': 'altitude_calculator.time_based_deduplicate_csv',
+    'altitude_calculator.filter_rows': 'altitude_calculator.filter_file',
+    'altitude_calculator.filter_compact_rows': 'altitude_calculator.filter_file',
+    'altitude_calculator.extract_rows': 'altitude_calculator.extract_files',
+    'altitude_calculator.extract_compact_rows': 'altitude_calculator.extract_files',
+    'altitude_calculator.complete_rows': 'altitude_calculator.merge_by_time',
+    'altitude_calculator.read_altitude_series': 'altitude_calculator.asof_join',
+    'altitude_calculator.pick_asof_value': 'altitude_calculator.asof_join',
+    'altitude_calculator.load_altitude_arrays': 'altitude_calculator.asof_join_arrays',
+    'anemometer.overflow_corrected_rows': 'anemometer.correct_overflows',
+    'anemometer.overflow_corrected_compact_rows': 'anemometer.correct_overflows',
+    'anemometer.new_reset_state': 'anemometer.correct_lack_of_reset',
+    'anemometer.reset_corrected_rows': 'anemometer.correct_lack_of_reset',
+    'anemometer.reset_corrected_compact_rows': 'anemometer.correct_lack_of_reset',
+    'anemometer.new_recovery_state': 'anemometer.recover_rpm',
+    'anemometer.rotations_between': 'anemometer.recover_rpm',
+    'anemometer.recover_rpm_rows': 'anemometer.recover_rpm',
+    'anemometer.load_readings': 'anemometer.recover_rpm_arrays',
+}
+
+
+#function to find the public functions of altitude_calculator and anemometer that aren't benchmarked,
+#so a new function can't be added without a benchmark going unnoticed.
+#returns a sorted list of function names.
+def uncovered_functions():
+    uncovered = []
+    for module in (altitude_calculator, anemometer):
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            full_name = module.__name__ + '.' + name
+            if (not name.startswith('_') and function.__module__ == module.__name__
+                    and full_name not in FUNCTION_BENCHMARKS and full_name not in COVERED_BY):
+                uncovered.append(full_name)
+    return sorted(uncovered)
+
+
+#function to run one function benchmark in this process (in the directory prepared by prepare_benchmark_inputs).
+#arg name: the name of the benchmark in FUNCTION_BENCHMARKS.
+#returns a dictionary with the rows processed, the wall time in seconds, the rows per second, the peak memory of
+#the process in kilobytes and how much the peak memory grew while the function ran.
+def run_function_benchmark(name):
+    inputs, setup, run = FUNCTION_BENCHMARKS[name]
+    rows = sum(count_rows(filename) for filename in inputs)
+    prepared = setup() if setup is not None else None
+    peak_before = peak_rss_kb()
+    start = timeit.default_timer()
+    run(prepared)
+    seconds = timeit.default_timer() - start
+    peak = peak_rss_kb()
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else None,
+        'peak_rss_kb': peak,
+        'rss_growth_kb': peak - peak_before,
+    }
+
+
+#function to run one function benchmark in a fresh python process, so its peak memory is its own.
+#arg name: the name of the benchmark in FUNCTION_BENCHMARKS.
+#arg directory: the directory prepared by prepare_benchmark_inputs.
+#returns the result of run_function_benchmark, or a dictionary with the error if the function failed.
+def run_function_benchmark_in_process(name, directory):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run-one', name],
+                               cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, errors = process.communicate()
+    lines = output.decode('utf-8').strip().splitlines()
+    if process.returncode != 0 or len(lines) == 0:
+        error_lines = errors.decode('utf-8').strip().splitlines()
+        return {'error': error_lines[-1] if len(error_lines) > 0 else 'exit code %d' % process.returncode}
+    #the result is the last line printed (the function may print its own warnings first).
+    return json.loads(lines[-1])
+
+
+#function to time every public function of altitude_calculator and anemometer on a synthetic flight.
+#arg directory: the directory to generate the flight in.
+#arg flights, duration, seed: passed to synthetic_flight.generate_flight.
+#arg names: the benchmarks to run, or None for all of FUNCTION_BENCHMARKS.
+#arg repeat: the number of processes to run each benchmark in (the fastest run is kept).
+#returns a report: a dictionary with the flight the benchmarks ran on and a dictionary of benchmark name to result.
+def benchmark_functions(directory='benchmark_flight', flights=1, duration=synthetic_flight.FLIGHT_DURATION, seed=0,
+                        names=None, repeat=1):
+    prepare_benchmark_inputs(directory, flights, duration, seed)
+    if names is None:
+        names = sorted(FUNCTION_BENCHMARKS)
+    results = {}
+    for name in names:
+        for attempt in range(repeat):
+            result = run_function_benchmark_in_process(name, directory)
+            #keep the fastest run, or any run that worked over one that failed.
+            if (name not in results or 'error' in results[name]
+                    or ('error' not in result and result['seconds'] < results[name]['seconds'])):
+                results[name] = result
+    return {'flights': flights, 'duration': duration, 'seed': seed, 'results': results}
+
+
+#function to save a report from benchmark_functions as a baseline to compare later runs against.
+def save_baseline(report, filename):
+    with open(filename, 'w') as baseline_file:
+        json.dump(report, baseline_file, indent=2, sort_keys=True)
+
+
+#function to read a baseline saved by save_baseline.
+def load_baseline(filename):
+    with open(filename, 'r') as baseline_file:
+        return json.load(baseline_file)
+
+
+#function to find the functions that got slower, use more memory or fail since a baseline.
+#arg report: a report from benchmark_functions.
+#arg baseline: a report from an earlier run on the same flight (see load_baseline).
+#arg threshold: the fraction a function can get slower or use more memory before it is a regression.
+#returns a list of descriptions of the regressions (empty if there are none).
+def compare_to_baseline(report, baseline, threshold=REGRESSION_THRESHOLD):
+    for key in ('flights', 'duration', 'seed'):
+        if report[key] != baseline[key]:
+            raise ValueError('the baseline was run with %s %s but this run used %s' % (key, baseline[key], report[key]))
+    regressions = []
+    for name in sorted(report['results']):
+        result = report['results'][name]
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        if 'error' in result:
+            if 'error' not in old:
+                regressions.append('%s now fails: %s' % (name, result['error']))
+            continue
+        if 'error' in old:
+            continue
+        if (result['seconds'] > old['seconds'] * (1 + threshold)
+                and result['seconds'] - old['seconds'] > MIN_REGRESSION_SECONDS):
+            regressions.append('%s is slower: %.3fs, was %.3fs' % (name, result['seconds'], old['seconds']))
+        if (result['peak_rss_kb'] > old['peak_rss_kb'] * (1 + threshold)
+                and result['peak_rss_kb'] - old['peak_rss_kb'] > MIN_REGRESSION_KB):
+            regressions.append('%s uses more memory: %d KB, was %d KB' % (name, result['peak_rss_kb'], old['peak_rss_kb']))
+    return regressions
+
+
+#function to print a report from benchmark_functions as a table.
+def print_report(report):
+    print('%-56s %10s %10s %12s %10s' % ('function', 'rows', 'seconds', 'rows/s', 'peak MB'))
+    for name in sorted(report['results']):
+        result = report['results'][name]
+        if 'error' in result:
+            print('%-56s failed: %s' % (name, result['error']))
+            continue
+        rows_per_second = result['rows_per_second']
+        print('%-56s %10d %10.3f %12s %10.1f' % (name, result['rows'], result['seconds'],
+                                                 '-' if rows_per_second is None else '%.0f' % rows_per_second,
+                                                 result['peak_rss_kb'] / 1024.0))
+
+
+#function to run the benchmarks from the command line (see the description at the top of this file).
+#returns the exit code: 1 if a benchmark failed or a comparison found regressions, otherwise 0.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the balloon data cleaning functions.')
+    parser.add_argument('--functions', action='store_true',
+                        help='time every public function on a synthetic flight instead of the launch benchmarks')
+    parser.add_argument('--directory', default='benchmark_flight', help='the directory to generate the flight in')
+    parser.add_argument('--flights', type=int, default=1, help='the number of flights to generate one after another')
+    parser.add_argument('--duration', type=float, default=synthetic_flight.FLIGHT_DURATION,
+                        help='the length of each flight in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='the seed for the synthetic flight')
+    parser.add_argument('--only', action='append', metavar='FUNCTION', help='only time this function (repeatable)')
+    parser.add_argument('--repeat', type=int, default=1, help='the number of runs of each function (the fastest is kept)')
+    parser.add_argument('--save-baseline', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='the fraction slower or bigger than the baseline that counts as a regression')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.run_one is not None:
+        #run by run_function_benchmark_in_process in the prepared directory.
+        print(json.dumps(run_function_benchmark(arguments.run_one)))
+        return 0
+
+    if not arguments.functions:
+        result = benchmark_altitude()
+        print('altitude for %d pressures: scalar %.4fs, batch %.4fs (%.1fx faster)'
+              % (result['pressures'], result['scalar_seconds'], result['batch_seconds'], result['speedup']))
+        print('cached altitude: %.4fs (%.0f%% hits), table altitude: %.4fs (largest error %.4fm)'
+              % (result['cached_seconds'], 100 * result['hit_rate'], result['table_seconds'], result['table_max_error']))
+        times = benchmark_parallel_fill()
+        print('fill_in_missing_data: %.3fs' % times[0])
+        for workers in sorted(times):
+            if workers > 0:
+                print('parallel fill with %d processes: %.3fs (%.2fx)' % (workers, times[workers], times[0] / times[workers]))
+        result = benchmark_compact_rows()
+        for label in ('add_altitude', 'filter'):
+            print('%s for %d rows: dictionaries %.3fs, compact rows %.3fs (%.2fx faster)'
+                  % (label, result['rows'], result[label + '_dict_seconds'], result[label + '_compact_seconds'],
+                     result[label + '_speedup']))
+        if result['dict_row_bytes'] is not None:
+            print('memory per row: dictionary %d bytes, compact row %d bytes'
+                  % (result['dict_row_bytes'], result['compact_row_bytes']))
+        return 0
+
+    if arguments.only is not None:
+        for name in arguments.only:
+            if name not in FUNCTION_BENCHMARKS:
+                parser.error('no benchmark for ' + name + ', the benchmarks are ' + ', '.join(sorted(FUNCTION_BENCHMARKS)))
+    for name in uncovered_functions():
+        sys.stderr.write('warning: %s has no benchmark\n' % name)
+    report = benchmark_functions(arguments.directory, arguments.flights, arguments.duration, arguments.seed,
+                                 arguments.only, arguments.repeat)
+    print_report(report)
+    if arguments.save_baseline is not None:
+        save_baseline(report, arguments.save_baseline)
+    exit_code = 0
+    if arguments.compare is not None:
+        regressions = compare_to_baseline(report, load_baseline(arguments.compare), arguments.threshold)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if len(regressions) > 0:
+            exit_code = 1
+    #a function that can't run is as much a failure as one that got slower, baseline or not.
+    failed = sorted(name for name, result in report['results'].items() if 'error' in result)
+    if len(failed) > 0:
+        sys.stderr.write('%d benchmark(s) failed: %s\n' % (len(failed), ', '.join(failed)))
+        exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
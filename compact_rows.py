@@ -0,0 +1,180 @@
+'''
+    File name: compact_rows.py
+    Python Version: 3.6
+    Description: Provides a compact representation of CSV rows for the functions that read and write
+    large files, instead of a dictionary per row.
+
+    A row is a list (or tuple) of the text of its cells, in the order of a fixed list of column names
+    (its schema), so every column is found by its position rather than by hashing its name. The rows
+    the readers and transforms produce are of the row type of their schema (see row_type): a tuple
+    that also knows its column names, so it can be written with csv.writer as it is and its cells can
+    also be read by name. The functions taking compact rows accept any list or tuple. Moving a
+    row from one schema to another, including renaming columns (such as estimated_altitude to
+    estimated_bme_altitude), is compiled once per file into a projection: the position in the source
+    row of every column of the target schema, applied to each row with operator.itemgetter.
+
+    The numeric columns are not given types in the projection: every cell is kept as the text it was
+    read as. A float written back by the csv module is its repr, not the text that was read (1479753173
+    becomes 1479753173.0 and 0.10 becomes 0.1), so typed cells would change every file these functions
+    write, which must stay byte for byte the same as the files written from dictionaries. Most cells are
+    also only copied from one file to another, so parsing all of them would cost more than it saves.
+    Instead the few numeric columns a transform works on are parsed where it needs them, once per row
+    (such as the time in merge_by_time) or a chunk at a time with numpy (such as the pressure in
+    altitude_calculator.add_altitude_compact_rows).
+
+    from_dicts and to_dicts move rows between dictionaries and compact rows, so the functions that take
+    dictionaries (such as altitude_calculator.add_altitude_rows) are thin adapters over the functions
+    that take compact rows.
+'''
+
+#import collections for namedtuple, which gives every schema its own row type.
+import collections
+#import the python CSV module to read and write the rows.
+import csv
+#import functools to make the rows of a row type without calling a python function per row.
+import functools
+#import operator for itemgetter, which applies a projection to a row without a python loop.
+import operator
+
+#the row type of every schema used so far, by its tuple of column names.
+ROW_TYPES = {}
+
+
+#function to get the row type of a schema: a collections.namedtuple of its columns, so a row is a tuple
+#of its cells that can also be read by column name (row.time). column names that aren't python identifiers
+#(such as pressure_2.5) can only be read by position. the column names are kept as the type's fieldnames.
+#the types are created at run time, so their rows can't be pickled (turn them into tuples first).
+def row_type(fieldnames):
+    key = tuple(fieldnames)
+    if key not in ROW_TYPES:
+        new_type = collections.namedtuple('CompactRow', key, rename=True)
+        new_type.fieldnames = key
+        ROW_TYPES[key] = new_type
+    return ROW_TYPES[key]
+
+
+#function to get a function making a row of the row type of a schema out of a sequence of its cells.
+#it doesn't check the number of cells, so it costs no more than making a plain tuple.
+def row_maker(fieldnames):
+    return functools.partial(tuple.__new__, row_type(fieldnames))
+
+
+#function to find the position of every column name in a schema.
+#duplicate column names get the position of the last column with the name, the same as csv.DictReader.
+def positions_of(fieldnames):
+    return dict((name, index) for index, name in enumerate(fieldnames))
+
+
+#function to get the position of a column in a schema.
+#raises KeyError (like looking the column up in a csv.DictReader row) if the schema doesn't have it.
+def position_of(fieldnames, name):
+    return positions_of(fieldnames)[name]
+
+
+#function to compile a projection of rows read with one schema onto another schema.
+#arg source_fieldnames: the columns of the rows being read (such as the header of a sensor file).
+#arg target_fieldnames: the columns of the rows to produce, in order.
+#arg renames: an optional dictionary of source column name to target column name.
+#arg strict: if True raise a ValueError when a source column isn't in the target schema, like csv.DictWriter does,
+#and a KeyError when a column to rename isn't in the source, like renaming a missing key of a dictionary.
+#returns a function turning a row padded by read_compact_rows into a tuple of the target columns.
+#target columns the source doesn't have come out empty.
+def compile_projection(source_fieldnames, target_fieldnames, renames=None, strict=True):
+    if renames is None:
+        renames = {}
+    renamed = [renames.get(name, name) for name in source_fieldnames]
+    if strict:
+        for name in renames:
+            if name not in source_fieldnames:
+                raise KeyError(name)
+        target_names = set(target_fieldnames)
+        extra = [name for name in renamed if name not in target_names]
+        if len(extra) > 0:
+            raise ValueError('dict contains fields not in fieldnames: ' + ', '.join(repr(name) for name in extra))
+    positions = positions_of(renamed)
+    #read_compact_rows adds an empty cell after the last column, which is used for the missing columns.
+    empty = len(source_fieldnames)
+    if len(target_fieldnames) == 0:
+        return lambda row: ()
+    getter = operator.itemgetter(*[positions.get(name, empty) for name in target_fieldnames])
+    if len(target_fieldnames) == 1:
+        #itemgetter returns a single value rather than a tuple for a single position.
+        return lambda row: (getter(row),)
+    return getter
+
+
+#function to read the rows of a csv.reader as compact rows.
+#each row is padded to width columns followed by one extra empty cell (for compile_projection).
+#blank lines are skipped, like csv.DictReader.
+#arg reader: a csv.reader positioned after the header.
+#arg width: the number of columns in the header.
+#arg allow_extra: if False raise a ValueError for a row with more cells than the header (which csv.DictWriter
+#would refuse to write), otherwise the extra cells are dropped.
+def read_compact_rows(reader, width, allow_extra=False):
+    for row in reader:
+        if len(row) != width:
+            if len(row) == 0:
+                continue
+            if len(row) > width:
+                if not allow_extra:
+                    raise ValueError('dict contains fields not in fieldnames: None')
+                row = row[:width]
+            else:
+                row.extend([''] * (width - len(row)))
+        row.append('')
+        yield row
+
+
+#function to read a CSV as compact rows in a given schema.
+#arg filename: the CSV to read.
+#arg target_fieldnames: the columns of the rows to produce, in order.
+#arg renames: an optional dictionary of column name in the file to column name in target_fieldnames.
+#arg strict: if True every column of the file must be in target_fieldnames (see compile_projection).
+#yields each row as a row of row_type(target_fieldnames).
+def read_projected_rows(filename, target_fieldnames, renames=None, strict=True):
+    make_row = row_maker(target_fieldnames)
+    with open(filename, 'r') as original_file:
+        reader = csv.reader(original_file)
+        header = next(reader, [])
+        projection = compile_projection(header, target_fieldnames, renames, strict)
+        for row in read_compact_rows(reader, len(header), allow_extra=not strict):
+            yield make_row(projection(row))
+
+
+#function to read the header of a CSV and the rest of it as compact rows in its own schema.
+#arg original_file: the open CSV.
+#returns a tuple of the column names and the stream of rows (each padded as by read_compact_rows).
+def read_header_and_rows(original_file):
+    reader = csv.reader(original_file)
+    header = next(reader, [])
+    return header, read_compact_rows(reader, len(header), allow_extra=True)
+
+
+#function to turn dictionaries (such as the rows of csv.DictReader) into compact rows of a schema.
+#a column a dictionary doesn't have raises KeyError, like looking it up in the dictionary, and a value of
+#None (a short row of csv.DictReader) becomes an empty cell. other values are kept as they are.
+#arg rows: an iterable of dictionaries.
+#arg fieldnames: the columns of the rows to produce, in order.
+#yields each row as a row of row_type(fieldnames).
+def from_dicts(rows, fieldnames):
+    make_row = row_maker(fieldnames)
+    if len(fieldnames) == 1:
+        name = fieldnames[0]
+        getter = lambda row: (row[name],)
+    elif len(fieldnames) == 0:
+        getter = lambda row: ()
+    else:
+        getter = operator.itemgetter(*fieldnames)
+    for row in rows:
+        values = getter(row)
+        if None in values:
+            values = ['' if value is None else value for value in values]
+        yield make_row(values)
+
+
+#function to turn compact rows into dictionaries of column name to cell.
+#arg rows: an iterable of compact rows.
+#arg fieldnames: the columns of the rows.
+def to_dicts(rows, fieldnames):
+    for row in rows:
+        yield dict(zip(fieldnames, row))
@@ -0,0 +1,296 @@
+'''
+    File name: csv_cache.py
+    Python Version: 3.6
+    Description: Provides a cache of the parsed sensor CSVs so that repeated analysis of the
+    same launch data doesn't have to parse the text of every row again.
+
+    Each CSV is parsed once into typed columns (integers, floats or strings) which are stored
+    in a binary file next to the CSV in a .csv_cache directory. The binary file is laid out so
+    that every column can be memory mapped with numpy without reading or parsing anything.
+    Empty cells are stored as a separate mask for each column rather than as empty strings.
+
+    Each cache records the path, size, modification time and SHA-1 hash of the CSV it was built
+    from and is rebuilt automatically by load_columns whenever the CSV changes. To stay cheap the
+    CSV is only hashed when its size or modification time has changed, so a CSV rewritten in place
+    with the same size and its modification time kept (or set back, for example by cp -p, rsync -t
+    or touch -r) is served from the stale cache. Pass verify=True to load_columns to hash the CSV on
+    every load when that can happen.
+
+    The numpy loaders altitude_calculator.load_altitude_arrays and anemometer.load_readings read
+    their columns through this cache.
+'''
+
+#import the python CSV module to parse the CSVs the first time they are loaded.
+import csv
+#import hashlib to hash the contents of each CSV.
+import hashlib
+#import json to store the description of the columns at the start of each cache file.
+import json
+#import os to look up the size and modification time of each CSV.
+import os
+#import struct to write the length of the header at the start of each cache file.
+import struct
+#import tempfile to give each cache being built a temporary file of its own.
+import tempfile
+
+#import numpy to store and memory map the columns.
+import numpy
+
+#the bytes every cache file starts with (including the version of the format).
+MAGIC = b'BALLOONCACHE1\n'
+#the name of the directory caches are stored in, next to the CSVs they cache.
+CACHE_DIRECTORY = '.csv_cache'
+#every column starts at a multiple of this many bytes so it can be mapped as an array.
+ALIGNMENT = 64
+#extra room left after the header so it can be rewritten in place when only the modification time changes.
+HEADER_SLACK = 64
+
+
+#function to get the path of the cache file for a given CSV.
+#the name of the cache file includes a hash of the absolute path of the CSV so that
+#CSVs with the same name in different directories get different caches.
+#arg filename: the filename of the CSV.
+#arg cache_directory: the directory to keep caches in (by default .csv_cache next to the CSV).
+def cache_path_for(filename, cache_directory=None):
+    source = os.path.abspath(filename)
+    if cache_directory is None:
+        cache_directory = os.path.join(os.path.dirname(source), CACHE_DIRECTORY)
+    path_hash = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_directory, os.path.basename(source) + '.' + path_hash + '.cache')
+
+
+#function to get the SHA-1 hash of the contents of a file without reading it into memory at once.
+#arg filename: the file to hash.
+def hash_file(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+#function to round an offset up to the next multiple of ALIGNMENT.
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+#function to find the narrowest type that can hold every non-empty value of a column.
+#arg current: the type found so far ('int', 'float' or 'str'), or None if no values have been seen.
+#arg value: the next non-empty value of the column.
+def widen_type(current, value):
+    if current in (None, 'int'):
+        try:
+            int(value)
+            return 'int'
+        except ValueError:
+            pass
+    if current in (None, 'int', 'float'):
+        try:
+            float(value)
+            return 'float'
+        except ValueError:
+            pass
+    return 'str'
+
+
+#function to read the header (column names) and rows of a CSV.
+#duplicate column names keep the last column with the name, the same as csv.DictReader.
+def read_csv_rows(filename):
+    with open(filename, 'r') as source_file:
+        reader = csv.reader(source_file)
+        names = next(reader, [])
+        for row in reader:
+            #skip completely blank lines like csv.DictReader.
+            if len(row) == 0:
+                continue
+            yield names, row
+
+
+#function to parse a CSV into a new cache file.
+#the CSV is read twice, once to find the type of every column and once to fill in the columns,
+#so the whole CSV is never held in memory.
+#arg filename: the filename of the CSV.
+#arg cache_path: the path of the cache file to create.
+def build_cache(filename, cache_path):
+    statistics = os.stat(filename)
+    with open(filename, 'r') as source_file:
+        names = next(csv.reader(source_file), [])
+    #the column each name refers to (the last column with the name, like csv.DictReader).
+    indexes = dict((name, index) for index, name in enumerate(names))
+
+    #first pass: count the rows and find the type and widest string in each column.
+    types = dict((name, None) for name in indexes)
+    widths = dict((name, 1) for name in indexes)
+    rows = 0
+    for names, row in read_csv_rows(filename):
+        rows += 1
+        for name, index in indexes.items():
+            if index < len(row) and len(row[index]) > 0:
+                types[name] = widen_type(types[name], row[index])
+                widths[name] = max(widths[name], len(row[index]))
+
+    #lay out the columns, each followed by its mask of missing values.
+    columns = []
+    offset = 0
+    for name in sorted(indexes, key=lambda name: indexes[name]):
+        if types[name] == 'str':
+            dtype = numpy.dtype('<U%d' % widths[name])
+        elif types[name] == 'int':
+            dtype = numpy.dtype('<i8')
+        else:
+            #columns that are empty in every row are stored as floats.
+            dtype = numpy.dtype('<f8')
+        column = {'name': name, 'dtype': dtype.str, 'offset': offset}
+        offset = align(offset + dtype.itemsize * rows)
+        column['mask_offset'] = offset
+        offset = align(offset + rows)
+        columns.append(column)
+
+    header = {
+        'source': os.path.abspath(filename),
+        'size': statistics.st_size,
+        'mtime': statistics.st_mtime,
+        'sha1': hash_file(filename),
+        'rows': rows,
+        'columns': columns,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    data_offset = align(len(MAGIC) + 8 + len(header_bytes) + HEADER_SLACK)
+    header_bytes += b' ' * (data_offset - len(MAGIC) - 8 - len(header_bytes))
+
+    directory = os.path.dirname(cache_path)
+    if len(directory) > 0 and not os.path.isdir(directory):
+        os.makedirs(directory)
+    #build the cache under a temporary name of its own (next to the cache, so it can be moved into place)
+    #so a half written cache is never loaded and two processes building the same cache don't share a file.
+    handle, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=directory if len(directory) > 0 else '.')
+    try:
+        with os.fdopen(handle, 'wb') as cache_file:
+            cache_file.write(MAGIC)
+            cache_file.write(struct.pack('<Q', len(header_bytes)))
+            cache_file.write(header_bytes)
+            cache_file.truncate(data_offset + offset)
+
+        #second pass: write every value straight into the memory mapped columns.
+        if rows > 0:
+            arrays = {}
+            for column in columns:
+                values = numpy.memmap(temporary_path, dtype=column['dtype'], mode='r+',
+                                      offset=data_offset + column['offset'], shape=(rows,))
+                missing = numpy.memmap(temporary_path, dtype=numpy.bool_, mode='r+',
+                                       offset=data_offset + column['mask_offset'], shape=(rows,))
+                arrays[column['name']] = (values, missing, numpy.dtype(column['dtype']).kind)
+            for row_number, (names, row) in enumerate(read_csv_rows(filename)):
+                for name, index in indexes.items():
+                    values, missing, kind = arrays[name]
+                    if index < len(row) and len(row[index]) > 0:
+                        if kind == 'i':
+                            values[row_number] = int(row[index])
+                        elif kind == 'f':
+                            values[row_number] = float(row[index])
+                        else:
+                            values[row_number] = row[index]
+                    else:
+                        missing[row_number] = True
+            for values, missing, kind in arrays.values():
+                values.flush()
+                missing.flush()
+            del arrays
+    except Exception:
+        os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, cache_path)
+
+
+#function to read the header of a cache file.
+#returns a tuple of the header dictionary and the offset the columns start at,
+#or None if the file isn't a cache file in the current format.
+def read_cache_header(cache_path):
+    with open(cache_path, 'rb') as cache_file:
+        if cache_file.read(len(MAGIC)) != MAGIC:
+            return None
+        length = struct.unpack('<Q', cache_file.read(8))[0]
+        header = json.loads(cache_file.read(length).decode('utf-8'))
+    return header, len(MAGIC) + 8 + length
+
+
+#function to record a new modification time in the header of a cache file whose CSV was touched
+#without its contents changing. the header is only rewritten if it still fits in its space.
+def update_cache_mtime(cache_path, header, data_offset, mtime):
+    header['mtime'] = mtime
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    space = data_offset - len(MAGIC) - 8
+    if len(header_bytes) <= space:
+        with open(cache_path, 'r+b') as cache_file:
+            cache_file.seek(len(MAGIC) + 8)
+            cache_file.write(header_bytes + b' ' * (space - len(header_bytes)))
+
+
+#function to check whether a cache file still matches its CSV.
+#the cache is valid if the size and modification time of the CSV haven't changed. if only the
+#modification time changed, the contents are hashed to check whether the CSV really changed.
+#a change that keeps both the size and the modification time isn't noticed unless verify is True.
+#arg filename: the filename of the CSV.
+#arg cache_path: the path of the cache file.
+#arg verify: if True the contents are always hashed, even when the size and modification time match.
+#returns a tuple of the header and the offset the columns start at, or None if the cache must be rebuilt.
+def valid_cache_header(filename, cache_path, verify=False):
+    if not os.path.exists(cache_path):
+        return None
+    result = read_cache_header(cache_path)
+    if result is None:
+        return None
+    header, data_offset = result
+    statistics = os.stat(filename)
+    if header['source'] != os.path.abspath(filename) or header['size'] != statistics.st_size:
+        return None
+    if verify or header['mtime'] != statistics.st_mtime:
+        if header['sha1'] != hash_file(filename):
+            return None
+        if header['mtime'] != statistics.st_mtime:
+            update_cache_mtime(cache_path, header, data_offset, statistics.st_mtime)
+    return header, data_offset
+
+
+#function to load every column of a CSV as typed numpy arrays from its cache.
+#the cache is built (or rebuilt if the CSV has changed) first if necessary.
+#arg filename: the filename of the CSV.
+#arg cache_directory: the directory to keep caches in (by default .csv_cache next to the CSV).
+#arg verify: if True hash the CSV even if its size and modification time match the cache (see valid_cache_header).
+#returns a dictionary of column name to a numpy masked array that is memory mapped from the cache.
+#integer columns are int64, numeric columns are float64 and all other columns are unicode strings.
+#the mask of each array is True where the cell in the CSV was empty.
+def load_columns(filename, cache_directory=None, verify=False):
+    cache_path = cache_path_for(filename, cache_directory)
+    result = valid_cache_header(filename, cache_path, verify)
+    if result is None:
+        build_cache(filename, cache_path)
+        result = read_cache_header(cache_path)
+    header, data_offset = result
+    rows = header['rows']
+    columns = {}
+    for column in header['columns']:
+        dtype = numpy.dtype(column['dtype'])
+        if rows > 0:
+            values = numpy.memmap(cache_path, dtype=dtype, mode='r', offset=data_offset + column['offset'],
+                                  shape=(rows,))
+            missing = numpy.memmap(cache_path, dtype=numpy.bool_, mode='r',
+                                   offset=data_offset + column['mask_offset'], shape=(rows,))
+        else:
+            #numpy can't memory map an empty array.
+            values = numpy.zeros(0, dtype=dtype)
+            missing = numpy.zeros(0, dtype=numpy.bool_)
+        columns[column['name']] = numpy.ma.MaskedArray(values, mask=missing, copy=False)
+    return columns
+
+
+#function to load a single column of a CSV as a plain numpy array (see load_columns).
+#arg filename: the filename of the CSV.
+#arg name: the name of the column.
+#arg fill_value: the value to use for empty cells (by default NaN, which only works for float columns).
+#arg cache_directory, verify: see load_columns.
+def load_column(filename, name, fill_value=numpy.nan, cache_directory=None, verify=False):
+    column = load_columns(filename, cache_directory, verify)[name]
+    if not column.mask.any():
+        return column.data
+    return column.filled(fill_value)
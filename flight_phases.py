@@ -0,0 +1,350 @@
+'''
+    File name: flight_phases.py
+    Python Version: 3.6
+    Description: Splits a flight into its phases (on the pad, ascent, descent and landed) and finds
+    the launch, burst and landing in a single pass over a time sorted altitude series, such as the
+    output of add_altitude_temperature or add_altitude_if_pressure_present in altitude_calculator.py.
+
+    Unlike summary_altitude, nothing about the flight is hard-coded: the vertical velocity is smoothed
+    with a least squares line over the last SMOOTHING_WINDOW seconds of altitudes, and
+    launch: the velocity stays above LAUNCH_RATE for CONFIRM_SECONDS.
+    burst: the highest altitude of the ascent, found as the flight goes, once the velocity is below
+    DESCENT_RATE and the balloon has dropped BURST_DROP meters from it.
+    landing: the velocity stays within LANDED_RATE of 0 for CONFIRM_SECONDS.
+    Every event is dated back to when it happened rather than when it was confirmed. After landing a
+    new launch can be detected, so archives of several flights one after another can be analyzed.
+
+    Alongside the events it keeps aggregates of every phase (its time, altitudes, vertical rates and the
+    minimum, maximum and mean of columns such as the temperature and geiger cpm). Only the altitudes in
+    the smoothing window are kept, so memory doesn't grow with the length of the flight.
+'''
+
+#import collections for the deque of altitudes in the smoothing window.
+import collections
+#import the python CSV module to read the altitude series and write the events and phases.
+import csv
+
+#the number of seconds of altitudes the vertical velocity is smoothed over.
+SMOOTHING_WINDOW = 60.0
+#the vertical velocity in meters per second above which the balloon is ascending.
+LAUNCH_RATE = 2.0
+#the vertical velocity in meters per second below which the balloon is descending.
+DESCENT_RATE = -3.0
+#how many meters below the highest altitude the balloon must be before the highest altitude is the burst.
+BURST_DROP = 300.0
+#the vertical velocity in meters per second within which (either way) the balloon is not moving.
+LANDED_RATE = 0.5
+#the number of seconds the velocity must stay past a threshold for a launch or landing.
+CONFIRM_SECONDS = 60.0
+#the columns aggregated for every phase by default (the ones that aren't in a row are skipped).
+MEASUREMENT_KEYS = ('temperature', 'interior_temperature', 'exterior_temperature', 'geiger_cpm')
+
+#the columns of the CSV of events.
+EVENT_KEYS = ['event', 'time', 'altitude', 'detected_at']
+
+
+#function to create an empty aggregate of a stretch of rows.
+#arg measurement_keys: the columns to keep the minimum, maximum and mean of.
+def new_aggregate(measurement_keys):
+    return {
+        'rows': 0,
+        'start_time': None,
+        'end_time': None,
+        #the first and last altitudes and their times (for the mean vertical rate).
+        'first_altitude': None,
+        'last_altitude': None,
+        'min_altitude': None,
+        'max_altitude': None,
+        #the smoothed vertical velocities.
+        'min_rate': None,
+        'max_rate': None,
+        #for every measurement, [count, total, minimum, maximum].
+        'measurements': dict((key, [0, 0.0, None, None]) for key in measurement_keys),
+    }
+
+
+#function to get the smaller of two values where None means there is no value yet.
+def smaller(first, second):
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return min(first, second)
+
+
+#function to get the larger of two values where None means there is no value yet.
+def larger(first, second):
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return max(first, second)
+
+
+#function to add a row to an aggregate.
+#arg aggregate: the aggregate (updated in place).
+#arg row: the row.
+#arg time: the time of the row.
+#arg altitude: the altitude of the row, or None if it has none.
+#arg velocity: the smoothed vertical velocity at the row, or None.
+def add_to_aggregate(aggregate, row, time, altitude, velocity):
+    aggregate['rows'] += 1
+    if aggregate['start_time'] is None:
+        aggregate['start_time'] = time
+    aggregate['end_time'] = time
+    if altitude is not None:
+        if aggregate['first_altitude'] is None:
+            aggregate['first_altitude'] = (time, altitude)
+        aggregate['last_altitude'] = (time, altitude)
+        aggregate['min_altitude'] = smaller(aggregate['min_altitude'], altitude)
+        aggregate['max_altitude'] = larger(aggregate['max_altitude'], altitude)
+    if velocity is not None:
+        aggregate['min_rate'] = smaller(aggregate['min_rate'], velocity)
+        aggregate['max_rate'] = larger(aggregate['max_rate'], velocity)
+    for key, measurement in aggregate['measurements'].items():
+        value = row.get(key)
+        if value is not None and len(value) > 0:
+            value = float(value)
+            measurement[0] += 1
+            measurement[1] += value
+            measurement[2] = smaller(measurement[2], value)
+            measurement[3] = larger(measurement[3], value)
+
+
+#function to add an aggregate of the rows right after an aggregate to it.
+#arg aggregate: the earlier aggregate (updated in place).
+#arg later: the aggregate of the rows that follow it.
+def merge_aggregates(aggregate, later):
+    if later['rows'] == 0:
+        return
+    aggregate['rows'] += later['rows']
+    if aggregate['start_time'] is None:
+        aggregate['start_time'] = later['start_time']
+    aggregate['end_time'] = later['end_time']
+    if aggregate['first_altitude'] is None:
+        aggregate['first_altitude'] = later['first_altitude']
+    if later['last_altitude'] is not None:
+        aggregate['last_altitude'] = later['last_altitude']
+    for key in ('min_altitude', 'min_rate'):
+        aggregate[key] = smaller(aggregate[key], later[key])
+    for key in ('max_altitude', 'max_rate'):
+        aggregate[key] = larger(aggregate[key], later[key])
+    for key, measurement in aggregate['measurements'].items():
+        later_measurement = later['measurements'][key]
+        measurement[0] += later_measurement[0]
+        measurement[1] += later_measurement[1]
+        measurement[2] = smaller(measurement[2], later_measurement[2])
+        measurement[3] = larger(measurement[3], later_measurement[3])
+
+
+#function to create the state used by flight_events.
+#the state is a plain dictionary so that it can be inspected between calls to flight_events.
+#arg altitude_key: the column with the altitude in meters ('altitude' or 'calculated_altitude').
+#arg measurement_keys: the columns to aggregate for every phase.
+#the other arguments are the thresholds described at the top of this file.
+def new_flight_state(altitude_key='altitude', measurement_keys=MEASUREMENT_KEYS, window=SMOOTHING_WINDOW,
+                     launch_rate=LAUNCH_RATE, descent_rate=DESCENT_RATE, burst_drop=BURST_DROP,
+                     landed_rate=LANDED_RATE, confirm_seconds=CONFIRM_SECONDS):
+    return {
+        'altitude_key': altitude_key,
+        'measurement_keys': list(measurement_keys),
+        'window': window,
+        'launch_rate': launch_rate,
+        'descent_rate': descent_rate,
+        'burst_drop': burst_drop,
+        'landed_rate': landed_rate,
+        'confirm_seconds': confirm_seconds,
+        #the (time, altitude) points in the smoothing window, and their sums for the least squares line.
+        #times are measured from base_time to keep the sums accurate.
+        'points': collections.deque(),
+        'base_time': None,
+        'sums': [0.0, 0.0, 0.0, 0.0],
+        #the current phase: 'pad', 'ascent', 'descent' or 'landed'.
+        'phase': 'pad',
+        #the aggregates of the phases that have finished, as (phase, aggregate).
+        'finished': [],
+        #the aggregate of the current phase.
+        'current': new_aggregate(measurement_keys),
+        #the (time, altitude) where the next phase may have started, and the aggregate of the rows since then.
+        #during the ascent this is the highest altitude so far and the rows after it.
+        'candidate': None,
+        'tentative': None,
+        #the events found so far.
+        'events': [],
+    }
+
+
+#function to add an altitude to the smoothing window and get the smoothed vertical velocity.
+#returns the slope of the least squares line through the window in meters per second, or None if
+#there aren't yet two different times in it.
+def smoothed_velocity(state, time, altitude):
+    if state['base_time'] is None:
+        state['base_time'] = time
+    points = state['points']
+    sums = state['sums']
+    relative = time - state['base_time']
+    points.append((relative, altitude))
+    sums[0] += relative
+    sums[1] += altitude
+    sums[2] += relative * relative
+    sums[3] += relative * altitude
+    #forget the altitudes older than the window.
+    while relative - points[0][0] > state['window']:
+        old_time, old_altitude = points.popleft()
+        sums[0] -= old_time
+        sums[1] -= old_altitude
+        sums[2] -= old_time * old_time
+        sums[3] -= old_time * old_altitude
+    count = len(points)
+    denominator = count * sums[2] - sums[0] * sums[0]
+    if count < 2 or points[-1][0] == points[0][0] or denominator <= 0:
+        return None
+    return (count * sums[3] - sums[0] * sums[1]) / denominator
+
+
+#function to record an event and start a new phase with the tentative rows.
+def start_phase(state, phase, event, time, altitude, detected_at):
+    event = {'event': event, 'time': time, 'altitude': altitude, 'detected_at': detected_at}
+    state['events'].append(event)
+    state['finished'].append((state['phase'], state['current']))
+    state['phase'] = phase
+    state['current'] = state['tentative']
+    state['candidate'] = None
+    state['tentative'] = None
+    return event
+
+
+#function to find the events of a flight in a stream of rows, updating the phase aggregates as it goes.
+#arg rows: an iterable of dictionaries sorted by time with a time and (in some rows) state['altitude_key'].
+#arg state: the state created by new_flight_state (updated in place).
+#yields each event (a dictionary with the columns in EVENT_KEYS) as soon as it is confirmed.
+def flight_events(rows, state):
+    altitude_key = state['altitude_key']
+    for row in rows:
+        time = float(row['time'])
+        value = row.get(altitude_key)
+        if value is None or len(value) == 0:
+            #rows without an altitude only count towards the aggregates.
+            add_to_aggregate(state['tentative'] if state['tentative'] is not None else state['current'],
+                             row, time, None, None)
+            continue
+        altitude = float(value)
+        velocity = smoothed_velocity(state, time, altitude)
+        phase = state['phase']
+
+        if phase == 'ascent':
+            candidate = state['candidate']
+            if candidate is None or altitude >= candidate[1]:
+                #a new highest altitude: everything up to it is still the ascent.
+                merge_aggregates(state['current'], state['tentative'])
+                add_to_aggregate(state['current'], row, time, altitude, velocity)
+                state['candidate'] = (time, altitude)
+                state['tentative'] = new_aggregate(state['measurement_keys'])
+                continue
+            add_to_aggregate(state['tentative'], row, time, altitude, velocity)
+            if velocity is not None and velocity < state['descent_rate'] and \
+                    candidate[1] - altitude >= state['burst_drop']:
+                yield start_phase(state, 'descent', 'burst', candidate[0], candidate[1], time)
+            continue
+
+        if phase == 'descent':
+            waiting = velocity is not None and abs(velocity) < state['landed_rate']
+        else:
+            #on the pad (or landed after an earlier flight), waiting for a launch.
+            waiting = velocity is not None and velocity > state['launch_rate']
+        if not waiting:
+            #the next phase didn't start after all.
+            if state['tentative'] is not None:
+                merge_aggregates(state['current'], state['tentative'])
+                state['candidate'] = None
+                state['tentative'] = None
+            add_to_aggregate(state['current'], row, time, altitude, velocity)
+            continue
+        if state['candidate'] is None:
+            state['candidate'] = (time, altitude)
+            state['tentative'] = new_aggregate(state['measurement_keys'])
+        add_to_aggregate(state['tentative'], row, time, altitude, velocity)
+        candidate = state['candidate']
+        if time - candidate[0] >= state['confirm_seconds']:
+            if phase == 'descent':
+                yield start_phase(state, 'landed', 'landing', candidate[0], candidate[1], time)
+            else:
+                event = start_phase(state, 'ascent', 'launch', candidate[0], candidate[1], time)
+                #the highest altitude of the ascent so far.
+                state['candidate'] = (time, altitude)
+                state['tentative'] = new_aggregate(state['measurement_keys'])
+                yield event
+
+
+#function to turn an aggregate into a row of the phase summary.
+def summarize_aggregate(phase, aggregate, measurement_keys):
+    summary = {
+        'phase': phase,
+        'start_time': aggregate['start_time'],
+        'end_time': aggregate['end_time'],
+        'duration': None if aggregate['start_time'] is None else aggregate['end_time'] - aggregate['start_time'],
+        'rows': aggregate['rows'],
+        'min_altitude': aggregate['min_altitude'],
+        'max_altitude': aggregate['max_altitude'],
+        'min_rate': aggregate['min_rate'],
+        'max_rate': aggregate['max_rate'],
+        'mean_rate': None,
+    }
+    first, last = aggregate['first_altitude'], aggregate['last_altitude']
+    if first is not None and last[0] > first[0]:
+        summary['mean_rate'] = (last[1] - first[1]) / (last[0] - first[0])
+    for key in measurement_keys:
+        count, total, minimum, maximum = aggregate['measurements'][key]
+        summary[key + '_min'] = minimum
+        summary[key + '_max'] = maximum
+        summary[key + '_mean'] = total / count if count > 0 else None
+    return summary
+
+
+#function to get the columns of the phase summaries for the given measurement columns.
+def phase_keys(measurement_keys):
+    keys = ['phase', 'start_time', 'end_time', 'duration', 'rows', 'min_altitude', 'max_altitude',
+            'mean_rate', 'min_rate', 'max_rate']
+    for key in measurement_keys:
+        keys.extend([key + '_min', key + '_max', key + '_mean'])
+    return keys
+
+
+#function to get the summary of every phase so far, including the current one.
+#arg state: the state used by flight_events.
+#returns a list of dictionaries with the columns from phase_keys.
+def phase_summaries(state):
+    #the rows waiting on an unconfirmed phase still belong to the current phase.
+    current = new_aggregate(state['measurement_keys'])
+    merge_aggregates(current, state['current'])
+    if state['tentative'] is not None:
+        merge_aggregates(current, state['tentative'])
+    phases = state['finished'] + [(state['phase'], current)]
+    return [summarize_aggregate(phase, aggregate, state['measurement_keys'])
+            for phase, aggregate in phases if aggregate['rows'] > 0]
+
+
+#function to write the events and phases of a flight from a CSV of altitudes in one pass.
+#arg filename: a time sorted CSV with a time and an altitude, such as the output of add_altitude_temperature
+#(altitude_key 'altitude') or add_altitude_if_pressure_present (altitude_key 'calculated_altitude').
+#arg events_name: the filename of the CSV of events to create (with the columns in EVENT_KEYS).
+#arg phases_name: the filename of the CSV of phase summaries to create.
+#arg altitude_key: the column with the altitude.
+#arg measurement_keys: the columns to aggregate for every phase (the ones not in the file are left out).
+#returns a tuple of the list of events and the list of phase summaries.
+def analyze_flight(filename, events_name='flight_events.csv', phases_name='flight_phases.csv', altitude_key='altitude',
+                   measurement_keys=MEASUREMENT_KEYS):
+    with open(filename, 'r') as original_file, open(events_name, 'w') as events_file:
+        reader = csv.DictReader(original_file)
+        measurement_keys = [key for key in measurement_keys if key in reader.fieldnames]
+        state = new_flight_state(altitude_key, measurement_keys)
+        writer = csv.DictWriter(events_file, EVENT_KEYS)
+        writer.writeheader()
+        for event in flight_events(reader, state):
+            writer.writerow(event)
+    phases = phase_summaries(state)
+    with open(phases_name, 'w') as phases_file:
+        writer = csv.DictWriter(phases_file, phase_keys(measurement_keys))
+        writer.writeheader()
+        writer.writerows(phases)
+    return state['events'], phases
@@ -0,0 +1,390 @@
+'''
+    File name: gps.py
+    Python Version: 3.6
+    Description: Turns the raw GPS readings (gps.csv, or the gps columns of a master file) into a
+    clean flight track, a chunk of rows at a time with numpy so that files of any length are
+    processed in bounded memory.
+
+    The GPS logs its position the way NMEA sentences do: lat as ddmm.mmmm and lng as dddmm.mmmm
+    (degrees followed by minutes) with the hemisphere in lat_direction and lng_direction. These are
+    decoded to signed decimal degrees (negative south and west). Readings without a fix (fix_quality 0,
+    logged as 0000.0000 while the receiver was searching) and readings with a horizontal dilution of
+    precision (hdop) worse than max_hdop are dropped (or kept but marked invalid). The ground speed in
+    meters per second and the heading in degrees clockwise from north are worked out from each valid
+    reading and the valid reading before it.
+
+    The track can also be simplified for plotting and export: simplify_track keeps a reading only when
+    the readings since the last one kept can't be drawn as a straight line (within tolerance meters,
+    counting the altitude) from it. The readings since the last one kept are held in a window of at most
+    max_window readings, so memory doesn't grow with the length of the track.
+
+    Example:
+    gps.decode_gps_file('gps.csv', 'gps_track.csv')
+    gps.simplify_gps_file('gps.csv', 'gps_simplified.csv', tolerance=25)
+'''
+
+#import the python CSV module to read the readings and write the tracks.
+import csv
+#import itertools to read the readings a chunk at a time.
+import itertools
+#import math for the position of each reading while simplifying (faster than numpy for single numbers).
+import math
+
+#import numpy to decode a whole chunk of readings at once.
+import numpy
+
+#import the compact_rows module to read the CSV as lists of cells rather than dictionaries.
+import compact_rows
+
+#the worst horizontal dilution of precision a reading can have and still be used.
+MAX_HDOP = 5.0
+#the number of readings decoded at once.
+CHUNK_SIZE = 65536
+#the default distance in meters a simplified track can be from the readings it leaves out.
+SIMPLIFY_TOLERANCE = 10.0
+#the most readings held while simplifying before one is kept regardless.
+MAX_WINDOW = 1000
+#the mean radius of the earth in meters.
+EARTH_RADIUS = 6371008.8
+#the columns of gps.csv that are decoded.
+GPS_KEYS = ['time', 'lat', 'lat_direction', 'lng', 'lng_direction', 'fix_quality', 'num_satelites', 'hdop']
+#the names the altitude of the gps is found under (in gps.csv and in a master file).
+ALTITUDE_KEYS = ('altitude', 'estimated_gps_altitude')
+#the columns of the tracks written by decode_gps_file and simplify_gps_file.
+#valid: 1 for a reading with a fix and a good enough hdop, otherwise 0.
+TRACK_KEYS = ['time', 'latitude', 'longitude', 'altitude', 'ground_speed', 'heading', 'hdop', 'num_satelites', 'valid']
+
+
+#function to convert a list of cells to an array of floats, with nan for cells that are empty or not numbers.
+def float_column(cells):
+    try:
+        return numpy.array([cell if len(cell) > 0 else 'nan' for cell in cells], dtype=str).astype(float)
+    except ValueError:
+        values = numpy.empty(len(cells))
+        for position, cell in enumerate(cells):
+            try:
+                values[position] = float(cell)
+            except ValueError:
+                values[position] = numpy.nan
+        return values
+
+
+#function to decode NMEA coordinates (ddmm.mmmm or dddmm.mmmm) to signed decimal degrees.
+#arg values: an array of the coordinates as numbers.
+#arg directions: an array of their hemispheres ('N', 'S', 'E' or 'W').
+#arg negative: the hemisphere that is negative ('S' for latitudes and 'W' for longitudes).
+#returns an array of decimal degrees (nan where a coordinate has more than 60 minutes).
+def decode_coordinates(values, directions, negative):
+    values = numpy.asarray(values, dtype=float)
+    degrees = numpy.floor(values / 100.0)
+    minutes = values - degrees * 100.0
+    decimal = degrees + minutes / 60.0
+    decimal[minutes >= 60.0] = numpy.nan
+    return numpy.where(numpy.asarray(directions) == negative, -decimal, decimal)
+
+
+#function to find the readings that can be used.
+#a reading is valid if it has a fix, an hdop of at most max_hdop and a position (not 0, 0) on the earth.
+#arg fix_quality, hdop, latitudes, longitudes: arrays of the readings.
+#returns an array of booleans.
+def valid_fixes(fix_quality, hdop, latitudes, longitudes, max_hdop=MAX_HDOP):
+    with numpy.errstate(invalid='ignore'):
+        return ((fix_quality > 0) & (hdop > 0) & (hdop <= max_hdop)
+                & (numpy.abs(latitudes) <= 90) & (numpy.abs(longitudes) <= 180)
+                & ((latitudes != 0) | (longitudes != 0)))
+
+
+#function to work out the distance, ground speed and heading between consecutive readings.
+#arg times, latitudes, longitudes: arrays of valid readings (degrees).
+#arg previous: (time, latitude, longitude) of the reading before the first, or None.
+#returns a tuple of arrays of the ground speed in meters per second and the heading in degrees clockwise
+#from north from the reading before each reading (nan for the first reading without previous, for readings
+#at the same time as the one before and for the heading of readings that didn't move).
+def ground_velocity(times, latitudes, longitudes, previous=None):
+    if previous is None:
+        previous = (numpy.nan, numpy.nan, numpy.nan)
+    before_times = numpy.concatenate(([previous[0]], times[:-1]))
+    before_latitudes = numpy.radians(numpy.concatenate(([previous[1]], latitudes[:-1])))
+    before_longitudes = numpy.radians(numpy.concatenate(([previous[2]], longitudes[:-1])))
+    latitudes = numpy.radians(latitudes)
+    longitudes = numpy.radians(longitudes)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        #the haversine distance.
+        latitude_change = latitudes - before_latitudes
+        longitude_change = longitudes - before_longitudes
+        a = (numpy.sin(latitude_change / 2) ** 2
+             + numpy.cos(before_latitudes) * numpy.cos(latitudes) * numpy.sin(longitude_change / 2) ** 2)
+        distances = 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+        intervals = times - before_times
+        speeds = numpy.where(intervals > 0, distances / intervals, numpy.nan)
+        #the initial bearing of the great circle from the reading before.
+        headings = numpy.degrees(numpy.arctan2(
+            numpy.sin(longitude_change) * numpy.cos(latitudes),
+            numpy.cos(before_latitudes) * numpy.sin(latitudes)
+            - numpy.sin(before_latitudes) * numpy.cos(latitudes) * numpy.cos(longitude_change))) % 360.0
+        headings[~(distances > 0)] = numpy.nan
+    return speeds, headings
+
+
+#function to create the state used by decode_chunk.
+#the state is a plain dictionary so that it can be saved between chunks and runs.
+def new_gps_state(max_hdop=MAX_HDOP):
+    return {
+        'max_hdop': max_hdop,
+        #(time, latitude, longitude) of the last valid reading.
+        'previous': None,
+        #the number of readings decoded and valid, and the number of invalid readings for each reason:
+        #without a fix, with a fix but no hdop (0, which the receiver logs when it hasn't worked one out),
+        #with too high an hdop (or one that isn't a number), and with a fix and a good hdop but no position
+        #on the earth or no time. every invalid reading is counted for exactly one reason, so
+        #no_fix + bad_hdop + high_hdop + bad_position == rows - valid.
+        'rows': 0,
+        'valid': 0,
+        'no_fix': 0,
+        'bad_hdop': 0,
+        'high_hdop': 0,
+        'bad_position': 0,
+    }
+
+
+#function to decode a chunk of readings.
+#arg state: the state from new_gps_state (updated in place).
+#arg columns: a dictionary of the columns of GPS_KEYS (and 'altitude') to lists of the cells of the readings.
+#arg drop_invalid: if True only the valid readings are returned.
+#returns a dictionary of TRACK_KEYS to arrays (the ground speed and heading are nan for invalid readings).
+def decode_chunk(state, columns, drop_invalid=True):
+    times = float_column(columns['time'])
+    latitudes = decode_coordinates(float_column(columns['lat']), columns['lat_direction'], 'S')
+    longitudes = decode_coordinates(float_column(columns['lng']), columns['lng_direction'], 'W')
+    fix_quality = float_column(columns['fix_quality'])
+    hdop = float_column(columns['hdop'])
+    valid = valid_fixes(fix_quality, hdop, latitudes, longitudes, state['max_hdop']) & ~numpy.isnan(times)
+    state['rows'] += len(times)
+    state['valid'] += int(numpy.count_nonzero(valid))
+    with numpy.errstate(invalid='ignore'):
+        no_fix = ~(fix_quality > 0)
+        bad_hdop = ~no_fix & (hdop <= 0)
+        high_hdop = ~no_fix & ~(hdop <= state['max_hdop'])
+        state['no_fix'] += int(numpy.count_nonzero(no_fix))
+        state['bad_hdop'] += int(numpy.count_nonzero(bad_hdop))
+        state['high_hdop'] += int(numpy.count_nonzero(high_hdop))
+        state['bad_position'] += int(numpy.count_nonzero(~valid & ~no_fix & ~bad_hdop & ~high_hdop))
+
+    speeds = numpy.full(len(times), numpy.nan)
+    headings = numpy.full(len(times), numpy.nan)
+    if numpy.any(valid):
+        valid_speeds, valid_headings = ground_velocity(times[valid], latitudes[valid], longitudes[valid],
+                                                       state['previous'])
+        speeds[valid] = valid_speeds
+        headings[valid] = valid_headings
+        last = numpy.flatnonzero(valid)[-1]
+        state['previous'] = (float(times[last]), float(latitudes[last]), float(longitudes[last]))
+
+    track = {
+        'time': times,
+        'latitude': latitudes,
+        'longitude': longitudes,
+        'altitude': float_column(columns['altitude']) if 'altitude' in columns else numpy.full(len(times), numpy.nan),
+        'ground_speed': speeds,
+        'heading': headings,
+        'hdop': hdop,
+        'num_satelites': float_column(columns['num_satelites']),
+        'valid': valid.astype(int),
+    }
+    if drop_invalid:
+        track = dict((key, values[valid]) for key, values in track.items())
+    return track
+
+
+#function to read a CSV with the gps columns a chunk at a time.
+#arg filename: gps.csv, or a master file with its gps columns (rows from the other sensors are just invalid).
+#arg chunk_size: the number of readings in each chunk.
+#yields dictionaries of GPS_KEYS (and 'altitude' if the file has one of ALTITUDE_KEYS) to lists of cells.
+def read_gps_chunks(filename, chunk_size=CHUNK_SIZE):
+    with open(filename, 'r') as original_file:
+        fieldnames, rows = compact_rows.read_header_and_rows(original_file)
+        positions = compact_rows.positions_of(fieldnames)
+        missing = [key for key in GPS_KEYS if key not in positions]
+        if len(missing) > 0:
+            raise KeyError(missing[0])
+        keys = list(GPS_KEYS)
+        names = list(GPS_KEYS)
+        for altitude_key in ALTITUDE_KEYS:
+            if altitude_key in positions:
+                keys.append(altitude_key)
+                names.append('altitude')
+                break
+        projection = compact_rows.compile_projection(fieldnames, keys, strict=False)
+        while True:
+            chunk = [projection(row) for row in itertools.islice(rows, chunk_size)]
+            if len(chunk) == 0:
+                return
+            yield dict(zip(names, (list(cells) for cells in zip(*chunk))))
+
+
+#function to decode a CSV with the gps columns a chunk at a time.
+#arg filename: see read_gps_chunks.
+#arg state: the state from new_gps_state (a new one by default).
+#arg drop_invalid: if True only the valid readings are included.
+#arg chunk_size: the number of readings decoded at once.
+#yields the decoded chunks (see decode_chunk).
+def decode_gps_chunks(filename, state=None, drop_invalid=True, chunk_size=CHUNK_SIZE):
+    if state is None:
+        state = new_gps_state()
+    for columns in read_gps_chunks(filename, chunk_size):
+        yield decode_chunk(state, columns, drop_invalid)
+
+
+#function to format an array of numbers as cells, leaving nan empty.
+#arg values: the array.
+#arg number_format: the % format of each number.
+def format_column(values, number_format):
+    return [number_format % value if value == value else '' for value in values.tolist()]
+
+
+#the formats the columns of TRACK_KEYS are written with.
+TRACK_FORMATS = {
+    'time': '%.6f',
+    #7 decimal places of a degree is about a centimeter.
+    'latitude': '%.7f',
+    'longitude': '%.7f',
+    'altitude': '%.1f',
+    'ground_speed': '%.3f',
+    'heading': '%.2f',
+    'hdop': '%.1f',
+    'num_satelites': '%d',
+    'valid': '%d',
+}
+
+
+#function to turn a decoded chunk into rows with the columns of TRACK_KEYS.
+def track_rows(track):
+    return zip(*[format_column(track[key], TRACK_FORMATS[key]) for key in TRACK_KEYS])
+
+
+#function to decode the gps readings of a CSV into a track.
+#arg filename: gps.csv, or a master file with its gps columns.
+#arg output_name: the CSV to write, with the columns of TRACK_KEYS.
+#arg max_hdop: the worst hdop a reading can have and still be used.
+#arg drop_invalid: if True only the valid readings are written, otherwise every reading is written with valid 0 or 1.
+#returns the state from new_gps_state with the counts of readings.
+def decode_gps_file(filename, output_name='gps_track.csv', max_hdop=MAX_HDOP, drop_invalid=True,
+                    chunk_size=CHUNK_SIZE):
+    state = new_gps_state(max_hdop)
+    with open(output_name, 'w') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(TRACK_KEYS)
+        for track in decode_gps_chunks(filename, state, drop_invalid, chunk_size):
+            writer.writerows(track_rows(track))
+    return state
+
+
+#function to create the state used by simplify_track.
+#arg tolerance: the distance in meters the simplified track can be from the readings it leaves out.
+#arg max_window: the most readings held before one is kept regardless.
+#arg use_altitude: if True the altitude counts in the distance (readings without one are treated as at 0).
+def new_simplify_state(tolerance=SIMPLIFY_TOLERANCE, max_window=MAX_WINDOW, use_altitude=True):
+    return {
+        'tolerance': tolerance,
+        'max_window': max_window,
+        'use_altitude': use_altitude,
+        #the latitude and longitude in degrees the positions are measured from (the first reading).
+        'origin': None,
+        #the position in meters of the last reading kept.
+        'anchor': None,
+        #the positions in meters of the readings since the last one kept, and the readings themselves.
+        'window': numpy.empty((max_window, 3)),
+        'window_rows': [],
+        #the number of readings seen and kept.
+        'rows': 0,
+        'kept': 0,
+    }
+
+
+#function to find the position of a reading in meters east, north and up from the origin of a simplify state,
+#using an equirectangular projection (accurate to well within the tolerance over the area of a flight).
+def local_position(state, latitude, longitude, altitude):
+    if state['origin'] is None:
+        state['origin'] = (latitude, longitude, math.cos(math.radians(latitude)))
+    origin_latitude, origin_longitude, scale = state['origin']
+    up = altitude if state['use_altitude'] and altitude == altitude else 0.0
+    return (math.radians(longitude - origin_longitude) * EARTH_RADIUS * scale,
+            math.radians(latitude - origin_latitude) * EARTH_RADIUS,
+            up)
+
+
+#function to find the largest distance from a straight line segment to a set of points.
+#arg points: an array of positions, one per row.
+#arg start, end: the positions at the ends of the segment.
+def largest_distance(points, start, end):
+    start = numpy.asarray(start)
+    direction = numpy.asarray(end) - start
+    length_squared = numpy.dot(direction, direction)
+    offsets = points - start
+    if length_squared == 0:
+        return numpy.sqrt(numpy.max(numpy.sum(offsets ** 2, axis=1)))
+    #the nearest point on the segment to each point.
+    fractions = numpy.clip(numpy.dot(offsets, direction) / length_squared, 0.0, 1.0)
+    return numpy.sqrt(numpy.max(numpy.sum((offsets - fractions[:, numpy.newaxis] * direction) ** 2, axis=1)))
+
+
+#function to simplify a track as it streams past, keeping a reading only when the readings since the last one
+#kept are no longer all within tolerance of a straight line from it (see the description at the top of this file).
+#the first and last readings are always kept.
+#arg state: the state from new_simplify_state (updated in place).
+#arg readings: an iterable of (latitude, longitude, altitude, row) for the valid readings in time order, where
+#row is anything to yield for the readings kept.
+#arg final: if True the last reading is kept at the end (False to carry on with more readings later).
+#yields the rows of the readings kept.
+def simplify_track(state, readings, final=True):
+    window = state['window']
+    window_rows = state['window_rows']
+    for latitude, longitude, altitude, row in readings:
+        position = local_position(state, latitude, longitude, altitude)
+        state['rows'] += 1
+        if state['anchor'] is None:
+            state['anchor'] = position
+            state['kept'] += 1
+            yield row
+            continue
+        count = len(window_rows)
+        if count > 0 and (count == state['max_window']
+                          or largest_distance(window[:count], state['anchor'], position) > state['tolerance']):
+            #the reading before can't be left out, so it is kept and the track carries on from it.
+            state['anchor'] = tuple(window[count - 1])
+            state['kept'] += 1
+            yield window_rows[-1]
+            del window_rows[:]
+            count = 0
+        window[count] = position
+        window_rows.append(row)
+    if final and len(window_rows) > 0:
+        state['anchor'] = tuple(window[len(window_rows) - 1])
+        state['kept'] += 1
+        yield window_rows[-1]
+        del window_rows[:]
+
+
+#function to simplify the track of the gps readings of a CSV.
+#arg filename: gps.csv, or a master file with its gps columns.
+#arg output_name: the CSV to write, with the columns of TRACK_KEYS (only valid readings).
+#arg tolerance, max_window, use_altitude: see new_simplify_state.
+#arg max_hdop: the worst hdop a reading can have and still be used.
+#returns a tuple of the states from new_gps_state and new_simplify_state with the counts of readings.
+def simplify_gps_file(filename, output_name='gps_simplified.csv', tolerance=SIMPLIFY_TOLERANCE, max_window=MAX_WINDOW,
+                      use_altitude=True, max_hdop=MAX_HDOP, chunk_size=CHUNK_SIZE):
+    gps_state = new_gps_state(max_hdop)
+    simplify_state = new_simplify_state(tolerance, max_window, use_altitude)
+
+    #function to get every valid reading of the file as (latitude, longitude, altitude, row).
+    def readings():
+        for track in decode_gps_chunks(filename, gps_state, True, chunk_size):
+            for latitude, longitude, altitude, row in zip(track['latitude'].tolist(), track['longitude'].tolist(),
+                                                          track['altitude'].tolist(), track_rows(track)):
+                yield latitude, longitude, altitude, row
+
+    with open(output_name, 'w') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(TRACK_KEYS)
+        writer.writerows(simplify_track(simplify_state, readings()))
+    return gps_state, simplify_state
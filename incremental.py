@@ -0,0 +1,214 @@
+'''
+    File name: incremental.py
+    Python Version: 3.6
+    Description: Provides functions to keep the cleaned data up to date while the sensor CSVs are
+    still growing (during a flight, or while replaying a long log) without reprocessing every file
+    from the first row each time.
+
+    Each function processes only the rows appended to its input since the last run and appends the
+    results to its output. Everything needed to carry on where it left off (the byte offset reached in
+    the input, the last timestamp, the rows still waiting to be filled, the last anemometer rpm and the
+    recently seen timestamps) is saved in a JSON checkpoint file after every run. At any point the output
+    is the same as running the matching function in altitude_calculator.py or anemometer.py on the whole
+    input so far.
+
+    A trailing line without a newline is treated as still being written and is left for the next run,
+    unless final is True.
+'''
+
+#import binascii to store the digests remembered while deduplicating as text.
+import binascii
+#import collections for the deque of recently seen timestamps.
+import collections
+#import the python CSV module to parse the appended rows and write the outputs.
+import csv
+#import json to read and write the checkpoint files.
+import json
+#import os to check the checkpoint and output files.
+import os
+
+#import the altitude calculator module for the altitude, dedup and fill steps.
+import altitude_calculator
+#import the anemometer module for the anemometer corrections.
+import anemometer
+
+
+#function to read a checkpoint file, or create an empty checkpoint if there isn't one yet.
+#arg checkpoint_name: the filename of the checkpoint.
+#arg input_name: the filename of the input the checkpoint belongs to.
+def load_checkpoint(checkpoint_name, input_name):
+    if os.path.exists(checkpoint_name):
+        with open(checkpoint_name, 'r') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['input'] != os.path.abspath(input_name):
+            raise ValueError(checkpoint_name + ' is a checkpoint for ' + checkpoint['input'])
+        return checkpoint
+    return {
+        'input': os.path.abspath(input_name),
+        #the offset in the input of the first row that hasn't been processed yet (0 before the header is read).
+        'offset': 0,
+        #the column names from the header of the input.
+        'fieldnames': None,
+        #the size of the output after the last run. anything written after that by a run that
+        #didn't finish is removed.
+        'output_size': 0,
+        #the time of the last row processed.
+        'last_time': None,
+        #the saved state of the step being run.
+        'state': None,
+    }
+
+
+#function to write a checkpoint file without ever leaving a half written checkpoint behind.
+def save_checkpoint(checkpoint_name, checkpoint):
+    temporary_name = checkpoint_name + '.tmp'
+    with open(temporary_name, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.rename(temporary_name, checkpoint_name)
+
+
+#function to read the complete lines of a file opened in binary mode, keeping track of how far it got.
+#arg input_file: the file, positioned at the first line to read.
+#arg position: a one item list holding the offset of the next line, updated as lines are read.
+#arg final: if True a trailing line without a newline is read too.
+def complete_lines(input_file, position, final):
+    for line in input_file:
+        if not line.endswith(b'\n') and not final:
+            return
+        position[0] += len(line)
+        yield line.decode('utf-8')
+
+
+#function to run one step over the rows appended to input_name since the last run.
+#arg input_name: the CSV being appended to.
+#arg output_name: the CSV the results are appended to.
+#arg checkpoint_name: the JSON file to keep the checkpoint in.
+#arg step: a function taking the stream of new rows and the state of the step and returning the stream of results.
+#arg new_state: a function returning the state of the step for the first run.
+#arg save_state, load_state: functions turning the state into something json can store and back.
+#arg output_fieldnames: the columns of the output, or None to use the columns of the input.
+#arg final: if True a trailing line without a newline is processed too.
+#returns the number of rows written to the output by this run.
+def run_incrementally(input_name, output_name, checkpoint_name, step, new_state, save_state=None, load_state=None,
+                      output_fieldnames=None, final=False):
+    checkpoint = load_checkpoint(checkpoint_name, input_name)
+    if os.path.getsize(input_name) < checkpoint['offset']:
+        raise ValueError(input_name + ' is shorter than when ' + checkpoint_name + ' was saved, '
+                         'so it was not just appended to. remove the checkpoint to start again.')
+    if checkpoint['state'] is None:
+        state = new_state()
+    elif load_state is not None:
+        state = load_state(checkpoint['state'])
+    else:
+        state = checkpoint['state']
+
+    #remove anything a previous run wrote to the output without saving its checkpoint.
+    if os.path.exists(output_name) and os.path.getsize(output_name) > checkpoint['output_size']:
+        with open(output_name, 'r+b') as out_file:
+            out_file.truncate(checkpoint['output_size'])
+
+    written = 0
+    with open(input_name, 'rb') as input_file:
+        position = [checkpoint['offset']]
+        input_file.seek(position[0])
+        lines = complete_lines(input_file, position, final)
+        if checkpoint['fieldnames'] is None:
+            #the first run reads the header.
+            header = next(csv.reader(lines), None)
+            if header is None:
+                return 0
+            checkpoint['fieldnames'] = header
+        fieldnames = checkpoint['fieldnames']
+        if output_fieldnames is None:
+            output_fieldnames = fieldnames
+
+        with open(output_name, 'a') as out_file:
+            writer = csv.DictWriter(out_file, output_fieldnames)
+            if checkpoint['output_size'] == 0:
+                writer.writeheader()
+
+            #function to keep track of the time of the last row read.
+            def rows_with_time():
+                for row in csv.DictReader(lines, fieldnames):
+                    checkpoint['last_time'] = row['time']
+                    yield row
+            for row in step(rows_with_time(), state):
+                writer.writerow(row)
+                written += 1
+        checkpoint['offset'] = position[0]
+
+    checkpoint['output_size'] = os.path.getsize(output_name)
+    checkpoint['state'] = save_state(state) if save_state is not None else state
+    save_checkpoint(checkpoint_name, checkpoint)
+    return written
+
+
+#function to keep the output of add_altitude_if_pressure_present up to date for a growing file.
+#arg input_name: a CSV in the format of generate_combined_spreadsheet.
+#arg output_name: the CSV to append the rows with altitude to.
+#arg checkpoint_name: the JSON file to keep the checkpoint in.
+#arg reference_pressure: the pressure in pascals at altitude 0.
+def incremental_altitude(input_name, output_name, checkpoint_name, reference_pressure=altitude_calculator.SEA_LEVEL_PRESSURE,
+                         final=False):
+    return run_incrementally(input_name, output_name, checkpoint_name,
+                             lambda rows, state: altitude_calculator.add_altitude_rows(rows, reference_pressure),
+                             dict, final=final)
+
+
+#function to turn the state of altitude_calculator.deduplicate into something json can store.
+def save_dedup_state(state):
+    return {
+        'seen': [binascii.hexlify(item_digest).decode('ascii') for item_digest in state.get('seen', ())],
+        'recent': [[time, binascii.hexlify(item_digest).decode('ascii')] for time, item_digest in state.get('recent', ())],
+    }
+
+
+#function to turn the output of save_dedup_state back into the state of altitude_calculator.deduplicate.
+def load_dedup_state(saved):
+    return {
+        'seen': set(binascii.unhexlify(item_digest) for item_digest in saved['seen']),
+        'recent': collections.deque((time, binascii.unhexlify(item_digest)) for time, item_digest in saved['recent']),
+    }
+
+
+#function to keep the output of time_based_deduplicate_csv up to date for a growing file.
+#arg input_name: the CSV to deduplicate by time.
+#arg output_name: the CSV to append the deduplicated rows to.
+#arg checkpoint_name: the JSON file to keep the checkpoint in.
+#arg assume_sorted: if True the file is sorted by time so only a window of recent times is kept in the checkpoint.
+#arg window: how many seconds of times to remember when assume_sorted is True.
+def incremental_dedup(input_name, output_name, checkpoint_name, assume_sorted=True, window=0, final=False):
+    if assume_sorted:
+        time_of = lambda row: float(row['time'])
+    else:
+        time_of = None
+
+    def step(rows, state):
+        return altitude_calculator.deduplicate(rows, lambda row: row['time'], time_of, window, state=state)
+    return run_incrementally(input_name, output_name, checkpoint_name, step, dict, save_dedup_state,
+                             load_dedup_state, final=final)
+
+
+#function to keep the output of fill_in_missing_data up to date for a growing file.
+#the rows waiting for a value are kept in the checkpoint until a later run finds one.
+#arg input_name: a time sorted CSV in the format of generate_combined_spreadsheet.
+#arg output_name: the CSV to append the filled in rows to.
+#arg checkpoint_name: the JSON file to keep the checkpoint in.
+def incremental_fill(input_name, output_name, checkpoint_name, final=False):
+    keys = [key for key in altitude_calculator.KEYS if key != 'time']
+    return run_incrementally(input_name, output_name, checkpoint_name,
+                             lambda rows, state: altitude_calculator.fill_rows(state, rows),
+                             lambda: altitude_calculator.new_fill_state(keys),
+                             output_fieldnames=altitude_calculator.KEYS, final=final)
+
+
+#function to keep the output of anemometer.correct_overflows followed by anemometer.correct_lack_of_reset
+#up to date for a growing file. the rpm of the last row is kept in the checkpoint.
+#arg input_name: a CSV with a time and an anemometer_rpm (such as geiger.csv).
+#arg output_name: the CSV to append the corrected rows to.
+#arg checkpoint_name: the JSON file to keep the checkpoint in.
+def incremental_anemometer(input_name, output_name, checkpoint_name, final=False):
+    def step(rows, state):
+        return anemometer.reset_corrected_rows(anemometer.overflow_corrected_rows(rows), state)
+    return run_incrementally(input_name, output_name, checkpoint_name, step, anemometer.new_reset_state,
+                             output_fieldnames=['time', 'anemometer_rpm'], final=final)
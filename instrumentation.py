@@ -0,0 +1,274 @@
+'''
+    File name: instrumentation.py
+    Python Version: 3.6
+    Description: Provides opt-in instrumentation of the data cleaning functions in
+    altitude_calculator.py and anemometer.py (and the stages of pipeline.py) to find out where
+    a slow run spends its time.
+
+    For every instrumented function or stage it records the number of calls, the rows read and
+    written, the sizes of the files it reads and writes, the wall and CPU time, the largest buffer of
+    rows held (such as the rows waiting for a value while filling) and the largest set of digests
+    held while deduplicating. Optionally the whole run can also be profiled with cProfile and its
+    memory traced with tracemalloc.
+
+    Instrumentation is off unless enable() is called. While it is off every hook returns straight
+    away (the streams of rows are passed through untouched), so it costs nothing per row.
+
+    Example:
+    instrumentation.enable()
+    altitude_calculator.fill_in_missing_data('altitude_added.csv')
+    instrumentation.disable()
+    instrumentation.write_report('report.json')
+'''
+
+#import cProfile to profile the whole run in profile mode.
+import cProfile
+#import functools to keep the names and descriptions of the instrumented functions.
+import functools
+#import inspect to find the filenames among the arguments of an instrumented function.
+import inspect
+#import json to write the report.
+import json
+#import os to find the sizes of the input and output files.
+import os
+#import pstats to summarize the profile.
+import pstats
+#import time for the CPU time.
+import time
+#import timeit to get the most precise timer available on this platform.
+import timeit
+
+#import tracemalloc to trace memory in profile mode (it is only available from python 3.4).
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+#the function giving the CPU time used by this process (time.clock before python 3.3).
+if hasattr(time, 'process_time'):
+    cpu_time = time.process_time
+else:
+    cpu_time = time.clock
+
+#True while instrumentation is on. the hooks check this before doing anything.
+ENABLED = False
+#the number of entries to keep in the profile and memory summaries of the report.
+SUMMARY_SIZE = 25
+
+#the statistics of every function or stage, by name.
+stages = {}
+#the profiler while profiling, and the profile once profiling has stopped.
+profiler = None
+profile_stats = None
+#True while tracing memory, and the memory traced once tracing has stopped.
+tracing_memory = False
+memory_summary = None
+
+
+#function to turn instrumentation on.
+#arg profile: if True also profile the whole run with cProfile.
+#arg trace_memory: if True also trace the memory allocated with tracemalloc.
+def enable(profile=False, trace_memory=False):
+    global ENABLED, profiler, profile_stats, tracing_memory, memory_summary
+    if trace_memory and tracemalloc is None:
+        raise ValueError('tracing memory needs tracemalloc (python 3.4 or later)')
+    ENABLED = True
+    if profile:
+        profile_stats = None
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if trace_memory:
+        memory_summary = None
+        tracing_memory = True
+        tracemalloc.start()
+
+
+#function to turn instrumentation off, keeping what has been recorded for the report.
+def disable():
+    global ENABLED, profiler, profile_stats, tracing_memory, memory_summary
+    ENABLED = False
+    if profiler is not None:
+        profiler.disable()
+        profile_stats = summarize_profile(profiler)
+        profiler = None
+    if tracing_memory:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracing_memory = False
+        memory_summary = {
+            'peak_bytes': peak,
+            'largest_allocations': [{'location': str(statistic.traceback), 'bytes': statistic.size,
+                                     'blocks': statistic.count}
+                                    for statistic in snapshot.statistics('lineno')[:SUMMARY_SIZE]],
+        }
+
+
+#function to forget everything recorded so far.
+def reset():
+    global profile_stats, memory_summary
+    stages.clear()
+    profile_stats = None
+    memory_summary = None
+
+
+#function to get the statistics of a function or stage, creating them the first time.
+def stage_statistics(name):
+    if name not in stages:
+        stages[name] = {
+            'calls': 0,
+            'rows_in': 0,
+            'rows_out': 0,
+            #the sizes of the input files when they were opened and of the output files once they were written.
+            #these are the sizes of the whole files, not counts of the bytes actually read and written.
+            'input_file_bytes': 0,
+            'output_file_bytes': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            #the most rows held in memory at once waiting to be written.
+            'peak_buffer': 0,
+            #the most digests held at once while deduplicating.
+            'peak_dedup_size': 0,
+        }
+    return stages[name]
+
+
+#function to add to a count (such as 'rows_in' or 'rows_out') counted by the function itself.
+#does nothing while instrumentation is off.
+def add_count(name, field, amount):
+    if ENABLED:
+        stage_statistics(name)[field] += amount
+
+
+#function to record the current size of something if it is the largest seen so far
+#(such as 'peak_buffer' or 'peak_dedup_size'). does nothing while instrumentation is off.
+def record_peak(name, field, size):
+    if ENABLED:
+        statistics = stage_statistics(name)
+        statistics[field] = max(statistics[field], size)
+
+
+#function to count the rows of a stream as they pass through.
+#arg name: the function or stage the rows belong to.
+#arg field: 'rows_in' or 'rows_out'.
+#arg rows: the stream of rows.
+#returns the stream itself while instrumentation is off, otherwise a stream of the same rows that counts them.
+def counted(name, field, rows):
+    if not ENABLED:
+        return rows
+    return counting_rows(stage_statistics(name), field, rows)
+
+
+#generator used by counted.
+def counting_rows(statistics, field, rows):
+    for row in rows:
+        statistics[field] += 1
+        yield row
+
+
+#function to time a stream of rows (a lazy stage) and count the rows coming out of it.
+#the time includes the time spent in the stages before it, since they run as this one asks for rows.
+#returns the stream itself while instrumentation is off.
+def timed_rows(name, rows):
+    if not ENABLED:
+        return rows
+    return timing_rows(stage_statistics(name), rows)
+
+
+#generator used by timed_rows.
+def timing_rows(statistics, rows):
+    statistics['calls'] += 1
+    iterator = iter(rows)
+    while True:
+        wall_start = timeit.default_timer()
+        cpu_start = cpu_time()
+        try:
+            row = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            statistics['wall_seconds'] += timeit.default_timer() - wall_start
+            statistics['cpu_seconds'] += cpu_time() - cpu_start
+        statistics['rows_out'] += 1
+        yield row
+
+
+#function to find the filenames given by a list of argument names of an instrumented function.
+#arg names: argument names, or functions taking the dictionary of arguments and returning a filename.
+#arg arguments: the dictionary of argument name to value of the call.
+def filenames_of(names, arguments):
+    filenames = []
+    for name in names:
+        filename = name(arguments) if callable(name) else arguments.get(name)
+        if filename is not None:
+            filenames.append(filename)
+    return filenames
+
+
+#function to add up the sizes of the files that exist out of a list of filenames.
+def total_size(filenames):
+    return sum(os.path.getsize(filename) for filename in filenames if os.path.exists(filename))
+
+
+#decorator to instrument a function that reads and writes files: every call is counted and timed and the
+#sizes of its input and output files are added to input_file_bytes and output_file_bytes.
+#arg name: the name to record the function under (the module and function name by default).
+#arg inputs: the names of the arguments holding the filenames it reads (or functions of the arguments).
+#arg outputs: the names of the arguments holding the filenames it writes (or functions of the arguments).
+def instrumented(name=None, inputs=(), outputs=()):
+    def decorator(function):
+        stage_name = name if name is not None else function.__module__ + '.' + function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            statistics = stage_statistics(stage_name)
+            arguments = inspect.getcallargs(function, *args, **kwargs)
+            statistics['calls'] += 1
+            statistics['input_file_bytes'] += total_size(filenames_of(inputs, arguments))
+            wall_start = timeit.default_timer()
+            cpu_start = cpu_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                statistics['wall_seconds'] += timeit.default_timer() - wall_start
+                statistics['cpu_seconds'] += cpu_time() - cpu_start
+                statistics['output_file_bytes'] += total_size(filenames_of(outputs, arguments))
+        return wrapper
+    return decorator
+
+
+#function to summarize a profile as the functions with the most cumulative time.
+def summarize_profile(finished_profiler):
+    stats = pstats.Stats(finished_profiler).stats
+    summary = []
+    for (filename, line, function), (primitive_calls, calls, total, cumulative, callers) in stats.items():
+        summary.append({
+            'function': '%s:%d(%s)' % (filename, line, function),
+            'calls': calls,
+            'own_seconds': total,
+            'cumulative_seconds': cumulative,
+        })
+    summary.sort(key=lambda entry: entry['cumulative_seconds'], reverse=True)
+    return summary[:SUMMARY_SIZE]
+
+
+#function to get everything recorded so far as a dictionary that can be written as JSON.
+#the profile and memory trace are only included once disable() has stopped them.
+def report():
+    result = {'stages': dict((name, dict(statistics)) for name, statistics in stages.items())}
+    for statistics in result['stages'].values():
+        statistics['rows_per_second'] = (statistics['rows_out'] / statistics['wall_seconds']
+                                         if statistics['wall_seconds'] > 0 else None)
+    if profile_stats is not None:
+        result['profile'] = profile_stats
+    if memory_summary is not None:
+        result['memory'] = memory_summary
+    return result
+
+
+#function to write the report (see report) to a JSON file.
+def write_report(filename):
+    with open(filename, 'w') as report_file:
+        json.dump(report(), report_file, indent=2, sort_keys=True)
@@ -0,0 +1,534 @@
+'''
+    File name: live_ingest.py
+    Python Version: 3.6 (uses asyncio)
+    Description: Cleans the sensor data live at the ground station instead of after the payload
+    is recovered. The four Arduino feeds (geiger/anemometer, pressure/solar/sound, gps and interior)
+    are read at the same time from any source of CSV lines, merged into time order, given their
+    altitude and published as rows in the format of generate_combined_spreadsheet as soon as they
+    are in order.
+
+    A feed is any asynchronous iterable of lines (bytes) starting with the header of the sensor's CSV:
+    stream_lines turns an asyncio.StreamReader (a socket, a serial port bridged to a pipe, ...) into one,
+    and replay_lines replays one of the CSVs logged during the launch at real or accelerated speed, so
+    everything can be run without any hardware. open_feed opens a feed from a short description:
+    tcp:HOST:PORT, unix:PATH, pipe:PATH (a named pipe) or the filename of a CSV to replay.
+
+    The feeds are merged with a reorder buffer (a heap like merge_by_time). Every feed is sorted by time,
+    so a row can be published once every feed has sent a row at a later time. A feed that stops or falls
+    behind would hold everything up, so a row is also published once a row more than max_lateness seconds
+    (of flight time) later has arrived from any feed, and the earliest row is published whenever the buffer
+    holds more than max_buffer rows. A row that arrives after a later row has been published is late: it
+    is dropped (and counted) so the published rows stay in time order, unless drop_late is False.
+
+    Rows are published on an asyncio.Queue. If the consumer can't keep up the ingester either waits for
+    room in the queue (overflow 'block'), which stops it reading the feeds so their sources are slowed
+    down in turn, or throws away the oldest row waiting in the queue (overflow 'drop_oldest'), which keeps
+    a live display current. None is published after the last row.
+
+    The counts of rows in, out, late, forced out of the buffer and dropped, the time spent waiting for the
+    consumer and the latency of every row (from the time its line was read to the time it was published)
+    are kept in a metrics dictionary that can be read while ingesting (see latency_summary).
+
+    Example, replaying the launch ten times faster than it happened:
+    python live_ingest.py --geiger geiger.csv --pressure pressure.csv --gps gps.csv --interior interior.csv
+        --speed 10 --output live.csv --metrics live_metrics.json
+'''
+
+#import argparse to read the feeds and options from the command line.
+import argparse
+#import asyncio to read the feeds at the same time.
+import asyncio
+#import collections for the deque of recent latencies.
+import collections
+#import the python CSV module to parse the lines of the feeds and write the output.
+import csv
+#import heapq for the reorder buffer.
+import heapq
+#import json to write the metrics.
+import json
+#import sys to write the metrics summary.
+import sys
+
+#import the altitude calculator module for the column names, renames and altitude calculation.
+import altitude_calculator
+#import the compact_rows module to move the columns of each feed to where they are in KEYS.
+import compact_rows
+
+#the names of the feeds, in the order ingest takes them.
+SENSORS = ('geiger', 'pressure', 'gps', 'interior')
+#the columns to rename in each feed, in the same order.
+SENSOR_RENAMES = (altitude_calculator.GEIGER_RENAMES, altitude_calculator.PRESSURE_RENAMES,
+                  altitude_calculator.GPS_RENAMES, altitude_calculator.INTERIOR_RENAMES)
+#the default number of seconds of flight time a row waits for the slower feeds before it is published anyway.
+MAX_LATENESS = 5.0
+#the default most rows held in the reorder buffer.
+MAX_BUFFER = 10000
+#the default most rows waiting in the published queue.
+QUEUE_SIZE = 1000
+#the most rows waiting between the feeds and the reorder buffer.
+INBOX_SIZE = 1000
+#the number of lines an unpaced replay reads before letting the other feeds run.
+REPLAY_BATCH = 100
+#the number of recent latencies kept to work out the percentiles.
+LATENCY_SAMPLES = 10000
+#the ways of handling a full published queue (see the description at the top of this file).
+OVERFLOW_POLICIES = ('block', 'drop_oldest')
+#the position of the time in KEYS.
+TIME_POSITION = altitude_calculator.KEYS.index('time')
+#the position of the pressure the altitude is calculated from in KEYS.
+PRESSURE_POSITION = altitude_calculator.KEYS.index('calibrated_pressure')
+
+
+#function to turn an asyncio.StreamReader into a feed (an asynchronous iterable of lines).
+async def stream_lines(reader):
+    while True:
+        line = await reader.readline()
+        if len(line) == 0:
+            return
+        yield line
+
+
+#function to get the time of the first row of a CSV, or None if it has no rows with a time.
+#rows without a time (such as garbled ones) are skipped, the same as read_feed skips them.
+def first_time(filename):
+    with open(filename, 'r', errors='replace') as original_file:
+        for row in csv.DictReader(original_file):
+            try:
+                return float(row.get('time'))
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+#function to create the clock shared by the replays of several CSVs so they stay in step with each other.
+#arg filenames: the CSVs that will be replayed.
+#arg speed: how many times faster than real time to replay them, or None to replay as fast as they are read.
+def new_replay_clock(filenames, speed=1.0):
+    times = [time for time in (first_time(filename) for filename in filenames) if time is not None]
+    return {
+        'speed': speed,
+        #the earliest time in any of the files, replayed when the clock starts.
+        'start_time': min(times) if len(times) > 0 else 0.0,
+        #the time on the event loop when the clock started (set by the first line replayed).
+        'start_loop_time': None,
+    }
+
+
+#function to replay a CSV as a feed, each row when its time comes round on the clock.
+#arg filename: the CSV to replay.
+#arg clock: the clock from new_replay_clock.
+async def replay_lines(filename, clock):
+    loop = asyncio.get_event_loop()
+    if clock['start_loop_time'] is None:
+        clock['start_loop_time'] = loop.time()
+    with open(filename, 'rb') as original_file:
+        header = original_file.readline()
+        if len(header) == 0:
+            return
+        yield header
+        time_position = next(csv.reader([header.decode('utf-8')])).index('time')
+        count = 0
+        for line in original_file:
+            if clock['speed'] is None:
+                #let the other feeds run every so often.
+                count += 1
+                if count % REPLAY_BATCH == 0:
+                    await asyncio.sleep(0)
+            else:
+                try:
+                    row_time = float(next(csv.reader([line.decode('utf-8', 'replace')]))[time_position])
+                except (StopIteration, IndexError, ValueError, csv.Error):
+                    #a line without a time (such as a garbled one) is passed on straight away for read_feed
+                    #to count as a bad row.
+                    row_time = None
+                if row_time is not None:
+                    due = clock['start_loop_time'] + (row_time - clock['start_time']) / clock['speed']
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+            yield line
+
+
+#function to check whether the description of a feed is a CSV to replay (rather than tcp:, unix: or pipe:).
+def is_replay(description):
+    return description.partition(':')[0] not in ('tcp', 'unix', 'pipe')
+
+
+#function to open a feed from a description.
+#arg description: tcp:HOST:PORT, unix:PATH, pipe:PATH or the filename of a CSV to replay.
+#arg clock: the clock to replay CSVs on (see new_replay_clock).
+async def open_feed(description, clock=None):
+    kind, separator, address = description.partition(':')
+    if kind == 'tcp':
+        host, separator, port = address.rpartition(':')
+        reader, writer = await asyncio.open_connection(host, int(port))
+        return stream_lines(reader)
+    if kind == 'unix':
+        reader, writer = await asyncio.open_unix_connection(address)
+        return stream_lines(reader)
+    if kind == 'pipe':
+        reader = asyncio.StreamReader()
+        await asyncio.get_event_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                         open(address, 'rb'))
+        return stream_lines(reader)
+    if clock is None:
+        clock = new_replay_clock([description])
+    return replay_lines(description, clock)
+
+
+#function to create the metrics of an ingest.
+#arg sensors: the names of the feeds.
+def new_ingest_metrics(sensors=SENSORS):
+    return {
+        #the rows read from each feed.
+        'rows_in': dict((sensor, 0) for sensor in sensors),
+        #lines that couldn't be read as a row with a time, or with a pressure that isn't a number
+        #(such as a line garbled on a serial link).
+        'bad_rows': 0,
+        #rows that arrived after a later row was published.
+        'late_rows': 0,
+        #rows published because the reorder buffer was full rather than because they were in order.
+        'forced_rows': 0,
+        #the rows published and not dropped since (the rows the consumer has taken or will take).
+        'rows_out': 0,
+        #rows thrown away because the consumer was too slow (overflow 'drop_oldest').
+        'dropped_rows': 0,
+        #the number of times and the seconds spent waiting for room in the queue (overflow 'block').
+        'blocked_puts': 0,
+        'blocked_seconds': 0.0,
+        #the most rows held in the reorder buffer at once.
+        'peak_buffer': 0,
+        #the error that stopped each feed that didn't finish cleanly.
+        'feed_errors': {},
+        #the seconds from reading the line of each row to publishing it.
+        'latency_count': 0,
+        'latency_total': 0.0,
+        'latency_max': 0.0,
+        'latency_samples': collections.deque(maxlen=LATENCY_SAMPLES),
+    }
+
+
+#function to create the state of the reorder buffer.
+#arg feeds: the number of feeds.
+#arg max_lateness, max_buffer, drop_late: see the description at the top of this file.
+def new_merge_state(feeds, max_lateness=MAX_LATENESS, max_buffer=MAX_BUFFER, drop_late=True):
+    return {
+        'max_lateness': max_lateness,
+        'max_buffer': max_buffer,
+        'drop_late': drop_late,
+        #the heap of (time, feed number, sequence number, time read, row) of the rows waiting to be published.
+        #the sequence number keeps the rows of a feed with the same time in the order they arrived.
+        'heap': [],
+        'sequence': 0,
+        #the time of the last row from each feed, and whether each feed has finished.
+        'heads': [None] * feeds,
+        'finished': [False] * feeds,
+        #the latest time from any feed and the time of the last row published.
+        'latest_time': None,
+        'released_time': None,
+    }
+
+
+#function to add a row to the reorder buffer.
+#arg state: the state from new_merge_state (updated in place).
+#arg feed: the number of the feed the row came from.
+#arg time: the time of the row.
+#arg row: the row.
+#arg arrival: the time on the event loop when the line of the row was read.
+#arg metrics: the metrics from new_ingest_metrics (updated in place).
+def add_to_buffer(state, feed, time, row, arrival, metrics):
+    if state['released_time'] is not None and time < state['released_time']:
+        metrics['late_rows'] += 1
+        if state['drop_late']:
+            return
+    heapq.heappush(state['heap'], (time, feed, state['sequence'], arrival, row))
+    state['sequence'] += 1
+    state['heads'][feed] = time
+    if state['latest_time'] is None or time > state['latest_time']:
+        state['latest_time'] = time
+    metrics['peak_buffer'] = max(metrics['peak_buffer'], len(state['heap']))
+
+
+#function to take the rows that are ready to publish out of the reorder buffer.
+#arg state: the state from new_merge_state (updated in place).
+#arg metrics: the metrics from new_ingest_metrics (updated in place).
+#arg final: if True every row is taken (once every feed has finished).
+#returns a list of (time read, row) in time order.
+def release_rows(state, metrics, final=False):
+    heap = state['heap']
+    #rows before the last row of every feed that hasn't finished can't be followed by an earlier row.
+    heads = [head for head, finished in zip(state['heads'], state['finished']) if not finished]
+    if len(heads) == 0:
+        final = True
+    safe_time = None if None in heads or len(heads) == 0 else min(heads)
+    #rows more than max_lateness before the latest row aren't waited for any longer.
+    late_time = None
+    if state['max_lateness'] is not None and state['latest_time'] is not None:
+        late_time = state['latest_time'] - state['max_lateness']
+    released = []
+    while len(heap) > 0:
+        time = heap[0][0]
+        if not (final or (safe_time is not None and time < safe_time) or (late_time is not None and time <= late_time)):
+            if state['max_buffer'] is None or len(heap) <= state['max_buffer']:
+                break
+            metrics['forced_rows'] += 1
+        time, feed, sequence, arrival, row = heapq.heappop(heap)
+        released.append((arrival, row))
+        if state['released_time'] is None or time > state['released_time']:
+            state['released_time'] = time
+    return released
+
+
+#function to read a feed into the inbox of ingest as (feed number, time, row, time read).
+#(feed number, None, None, None) is put in the inbox once the feed has finished.
+#arg feed: the number of the feed.
+#arg lines: the feed.
+#arg renames: the columns to rename in the feed.
+#arg inbox: the asyncio.Queue to put the rows in.
+#arg metrics: the metrics from new_ingest_metrics (updated in place).
+#arg sensor: the name of the feed in the metrics.
+async def read_feed(feed, lines, renames, inbox, metrics, sensor):
+    loop = asyncio.get_event_loop()
+    projection = None
+    width = 0
+    try:
+        async for line in lines:
+            arrival = loop.time()
+            try:
+                row = next(csv.reader([line.decode('utf-8', 'replace')]), [])
+            except csv.Error:
+                metrics['bad_rows'] += 1
+                continue
+            if len(row) == 0:
+                continue
+            if projection is None:
+                #the first line is the header. columns that aren't in KEYS are left out.
+                projection = compact_rows.compile_projection(row, altitude_calculator.KEYS, renames, strict=False)
+                width = len(row)
+                continue
+            #pad or cut the row to the width of the header, followed by the empty cell for missing columns.
+            row = row[:width] + [''] * (max(width - len(row), 0) + 1)
+            row = projection(row)
+            try:
+                time = float(row[TIME_POSITION])
+                #the altitude is calculated from the pressure, so a garbled one would stop the whole ingester.
+                if len(row[PRESSURE_POSITION]) > 0:
+                    float(row[PRESSURE_POSITION])
+            except ValueError:
+                metrics['bad_rows'] += 1
+                continue
+            metrics['rows_in'][sensor] += 1
+            await inbox.put((feed, time, row, arrival))
+    except asyncio.CancelledError:
+        #ingest cancels the feeds it no longer needs, which isn't an error (CancelledError is an Exception
+        #before python 3.8).
+        raise
+    except Exception as error:
+        #a feed that fails for any reason (such as a dropped connection or a file without a time column)
+        #is finished, the other feeds carry on. the error is recorded so the feed doesn't stop silently.
+        metrics['feed_errors'][sensor] = '%s: %s' % (type(error).__name__, error)
+    finally:
+        await inbox.put((feed, None, None, None))
+
+
+#function to publish a row on the queue.
+#arg queue: the asyncio.Queue to publish on.
+#arg row: the row.
+#arg overflow: the way of handling a full queue (see OVERFLOW_POLICIES).
+#arg metrics: the metrics from new_ingest_metrics (updated in place).
+async def publish(queue, row, overflow, metrics):
+    if queue.full():
+        if overflow == 'drop_oldest':
+            queue.get_nowait()
+            #the dropped row was counted in rows_out when it was published.
+            metrics['dropped_rows'] += 1
+            metrics['rows_out'] -= 1
+        else:
+            loop = asyncio.get_event_loop()
+            metrics['blocked_puts'] += 1
+            start = loop.time()
+            await queue.put(row)
+            metrics['blocked_seconds'] += loop.time() - start
+            return
+    queue.put_nowait(row)
+
+
+#function to record the latency of a published row.
+def record_latency(metrics, latency):
+    metrics['latency_count'] += 1
+    metrics['latency_total'] += latency
+    metrics['latency_max'] = max(metrics['latency_max'], latency)
+    metrics['latency_samples'].append(latency)
+
+
+#function to ingest the feeds, publishing the merged rows with their altitude on queue until every feed has
+#finished (see the description at the top of this file).
+#arg feeds: the feeds (asynchronous iterables of lines) in the order of SENSORS.
+#arg queue: the asyncio.Queue to publish the rows on, as tuples of the columns of KEYS. None is published last.
+#arg reference_pressure: the pressure in pascals at altitude 0.
+#arg max_lateness: the seconds of flight time a row waits for the slower feeds (None to wait for every feed).
+#arg max_buffer: the most rows held in the reorder buffer (None for no limit).
+#arg drop_late: if True late rows are dropped, otherwise they are published out of order.
+#arg overflow: the way of handling a full queue (see OVERFLOW_POLICIES).
+#arg metrics: the metrics to update (from new_ingest_metrics), so they can be read while ingesting.
+#returns the metrics.
+async def ingest(feeds, queue, reference_pressure=altitude_calculator.SEA_LEVEL_PRESSURE, max_lateness=MAX_LATENESS,
+                 max_buffer=MAX_BUFFER, drop_late=True, overflow='block', metrics=None):
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError('unknown overflow ' + overflow + ', the choices are ' + ', '.join(OVERFLOW_POLICIES))
+    if len(feeds) != len(SENSORS):
+        raise ValueError('ingest takes %d feeds (%s)' % (len(SENSORS), ', '.join(SENSORS)))
+    if metrics is None:
+        metrics = new_ingest_metrics()
+    loop = asyncio.get_event_loop()
+    state = new_merge_state(len(feeds), max_lateness, max_buffer, drop_late)
+    inbox = asyncio.Queue(maxsize=INBOX_SIZE)
+    readers = [asyncio.ensure_future(read_feed(feed, lines, renames, inbox, metrics, sensor))
+               for feed, (lines, renames, sensor) in enumerate(zip(feeds, SENSOR_RENAMES, SENSORS))]
+    try:
+        while not all(state['finished']):
+            #take everything waiting in the inbox before publishing, so rows are published in batches when busy.
+            items = [await inbox.get()]
+            while not inbox.empty() and len(items) < INBOX_SIZE:
+                items.append(inbox.get_nowait())
+            for feed, time, row, arrival in items:
+                if time is None:
+                    state['finished'][feed] = True
+                else:
+                    add_to_buffer(state, feed, time, row, arrival, metrics)
+            released = release_rows(state, metrics, all(state['finished']))
+            if len(released) == 0:
+                continue
+            #add the altitude to the whole batch at once, the same way add_altitude_if_pressure_present does.
+            arrivals = [arrival for arrival, row in released]
+            rows = altitude_calculator.add_altitude_compact_rows([row for arrival, row in released],
+                                                                 altitude_calculator.KEYS, reference_pressure)
+            for arrival, row in zip(arrivals, rows):
+                await publish(queue, tuple(row), overflow, metrics)
+                metrics['rows_out'] += 1
+                record_latency(metrics, loop.time() - arrival)
+    finally:
+        for reader in readers:
+            reader.cancel()
+    await queue.put(None)
+    return metrics
+
+
+#function to summarize the latency of the rows published so far.
+#returns a dictionary of the number of rows, the mean and most seconds of latency and the 50th, 95th and 99th
+#percentiles of the most recent LATENCY_SAMPLES rows.
+def latency_summary(metrics):
+    samples = sorted(metrics['latency_samples'])
+    summary = {
+        'rows': metrics['latency_count'],
+        'mean_seconds': metrics['latency_total'] / metrics['latency_count'] if metrics['latency_count'] > 0 else None,
+        'max_seconds': metrics['latency_max'],
+    }
+    for percentile in (50, 95, 99):
+        summary['p%d_seconds' % percentile] = (samples[min(len(samples) - 1, len(samples) * percentile // 100)]
+                                               if len(samples) > 0 else None)
+    return summary
+
+
+#function to get the metrics as a dictionary that can be written as JSON (with the latency summarized).
+def metrics_report(metrics):
+    report = dict((key, value) for key, value in metrics.items() if key != 'latency_samples')
+    report['latency'] = latency_summary(metrics)
+    return report
+
+
+#function to write the rows published on a queue to a CSV until None is published.
+#the file is flushed whenever the queue is empty so the CSV can be followed while it is written.
+#arg queue: the queue ingest publishes on.
+#arg output_name: the CSV to write (in the format of add_altitude_if_pressure_present).
+#returns the number of rows written.
+async def write_published_rows(queue, output_name):
+    count = 0
+    with open(output_name, 'w') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(altitude_calculator.KEYS)
+        while True:
+            row = await queue.get()
+            if row is None:
+                return count
+            writer.writerow(row)
+            count += 1
+            if queue.empty():
+                out_file.flush()
+
+
+#function to ingest four feeds into a CSV.
+#arg descriptions: the descriptions of the feeds in the order of SENSORS (see open_feed).
+#arg output_name: the CSV to write.
+#arg speed: how many times faster than real time to replay CSVs, or None to replay as fast as they are read.
+#arg queue_size: the most rows waiting to be written.
+#the other arguments are passed to ingest.
+#returns the metrics.
+async def ingest_to_csv(descriptions, output_name, speed=1.0, queue_size=QUEUE_SIZE, **options):
+    clock = new_replay_clock([description for description in descriptions if is_replay(description)], speed)
+    feeds = [await open_feed(description, clock) for description in descriptions]
+    queue = asyncio.Queue(maxsize=queue_size)
+    writer = asyncio.ensure_future(write_published_rows(queue, output_name))
+    try:
+        metrics = await ingest(feeds, queue, **options)
+        await writer
+    finally:
+        writer.cancel()
+    return metrics
+
+
+#function to run a coroutine to the end (asyncio.run from python 3.7, an event loop before that).
+def run(coroutine):
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(coroutine)
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+#function to run the ingester from the command line (see the description at the top of this file).
+#arg argv: the command line arguments (sys.argv[1:] by default).
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge and clean the balloon sensor feeds live.')
+    for sensor in SENSORS:
+        parser.add_argument('--' + sensor, required=True,
+                            help='the %s feed: tcp:HOST:PORT, unix:PATH, pipe:PATH or a CSV to replay' % sensor)
+    parser.add_argument('--output', required=True, help='the CSV to write')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='how many times faster than real time to replay CSVs (0 for as fast as possible)')
+    parser.add_argument('--max-lateness', type=float,
+                        help='the seconds of flight time a row waits for slower feeds (negative to always wait). '
+                             'defaults to %s, or always waiting when replaying as fast as possible' % MAX_LATENESS)
+    parser.add_argument('--max-buffer', type=int, default=MAX_BUFFER, help='the most rows held to reorder them')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='the most rows waiting to be written')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='wait for the writer or drop the oldest rows when it falls behind')
+    parser.add_argument('--keep-late', action='store_true', help='write late rows out of order instead of dropping them')
+    parser.add_argument('--reference-pressure', type=float, default=altitude_calculator.SEA_LEVEL_PRESSURE,
+                        help='the pressure in pascals at altitude 0')
+    parser.add_argument('--metrics', help='write the metrics to this JSON file')
+    arguments = parser.parse_args(argv)
+
+    descriptions = [getattr(arguments, sensor) for sensor in SENSORS]
+    max_lateness = arguments.max_lateness
+    if max_lateness is None:
+        #feeds replayed as fast as possible get far apart in flight time, so wait for every feed instead.
+        max_lateness = MAX_LATENESS if arguments.speed > 0 else -1
+    metrics = run(ingest_to_csv(
+        descriptions, arguments.output, arguments.speed if arguments.speed > 0 else None, arguments.queue_size,
+        reference_pressure=arguments.reference_pressure,
+        max_lateness=max_lateness if max_lateness >= 0 else None,
+        max_buffer=arguments.max_buffer, drop_late=not arguments.keep_late, overflow=arguments.overflow))
+    report = metrics_report(metrics)
+    if arguments.metrics is not None:
+        with open(arguments.metrics, 'w') as metrics_file:
+            json.dump(report, metrics_file, indent=2, sort_keys=True)
+    latency = report['latency']
+    sys.stdout.write('wrote %d rows to %s (%d late, %d forced, %d dropped, %d bad)\n'
+                     % (report['rows_out'], arguments.output, report['late_rows'], report['forced_rows'],
+                        report['dropped_rows'], report['bad_rows']))
+    if latency['rows'] > 0:
+        sys.stdout.write('latency: mean %.4fs, p95 %.4fs, max %.4fs\n'
+                         % (latency['mean_seconds'], latency['p95_seconds'], latency['max_seconds']))
+
+
+if __name__ == '__main__':
+    main()
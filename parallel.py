@@ -0,0 +1,230 @@
+'''
+    File name: parallel.py
+    Python Version: 3.6
+    Description: Provides functions to run the independent parts of the data cleaning on
+    several processes at once.
+
+    Work is split by sensor file or column group (each call is independent), or for
+    fill_in_missing_data by ranges of rows, each of which is filled by a separate process starting
+    from the last values of the ranges before it and reading on past its end to find the next values.
+    The results are always put back together in the same order so the output is byte for byte the
+    same as running everything in a single process.
+'''
+
+#import the python CSV module to read and write the chunks of the master file.
+import csv
+#import io to parse the chunks of the master file out of memory.
+import io
+#import multiprocessing to run the work on a pool of processes.
+import multiprocessing
+#import os to find the size of the master file and remove the partial outputs.
+import os
+#import shutil to join the partial outputs into one file.
+import shutil
+
+#import the altitude calculator module for the functions being run in parallel.
+import altitude_calculator
+
+#the default number of processes to use (one per CPU).
+DEFAULT_WORKERS = multiprocessing.cpu_count()
+#the default size in bytes of each range of rows filled by one process.
+CHUNK_BYTES = 4 * 1024 * 1024
+#the default number of bytes at the end of each range of rows scanned first to find the last value of each column.
+OVERLAP_BYTES = 256 * 1024
+
+
+#function to call a function with each list of arguments on a pool of processes.
+#arg function: a function defined at the top level of a module (so it can be sent to another process).
+#arg argument_lists: a list of tuples of arguments, one for each call.
+#arg workers: the number of processes to use. with 1 worker everything runs in this process.
+#returns the list of results in the same order as argument_lists.
+def run_in_parallel(function, argument_lists, workers=DEFAULT_WORKERS):
+    argument_lists = list(argument_lists)
+    if workers <= 1 or len(argument_lists) <= 1:
+        return [function(*arguments) for arguments in argument_lists]
+    pool = multiprocessing.Pool(min(workers, len(argument_lists)))
+    try:
+        return pool.map(call_with_arguments, [(function, arguments) for arguments in argument_lists])
+    finally:
+        pool.close()
+        pool.join()
+
+
+#function to call function_and_arguments[0] with the arguments in function_and_arguments[1].
+#used by run_in_parallel because pool.map only passes a single argument.
+def call_with_arguments(function_and_arguments):
+    function, arguments = function_and_arguments
+    return function(*arguments)
+
+
+#function to run filter_file for several groups of keys at once, one process per group.
+#arg filename: the filename for the sorted output of generate_combined_spreadsheet.
+#arg key_groups: a dictionary of output filename to the list of keys to include in it.
+#arg workers: the number of processes to use.
+def parallel_filter_file(filename, key_groups, workers=DEFAULT_WORKERS):
+    output_names = sorted(key_groups)
+    run_in_parallel(altitude_calculator.filter_file,
+                    [(filename, key_groups[output_name], output_name) for output_name in output_names], workers)
+
+
+#function to run attach_altitude for several sensor files at once, one process per sensor file.
+#arg jobs: a list of tuples of arguments to attach_altitude (filename, keys_to_include, output_name, ...).
+#arg workers: the number of processes to use.
+def parallel_attach_altitude(jobs, workers=DEFAULT_WORKERS):
+    run_in_parallel(altitude_calculator.attach_altitude, jobs, workers)
+
+
+#function to find the offset of the start of the first line at or after offset in a file.
+#arg data_file: the file opened in binary mode.
+#arg offset: the offset to start looking from.
+def next_line_start(data_file, offset):
+    if offset == 0:
+        return 0
+    #the line starts right at offset if the byte before it ends a line.
+    data_file.seek(offset - 1)
+    data_file.readline()
+    return data_file.tell()
+
+
+#function to split a file into ranges of about chunk_bytes bytes that start and end on a line.
+#arg filename: the file to split.
+#arg start: the offset to start from (the end of the header).
+#arg chunk_bytes: the approximate size of each range.
+#returns a list of (start, end) offsets.
+def split_into_ranges(filename, start, chunk_bytes):
+    size = os.path.getsize(filename)
+    ranges = []
+    with open(filename, 'rb') as data_file:
+        while start < size:
+            end = next_line_start(data_file, min(size, start + chunk_bytes))
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+#function to read the rows of a CSV between two offsets as dictionaries.
+#arg data_file: the file opened in binary mode.
+#arg fieldnames: the column names (from the header of the file).
+def read_rows_between(data_file, fieldnames, start, end):
+    data_file.seek(start)
+    text = data_file.read(end - start).decode('utf-8')
+    return list(csv.DictReader(io.StringIO(text), fieldnames))
+
+
+#function to read the rows of a CSV from an offset to the end of the file as dictionaries.
+def read_rows_from(data_file, fieldnames, start):
+    data_file.seek(start)
+    reader = csv.DictReader(io.TextIOWrapper(data_file, encoding='utf-8'), fieldnames)
+    for row in reader:
+        yield row
+
+
+#function to find the last value of every column in a range of rows of a master file, and the time it was taken.
+#the rows are scanned from the end of the range backwards, first only the last overlap_bytes of it, and only
+#the columns without a value there are looked for in the rest of the range, so a range is read at most once.
+#arg filename: the master file.
+#arg start, end: the offsets of the range of rows.
+#arg overlap_bytes: how many bytes at the end of the range to scan first.
+#returns a dictionary of column to (value, time) for the columns with a value in the range.
+def last_values_in_range(filename, start, end, overlap_bytes=OVERLAP_BYTES):
+    keys = [key for key in altitude_calculator.KEYS if key != 'time']
+    last_values = {}
+    with open(filename, 'rb') as data_file:
+        fieldnames = next(csv.reader([data_file.readline().decode('utf-8')]))
+        time_position = fieldnames.index('time')
+        positions = [(key, fieldnames.index(key)) for key in keys]
+        tail_start = max(start, next_line_start(data_file, max(0, end - overlap_bytes)))
+        for part_start, part_end in ((tail_start, end), (start, tail_start)):
+            if part_start >= part_end or len(last_values) == len(keys):
+                continue
+            data_file.seek(part_start)
+            text = data_file.read(part_end - part_start).decode('utf-8')
+            for row in reversed(list(csv.reader(io.StringIO(text)))):
+                for key, position in positions:
+                    if key not in last_values and position < len(row) and len(row[position]) > 0:
+                        last_values[key] = (row[position], float(row[time_position]))
+                if len(last_values) == len(keys):
+                    break
+    return last_values
+
+
+#function to fill in one range of rows of a master file and write them (without a header) to output_name.
+#the fill starts from the last value of every column before the range (worked out by
+#parallel_fill_in_missing_data from last_values_in_range of the ranges before it). rows after the range
+#are read until every row in the range has either been written or has been dropped (only at the end of
+#the file), exactly like fill_rows does in a single pass.
+#arg filename: the master file.
+#arg start, end: the offsets of the range of rows to fill.
+#arg previous_values: a dictionary of column to the (value, time) of its last value before the range.
+#arg output_name: the file to write the filled rows to.
+def fill_range(filename, start, end, previous_values, output_name):
+    keys = [key for key in altitude_calculator.KEYS if key != 'time']
+    state = altitude_calculator.new_fill_state(keys)
+    for key, (value, time) in previous_values.items():
+        state['previous_points'][key] = value
+        state['previous_times'][key] = time
+    with open(filename, 'rb') as data_file:
+        fieldnames = next(csv.reader([data_file.readline().decode('utf-8')]))
+        rows = read_rows_between(data_file, fieldnames, start, end)
+        row_count = len(rows)
+        with open(output_name, 'w') as out_file:
+            writer = csv.DictWriter(out_file, altitude_calculator.KEYS)
+            written = 0
+            #keep reading past the end of the range until every row in it has been written.
+            if row_count > 0:
+                def rows_and_lookahead():
+                    for row in rows:
+                        yield row
+                    for row in read_rows_from(data_file, fieldnames, end):
+                        yield row
+                for row in altitude_calculator.fill_rows(state, rows_and_lookahead()):
+                    writer.writerow(row)
+                    written += 1
+                    if written == row_count:
+                        break
+
+
+#function to fill in all columns of a master file like altitude_calculator.fill_in_missing_data using
+#several processes, one range of rows (a range of time, since the file is sorted) at a time.
+#the output is byte for byte the same as fill_in_missing_data.
+#arg filename, the filename to fill in the columns for.
+#arg output_name, the name of the file to output with no values missing.
+#arg workers: the number of processes to use.
+#arg chunk_bytes: the approximate size of the range of rows filled by each process.
+#arg overlap_bytes: how many bytes at the end of each range to scan first for the last value of every column.
+#precondition: the CSV filename must be sorted by time and all rows must have a time.
+
+#this runs in two passes. the first finds the last value of every column in each range in parallel, which
+#gives the fill state at the start of every range (the last values of the ranges before it), so no process
+#has to read anything before its own range however sparse a column is. the second fills the ranges in parallel.
+def parallel_fill_in_missing_data(filename, output_name='filled.csv', workers=DEFAULT_WORKERS,
+                                  chunk_bytes=CHUNK_BYTES, overlap_bytes=OVERLAP_BYTES):
+    with open(filename, 'rb') as data_file:
+        data_file.readline()
+        header_end = data_file.tell()
+    ranges = split_into_ranges(filename, header_end, chunk_bytes)
+    range_last_values = run_in_parallel(last_values_in_range, [(filename, start, end, overlap_bytes)
+                                                               for start, end in ranges], workers)
+    #the last value of every column before each range.
+    previous_values = []
+    values = {}
+    for last_values in range_last_values:
+        previous_values.append(dict(values))
+        values.update(last_values)
+    partial_names = [output_name + '.part%d' % index for index in range(len(ranges))]
+    try:
+        jobs = [(filename, start, end, previous, partial_name)
+                for (start, end), previous, partial_name in zip(ranges, previous_values, partial_names)]
+        run_in_parallel(fill_range, jobs, workers)
+        #write the header and then every range in order.
+        with open(output_name, 'w') as new_file:
+            csv.DictWriter(new_file, altitude_calculator.KEYS).writeheader()
+        #copy the bytes of each range as they are so the line endings aren't changed.
+        with open(output_name, 'ab') as new_file:
+            for partial_name in partial_names:
+                with open(partial_name, 'rb') as partial_file:
+                    shutil.copyfileobj(partial_file, new_file)
+    finally:
+        for partial_name in partial_names:
+            if os.path.exists(partial_name):
+                os.remove(partial_name)
@@ -0,0 +1,224 @@
+'''
+    File name: pipeline.py
+    Python Version: 3.6
+    Description: Chains the cleaning steps in altitude_calculator.py together without writing
+    an intermediate file between every step.
+
+    Each stage takes a stream of rows (dictionaries) and returns a stream of rows, so the rows
+    flow from the sensor files through every stage in memory and only the final output (and any
+    checkpoints asked for) is written to disk. The stages are:
+    altitude: add calculated_altitude to rows with a calibrated_pressure (add_altitude_if_pressure_present).
+    dedup: remove rows with the same time as an earlier row (time_based_deduplicate_csv).
+    fill: fill in every missing value from the nearest row in time (fill_in_missing_data).
+    filter: keep just the time, altitude and the given keys (filter_file).
+
+    Example, from the four sensor files to a cleaned master file:
+    python pipeline.py --geiger geiger.csv --pressure pressure.csv --gps gps.csv --interior interior.csv
+        --stages altitude,dedup,fill --checkpoint altitude=altitude_added.csv --output cleaned.csv
+
+    With --report the rows and time of every stage are written to a JSON file (see instrumentation.py).
+'''
+
+#import argparse to read the stages and filenames from the command line.
+import argparse
+#import the python CSV module to read the inputs and write the output and checkpoints.
+import csv
+#import sys to report unsorted inputs.
+import sys
+
+#import the altitude calculator module for the functions the stages are built from.
+import altitude_calculator
+#import the instrumentation module to record the rows and time of every stage.
+import instrumentation
+
+
+#function to read a CSV as a stream of dictionaries, closing the file once it has been read.
+#arg filename: the CSV to read.
+def read_rows(filename):
+    with open(filename, 'r') as original_file:
+        for row in csv.DictReader(original_file):
+            yield row
+
+
+#function to read the column names (the header) of a CSV.
+#arg filename: the CSV to read.
+#returns the list of column names (empty for an empty file).
+def read_header(filename):
+    with open(filename, 'r') as original_file:
+        return next(csv.reader(original_file), [])
+
+
+#function to read the four sensor files as one time sorted stream of rows in the format
+#of generate_combined_spreadsheet (see altitude_calculator.generate_sorted_combined_spreadsheet).
+#arg out_of_order: a list of four counters increased for every row that is out of time order in each file.
+def sensor_rows(geiger, pressure, gps, interior, out_of_order):
+    sources = [(geiger, altitude_calculator.GEIGER_RENAMES), (pressure, altitude_calculator.PRESSURE_RENAMES),
+               (gps, altitude_calculator.GPS_RENAMES), (interior, altitude_calculator.INTERIOR_RENAMES)]
+    streams = [altitude_calculator.read_sensor_rows(filename, renames) for filename, renames in sources]
+    #give every row every column of KEYS, like the rows read back from the output of generate_combined_spreadsheet.
+    return altitude_calculator.complete_rows(altitude_calculator.merge_by_time(streams, out_of_order))
+
+
+#the stages. each stage is a function taking the stream of rows, the column names of the rows and a
+#dictionary of options and returning the new stream of rows and their column names.
+
+#stage to add calculated_altitude to rows with a calibrated_pressure.
+#option reference_pressure: the pressure in pascals at altitude 0.
+def altitude_stage(rows, fieldnames, options):
+    reference_pressure = options.get('reference_pressure', altitude_calculator.SEA_LEVEL_PRESSURE)
+    return altitude_calculator.add_altitude_rows(rows, reference_pressure), fieldnames
+
+
+#stage to remove rows with the same time as an earlier row.
+#option sorted: False if the rows might not be sorted by time (every time is then remembered).
+def dedup_stage(rows, fieldnames, options):
+    key = lambda row: row['time']
+    if options.get('sorted', True):
+        return altitude_calculator.deduplicate(rows, key, lambda row: float(row['time'])), fieldnames
+    return altitude_calculator.deduplicate(rows, key), fieldnames
+
+
+#stage to fill in every missing value from the nearest row in time.
+def fill_stage(rows, fieldnames, options):
+    keys = [key for key in fieldnames if key != 'time']
+    return altitude_calculator.fill_rows(altitude_calculator.new_fill_state(keys), rows), fieldnames
+
+
+#stage to keep just the time, altitude and the keys in the option keys.
+def filter_stage(rows, fieldnames, options):
+    keys = options['keys']
+    return altitude_calculator.filter_rows(rows, keys), ['time', 'altitude'] + list(keys)
+
+
+#the stages by name.
+STAGES = {
+    'altitude': altitude_stage,
+    'dedup': dedup_stage,
+    'fill': fill_stage,
+    'filter': filter_stage,
+}
+
+
+#function to write every row of a stream to a CSV as it passes through.
+#arg rows: the stream of rows.
+#arg filename: the CSV to write.
+#arg fieldnames: the column names of the rows.
+def write_rows_through(rows, filename, fieldnames):
+    with open(filename, 'w') as out_file:
+        writer = csv.DictWriter(out_file, fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+
+
+#function to chain stages together.
+#arg rows: the stream of rows to start from.
+#arg fieldnames: the column names of the rows.
+#arg stages: the list of stage names (see STAGES) in the order to apply them.
+#arg options: the dictionary of options passed to every stage.
+#arg checkpoints: a dictionary of stage name to a CSV to write the rows coming out of that stage to.
+#returns the final stream of rows and its column names.
+def build_pipeline(rows, fieldnames, stages, options=None, checkpoints=None):
+    if options is None:
+        options = {}
+    if checkpoints is None:
+        checkpoints = {}
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError('unknown stage ' + stage + ', the stages are ' + ', '.join(sorted(STAGES)))
+        rows = instrumentation.counted('pipeline.' + stage, 'rows_in', rows)
+        rows, fieldnames = STAGES[stage](rows, fieldnames, options)
+        #the time of each stage includes the stages before it, which run as it asks for rows.
+        rows = instrumentation.timed_rows('pipeline.' + stage, rows)
+        if stage in checkpoints:
+            rows = write_rows_through(rows, checkpoints[stage], fieldnames)
+    return rows, fieldnames
+
+
+#function to run stages over a stream of rows and write the result to output_name.
+#see build_pipeline for the arguments.
+#returns the number of rows written.
+def run_pipeline(rows, fieldnames, stages, output_name, options=None, checkpoints=None):
+    rows, fieldnames = build_pipeline(rows, fieldnames, stages, options, checkpoints)
+    count = 0
+    with open(output_name, 'w') as out_file:
+        writer = csv.DictWriter(out_file, fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+#function to run the pipeline from the command line (see the description at the top of this file).
+#arg argv: the command line arguments (sys.argv[1:] by default).
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clean the balloon sensor data in one pass.')
+    parser.add_argument('--input', help='a CSV to start from, such as one in the format of '
+                                        'generate_combined_spreadsheet (its own columns are kept)')
+    parser.add_argument('--geiger', help='the CSV from the geiger arduino')
+    parser.add_argument('--pressure', help='the CSV from the pressure arduino')
+    parser.add_argument('--gps', help='the CSV from the gps arduino')
+    parser.add_argument('--interior', help='the CSV from the interior sensor')
+    parser.add_argument('--stages', default='altitude,dedup,fill',
+                        help='comma separated stages to apply in order (' + ', '.join(sorted(STAGES)) + ')')
+    parser.add_argument('--keys', default='', help='comma separated keys for the filter stage')
+    parser.add_argument('--reference-pressure', type=float, default=altitude_calculator.SEA_LEVEL_PRESSURE,
+                        help='the pressure in pascals at altitude 0 for the altitude stage')
+    parser.add_argument('--unsorted', action='store_true', help='the input is not sorted by time (for dedup)')
+    parser.add_argument('--checkpoint', action='append', default=[], metavar='STAGE=FILE',
+                        help='also write the rows coming out of STAGE to FILE')
+    parser.add_argument('--output', required=True, help='the CSV to write')
+    parser.add_argument('--report', help='write the rows and time of every stage to this JSON file')
+    parser.add_argument('--profile', action='store_true', help='also profile the run with cProfile (needs --report)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also trace memory with tracemalloc (needs --report)')
+    arguments = parser.parse_args(argv)
+    if (arguments.profile or arguments.trace_memory) and arguments.report is None:
+        parser.error('--profile and --trace-memory need --report')
+
+    sensor_files = [arguments.geiger, arguments.pressure, arguments.gps, arguments.interior]
+    out_of_order = [0] * len(sensor_files)
+    #the rows of an input file keep its own columns, which may not be all of KEYS.
+    fieldnames = altitude_calculator.KEYS
+    if arguments.input is not None:
+        fieldnames = read_header(arguments.input)
+        rows = read_rows(arguments.input)
+    elif all(filename is not None for filename in sensor_files):
+        rows = sensor_rows(arguments.geiger, arguments.pressure, arguments.gps, arguments.interior, out_of_order)
+    else:
+        parser.error('give either --input or all of --geiger, --pressure, --gps and --interior')
+
+    stages = [stage for stage in arguments.stages.split(',') if len(stage) > 0]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error('unknown stage ' + stage + ', the stages are ' + ', '.join(sorted(STAGES)))
+    options = {
+        'keys': [key for key in arguments.keys.split(',') if len(key) > 0],
+        'reference_pressure': arguments.reference_pressure,
+        'sorted': not arguments.unsorted,
+    }
+    checkpoints = {}
+    for checkpoint in arguments.checkpoint:
+        stage, separator, filename = checkpoint.partition('=')
+        if len(separator) == 0 or stage not in stages:
+            parser.error('--checkpoint must be STAGE=FILE for one of the stages being run')
+        checkpoints[stage] = filename
+    if 'filter' in stages and len(options['keys']) == 0:
+        parser.error('the filter stage needs --keys')
+
+    if arguments.report is not None:
+        instrumentation.enable(arguments.profile, arguments.trace_memory)
+    count = run_pipeline(rows, fieldnames, stages, arguments.output, options, checkpoints)
+    if arguments.report is not None:
+        instrumentation.disable()
+        instrumentation.write_report(arguments.report)
+    for filename, rows_out_of_order in zip(sensor_files, out_of_order):
+        if rows_out_of_order > 0:
+            sys.stderr.write('%s: %d rows out of time order\n' % (filename, rows_out_of_order))
+    sys.stdout.write('wrote %d rows to %s\n' % (count, arguments.output))
+
+
+if __name__ == '__main__':
+    main()
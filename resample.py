@@ -0,0 +1,439 @@
+'''
+    File name: resample.py
+    Python Version: 3.6
+    Description: Resamples a time sorted CSV (such as altitude_added.csv or time_deduped.csv) into
+    fixed intervals of time, and builds a pyramid of coarser and coarser resamplings in a single pass
+    so a whole flight can be plotted or queried at low resolution by reading a few kilobytes instead of
+    the whole master file.
+
+    The rows are put into bins of interval seconds starting at multiples of the interval. For every bin
+    and every column the number of values, their mean, minimum, maximum and last value are kept, so the
+    sensors logging every second and every minute are all summarized on the same clock without filling
+    in values that weren't measured. Cells that are empty or aren't numbers are left out, and bins
+    without any rows aren't written. The sums behind the means are kept exactly (as the partial sums of
+    math.fsum) rather than added up one float at a time, so a mean doesn't depend on how the values were
+    grouped: every level of a pyramid is byte for byte the CSV resample_file writes at its interval.
+
+    Each level of the pyramid is made of whole bins of the level below (every interval must be a multiple
+    of the one before), so a bin of the finest level is merged into the level above as soon as it is
+    complete and only one bin per level is held in memory however long the flight is. The levels are
+    written to a directory next to the CSV (its filename followed by .pyramid), one CSV per level, with a
+    manifest recording the levels and the size, modification time and hashes of the CSV they were built
+    from (like the index of time_index.py) so that a pyramid that no longer matches its CSV, including one
+    edited in place without changing its size, is built again.
+
+    Example, the whole flight in at most 2000 rows:
+    rows = resample.pyramid_rows('altitude_added.csv', max_rows=2000)
+'''
+
+#import the python CSV module to read the rows and write the levels.
+import csv
+#import json to store the manifest.
+import json
+#import math to find the start of the bin of a time.
+import math
+#import os to create the directory of the pyramid.
+import os
+
+#import the compact_rows module to read the CSV as lists of cells rather than dictionaries.
+import compact_rows
+#import the time_index module to check whether a pyramid still matches its CSV.
+import time_index
+
+#the default intervals in seconds of the levels of the pyramid (1 second, 10 seconds, 1 minute, 10 minutes, 1 hour).
+LEVELS = (1, 10, 60, 600, 3600)
+#the aggregates that can be written for every column, in the order they are written.
+AGGREGATES = ('mean', 'min', 'max', 'last', 'count')
+#the extension added to the filename of a CSV for the directory of its pyramid.
+PYRAMID_EXTENSION = '.pyramid'
+#the name of the manifest in the directory of a pyramid.
+MANIFEST_NAME = 'manifest.json'
+#the positions of the aggregates kept for every column of a bin.
+COUNT, TOTAL, MINIMUM, MAXIMUM, LAST, SPECIAL = range(6)
+
+
+#function to get the directory of the pyramid of a CSV.
+def pyramid_directory_for(filename):
+    return filename + PYRAMID_EXTENSION
+
+
+#function to get the filename of a level of a pyramid (such as level_60s.csv).
+def level_filename(interval):
+    return 'level_%ss.csv' % format_number(interval)
+
+
+#function to write a number as text, without a fraction if it is a whole number.
+def format_number(value):
+    text = repr(float(value))
+    if text.endswith('.0'):
+        return text[:-2]
+    return text
+
+
+#function to check the intervals of the levels of a pyramid.
+#raises ValueError unless every interval is positive and a whole multiple of the interval before it.
+def check_levels(levels):
+    if len(levels) == 0:
+        raise ValueError('a pyramid needs at least one level')
+    for finer, coarser in zip(levels, levels[1:]):
+        ratio = float(coarser) / finer
+        if coarser <= finer or abs(ratio - round(ratio)) > 1e-9:
+            raise ValueError('every interval must be a multiple of the interval before it, not %s after %s'
+                             % (coarser, finer))
+    if levels[0] <= 0:
+        raise ValueError('intervals must be positive')
+
+
+#function to create an empty bin.
+#arg start: the time the bin starts at.
+#arg columns: the number of columns aggregated.
+def new_bin(start, columns):
+    return {
+        'start': start,
+        #the number of rows in the bin.
+        'rows': 0,
+        #for every column, [count, total, minimum, maximum, last, special] of its values (the last as its text).
+        #the total is a list of floats adding up to exactly the sum of the values: the values themselves
+        #in the finest level, their partial sums (see add_to_partials) above it. special is the sum of the
+        #infinite and nan values, which are kept out of the partial sums.
+        'columns': [[0, [], None, None, None, 0.0] for column in range(columns)],
+    }
+
+
+#function to add floats to a list of partial sums, keeping the sum exact (Shewchuk's algorithm, as used by
+#math.fsum): the partials don't overlap, so there are only ever a few of them.
+#arg column: the aggregates of a column of a bin above the finest level (its total and special updated in place).
+#arg values: the floats to add.
+def add_to_partials(column, values):
+    partials = column[TOTAL]
+    for value in values:
+        #infinite and nan values would turn every partial into nan, so they are added up on their own.
+        if value - value != 0:
+            column[SPECIAL] += value
+            continue
+        count = 0
+        for partial in partials:
+            if abs(value) < abs(partial):
+                value, partial = partial, value
+            high = value + partial
+            low = partial - (high - value)
+            if low != 0:
+                partials[count] = low
+                count += 1
+            value = high
+        partials[count:] = [value]
+
+
+#function to get the mean of a column of a bin with values from its exact total.
+#the sum is rounded only once, so the mean is the same however the values were split into bins.
+def exact_mean(column):
+    try:
+        total = math.fsum(column[TOTAL])
+    except (ValueError, OverflowError):
+        #infinities of both signs (or a sum too large for a float) among the values of the finest level.
+        total = sum(column[TOTAL])
+    return (total + column[SPECIAL]) / column[COUNT]
+
+
+#function to add a complete bin of a finer level to the bin of the level above that it is part of.
+#arg aggregate: the bin of the coarser level (updated in place).
+#arg finer: the complete bin of the finer level, which comes after every bin already added.
+def merge_bins(aggregate, finer):
+    aggregate['rows'] += finer['rows']
+    for column, finer_column in zip(aggregate['columns'], finer['columns']):
+        if finer_column[COUNT] == 0:
+            continue
+        if column[COUNT] == 0:
+            column[MINIMUM] = finer_column[MINIMUM]
+            column[MAXIMUM] = finer_column[MAXIMUM]
+        else:
+            column[MINIMUM] = min(column[MINIMUM], finer_column[MINIMUM])
+            column[MAXIMUM] = max(column[MAXIMUM], finer_column[MAXIMUM])
+        column[COUNT] += finer_column[COUNT]
+        add_to_partials(column, finer_column[TOTAL])
+        column[SPECIAL] += finer_column[SPECIAL]
+        column[LAST] = finer_column[LAST]
+
+
+#function to create the state used by resample_rows.
+#arg fieldnames: the columns of the rows.
+#arg keys: the columns to aggregate (every column but the time by default).
+#arg levels: the intervals in seconds of the levels, finest first (see check_levels).
+def new_resample_state(fieldnames, keys=None, levels=LEVELS):
+    check_levels(levels)
+    if keys is None:
+        keys = [key for key in fieldnames if key != 'time']
+    positions = compact_rows.positions_of(fieldnames)
+    missing = [key for key in ['time'] + list(keys) if key not in positions]
+    if len(missing) > 0:
+        raise KeyError(missing[0])
+    return {
+        'keys': list(keys),
+        'time_position': positions['time'],
+        'positions': [positions[key] for key in keys],
+        'levels': list(levels),
+        #the bin being filled at every level (None before the first row).
+        'bins': [None] * len(levels),
+        #the number of bins completed at every level.
+        'counts': [0] * len(levels),
+    }
+
+
+#function to get the start of the bin of a level that a time falls in.
+def bin_start(state, level, time):
+    interval = state['levels'][level]
+    return math.floor(time / interval) * interval
+
+
+#function to make the bin being filled at a level the bin starting at start, completing the bin before it.
+#arg state: the state from new_resample_state (updated in place).
+#arg level: the level.
+#arg start: the start of the bin to fill.
+#arg completed: a list the completed bins are added to as (level, bin).
+def move_to_bin(state, level, start, completed):
+    current = state['bins'][level]
+    if current is not None and current['start'] == start:
+        return current
+    if current is not None:
+        complete_bin(state, level, completed)
+    state['bins'][level] = new_bin(start, len(state['keys']))
+    return state['bins'][level]
+
+
+#function to complete the bin being filled at a level, merging it into the bin of the level above.
+#arg state: the state from new_resample_state (updated in place).
+#arg level: the level.
+#arg completed: a list the completed bins are added to as (level, bin).
+def complete_bin(state, level, completed):
+    current = state['bins'][level]
+    if level + 1 < len(state['levels']):
+        merge_bins(move_to_bin(state, level + 1, bin_start(state, level + 1, current['start']), completed), current)
+    state['bins'][level] = None
+    state['counts'][level] += 1
+    completed.append((level, current))
+
+
+#function to resample a stream of compact rows (see compact_rows.py) at every level.
+#arg state: the state from new_resample_state (updated in place).
+#arg rows: an iterable of compact rows with the columns given to new_resample_state, sorted by time.
+#arg final: if True the bins still being filled are completed after the last row.
+#yields (level, bin) for every bin as soon as it is complete. see bin_row to turn a bin into a row.
+#raises ValueError if the rows aren't sorted by time.
+def resample_rows(state, rows, final=True):
+    time_position = state['time_position']
+    columns = list(enumerate(state['positions']))
+    interval = state['levels'][0]
+    completed = []
+    current = state['bins'][0]
+    for row in rows:
+        time = float(row[time_position])
+        if current is None or not current['start'] <= time < current['start'] + interval:
+            if current is not None and time < current['start']:
+                raise ValueError('the rows are not sorted by time at time %s' % row[time_position])
+            current = move_to_bin(state, 0, math.floor(time / interval) * interval, completed)
+            for item in completed:
+                yield item
+            del completed[:]
+        current['rows'] += 1
+        aggregates = current['columns']
+        for column, position in columns:
+            text = row[position]
+            if len(text) == 0:
+                continue
+            try:
+                value = float(text)
+            except ValueError:
+                continue
+            aggregate = aggregates[column]
+            if aggregate[COUNT] == 0:
+                aggregate[MINIMUM] = value
+                aggregate[MAXIMUM] = value
+            elif value < aggregate[MINIMUM]:
+                aggregate[MINIMUM] = value
+            elif value > aggregate[MAXIMUM]:
+                aggregate[MAXIMUM] = value
+            aggregate[COUNT] += 1
+            aggregate[TOTAL].append(value)
+            aggregate[LAST] = text
+    if final:
+        for level in range(len(state['levels'])):
+            if state['bins'][level] is not None:
+                complete_bin(state, level, completed)
+        for item in completed:
+            yield item
+
+
+#function to get the columns of the rows written for the bins.
+#arg keys: the columns aggregated.
+#arg aggregates: the aggregates written for every column (see AGGREGATES).
+def bin_keys(keys, aggregates=AGGREGATES):
+    return ['time', 'rows'] + [key + '_' + aggregate for key in keys for aggregate in aggregates]
+
+
+#the functions writing each aggregate of a column with values, from its [count, total, minimum, maximum, last].
+AGGREGATE_WRITERS = {
+    'mean': lambda column: repr(exact_mean(column)),
+    'min': lambda column: format_number(column[MINIMUM]),
+    'max': lambda column: format_number(column[MAXIMUM]),
+    'last': lambda column: column[LAST],
+    'count': lambda column: column[COUNT],
+}
+
+
+#function to turn a bin into a row with the columns of bin_keys.
+#aggregates of a column without any values are left empty (apart from its count of 0).
+def bin_row(aggregate, aggregates=AGGREGATES):
+    row = [format_number(aggregate['start']), aggregate['rows']]
+    writers = [AGGREGATE_WRITERS[name] for name in aggregates]
+    empty = [0 if name == 'count' else '' for name in aggregates]
+    for column in aggregate['columns']:
+        if column[COUNT] == 0:
+            row.extend(empty)
+        else:
+            row.extend([writer(column) for writer in writers])
+    return row
+
+
+#function to build the pyramid of a time sorted CSV in one pass over it.
+#arg filename: the CSV, such as altitude_added.csv.
+#arg directory: the directory to write the pyramid to (next to the CSV by default, see pyramid_directory_for).
+#arg levels: the intervals in seconds of the levels, finest first.
+#arg keys: the columns to aggregate (every column but the time by default).
+#arg aggregates: the aggregates to write for every column (see AGGREGATES).
+#returns the manifest of the pyramid.
+def build_pyramid(filename, directory=None, levels=LEVELS, keys=None, aggregates=AGGREGATES):
+    if directory is None:
+        directory = pyramid_directory_for(filename)
+    for aggregate in aggregates:
+        if aggregate not in AGGREGATES:
+            raise ValueError('unknown aggregate ' + aggregate + ', the aggregates are ' + ', '.join(AGGREGATES))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest = {
+        'source': os.path.abspath(filename),
+        'size': os.path.getsize(filename),
+        'aggregates': list(aggregates),
+        'levels': [],
+    }
+    files = []
+    try:
+        with open(filename, 'r') as original_file:
+            fieldnames, rows = compact_rows.read_header_and_rows(original_file)
+            state = new_resample_state(fieldnames, keys, levels)
+            manifest['keys'] = state['keys']
+            writers = []
+            for interval in state['levels']:
+                level_file = open(os.path.join(directory, level_filename(interval)), 'w')
+                files.append(level_file)
+                writer = csv.writer(level_file)
+                writer.writerow(bin_keys(state['keys'], aggregates))
+                writers.append(writer)
+            for level, aggregate in resample_rows(state, rows):
+                writers[level].writerow(bin_row(aggregate, aggregates))
+    finally:
+        for level_file in files:
+            level_file.close()
+    for interval, count in zip(state['levels'], state['counts']):
+        manifest['levels'].append({
+            'interval': interval,
+            'filename': level_filename(interval),
+            'rows': count,
+            'bytes': os.path.getsize(os.path.join(directory, level_filename(interval))),
+        })
+    #record the hashes of the CSV so a change to it can be noticed (see time_index.index_status).
+    with open(filename, 'rb') as data_file:
+        time_index.update_hashes(data_file, manifest)
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+
+#function to get the manifest of an up to date pyramid of a CSV, building the pyramid if there isn't one,
+#if the CSV has changed since it was built or if it doesn't have the levels, keys or aggregates asked for.
+#arg filename: the CSV.
+#arg directory, keys, aggregates: see build_pyramid.
+#arg levels: the intervals of the levels, or None for the levels of the pyramid already built (LEVELS if
+#there isn't one), so a pyramid built with other levels is read rather than built again.
+def load_pyramid(filename, directory=None, levels=None, keys=None, aggregates=AGGREGATES):
+    if directory is None:
+        directory = pyramid_directory_for(filename)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        built_levels = [level['interval'] for level in manifest['levels']]
+        if levels is None:
+            levels = built_levels
+        if (time_index.index_status(filename, manifest) == 'current'
+                and built_levels == list(levels)
+                and (keys is None or manifest['keys'] == list(keys))
+                and manifest['aggregates'] == list(aggregates)):
+            return manifest
+    if levels is None:
+        levels = LEVELS
+    return build_pyramid(filename, directory, levels, keys, aggregates)
+
+
+#function to choose the level of a pyramid to read.
+#arg manifest: the manifest of the pyramid.
+#arg resolution: the coarsest interval in seconds that is fine enough (the coarsest level no coarser than it is chosen).
+#arg max_rows: the most rows wanted (the finest level with at most this many rows in the range is chosen).
+#arg start, end: the range of time that will be read (None for the start or end of the flight).
+#returns the entry of the level in the manifest (the finest level if neither resolution nor max_rows is given).
+def choose_level(manifest, resolution=None, max_rows=None, start=None, end=None):
+    levels = manifest['levels']
+    if resolution is not None:
+        fine_enough = [level for level in levels if level['interval'] <= resolution]
+        return fine_enough[-1] if len(fine_enough) > 0 else levels[0]
+    if max_rows is not None:
+        for level in levels:
+            rows = level['rows']
+            if start is not None and end is not None:
+                #there can't be more bins in the range than intervals in it.
+                rows = min(rows, int((end - start) / level['interval']) + 2)
+            if rows <= max_rows:
+                return level
+        return levels[-1]
+    return levels[0]
+
+
+#function to read the bins of a CSV's pyramid between two times, at the level chosen by choose_level.
+#the pyramid is built (or built again) first if necessary, see load_pyramid.
+#arg filename: the CSV.
+#arg start, end: the earliest and latest bin start times to include (None for no limit).
+#arg resolution, max_rows: see choose_level.
+#arg directory: the directory of the pyramid (next to the CSV by default).
+#arg levels: the intervals of the levels, or None for the levels the pyramid was built with (see load_pyramid).
+#yields each bin as a dictionary with the columns of bin_keys, like csv.DictReader.
+def pyramid_rows(filename, start=None, end=None, resolution=None, max_rows=None, directory=None, levels=None):
+    if directory is None:
+        directory = pyramid_directory_for(filename)
+    manifest = load_pyramid(filename, directory, levels)
+    level = choose_level(manifest, resolution, max_rows, start, end)
+    with open(os.path.join(directory, level['filename']), 'r') as level_file:
+        for row in csv.DictReader(level_file):
+            time = float(row['time'])
+            if start is not None and time < start:
+                continue
+            if end is not None and time > end:
+                return
+            yield row
+
+
+#function to resample a time sorted CSV at a single interval into a new CSV.
+#arg filename: the CSV.
+#arg interval: the interval in seconds.
+#arg output_name: the CSV to write (with the columns of bin_keys).
+#arg keys, aggregates: see build_pyramid.
+#returns the number of bins written.
+def resample_file(filename, interval, output_name, keys=None, aggregates=AGGREGATES):
+    count = 0
+    with open(filename, 'r') as original_file, open(output_name, 'w') as out_file:
+        fieldnames, rows = compact_rows.read_header_and_rows(original_file)
+        state = new_resample_state(fieldnames, keys, [interval])
+        writer = csv.writer(out_file)
+        writer.writerow(bin_keys(state['keys'], aggregates))
+        for level, aggregate in resample_rows(state, rows):
+            writer.writerow(bin_row(aggregate, aggregates))
+            count += 1
+    return count
@@ -0,0 +1,241 @@
+'''
+    File name: synthetic_flight.py
+    Python Version: 3.6
+    Description: Generates realistic synthetic sensor CSVs for a balloon flight in the same format
+    as the files logged by the Arduinos (geiger.csv, pressure.csv, gps.csv and interior.csv), so the
+    data cleaning functions can be tested and timed on flights much longer than the real one, or on
+    archives of several launches one after another.
+
+    Each flight waits on the pad, ascends at a steady rate to the burst altitude, descends quickly
+    under the parachute (slowing as the air gets thicker) and then sits at the landing site.
+    Pressures come from the inverse of the NASA model used by altitude_calculator. Each Arduino
+    samples at its own rate, and the logs include gaps (an Arduino not logging for a while),
+    duplicated rows, a GPS without a fix before launch, and the anemometer's cumulative 16 bit
+    counter wrapping around and occasionally restarting from 0.
+'''
+
+#import the python CSV module to write the generated files.
+import csv
+#import math for the pressure model and the GPS track.
+import math
+#import os to build the paths of the generated files.
+import os
+#import random to add noise, gaps and duplicates reproducibly.
+import random
+#import time to format the GPS timestamps.
+import time as time_module
+
+#the start time (UNIX timestamp) of the first flight, the same as the real launch data.
+START_TIME = 1479753173.0
+#the length in seconds of each flight, about the same as the real launch data.
+FLIGHT_DURATION = 20150.0
+#the altitude in meters of the launch site and of the landing site.
+PAD_ALTITUDE = 10.0
+#the altitude in meters at which the balloon bursts.
+BURST_ALTITUDE = 30000.0
+#the fraction of each flight spent on the pad before launch.
+PAD_FRACTION = 0.05
+#the fraction of each flight spent ascending.
+ASCENT_FRACTION = 0.45
+#the fraction of each flight spent descending.
+DESCENT_FRACTION = 0.2
+#the average number of seconds between readings for each Arduino.
+INTERIOR_PERIOD = 1.0
+PRESSURE_PERIOD = 1.23
+GPS_PERIOD = 1.0
+GEIGER_PERIOD = 60.0
+#the chance of a gap starting at any reading, and the longest gap in seconds.
+GAP_PROBABILITY = 0.0005
+MAX_GAP = 120.0
+#the chance of any reading being logged twice.
+DUPLICATE_PROBABILITY = 0.002
+#the chance of the anemometer Arduino restarting (resetting its counter) at any reading.
+RESET_PROBABILITY = 0.003
+#the position of the launch site in degrees.
+LAUNCH_LATITUDE = 38.0812
+LAUNCH_LONGITUDE = -120.7644
+
+#the headers of the generated files (the same as the files logged during the launch).
+GEIGER_KEYS = ['time', 'geiger_cpm', 'anemometer_rpm']
+PRESSURE_KEYS = ['time', 'exterior_pressure', 'exterior_humidity', 'exterior_temperature', 'estimated_altitude',
+                 'sound_time', 'blue_voltage', 'red_voltage', 'white_voltage']
+GPS_KEYS = ['time', 'gps_timestamp', 'lat', 'lat_direction', 'lng', 'lng_direction', 'fix_quality', 'num_satelites',
+            'hdop', 'altitude', 'height_geoid_ellipsoid']
+INTERIOR_KEYS = ['temperature', 'pressure', 'humidity', 'time', 'calibrated_pressure']
+
+
+#function to get the altitude in meters of the balloon a given number of seconds into a flight.
+#arg seconds: the time since the start of the flight.
+#arg duration: the length of the flight in seconds.
+def flight_altitude(seconds, duration=FLIGHT_DURATION):
+    launch = PAD_FRACTION * duration
+    burst = launch + ASCENT_FRACTION * duration
+    landing = burst + DESCENT_FRACTION * duration
+    if seconds < launch or seconds >= landing:
+        return PAD_ALTITUDE
+    if seconds < burst:
+        #steady ascent
+        return PAD_ALTITUDE + (BURST_ALTITUDE - PAD_ALTITUDE) * (seconds - launch) / (burst - launch)
+    #fast descent slowing down as the air gets thicker.
+    fraction = (seconds - burst) / (landing - burst)
+    return PAD_ALTITUDE + (BURST_ALTITUDE - PAD_ALTITUDE) * (1 - fraction) ** 2
+
+
+#function to get the pressure in pascals at an altitude in meters (the inverse of the NASA model
+#in altitude_calculator.get_altitude_from_pressure).
+def pressure_at_altitude(altitude):
+    if altitude < 11000:
+        kilopascals = 101.29 * ((44397.5 - altitude) / 44388.3) ** (1 / .19026)
+    elif altitude < 25000:
+        kilopascals = 22.65 * math.exp((11019.12 - altitude) / 6369.43)
+    else:
+        kilopascals = 2.488 * ((altitude + 47454.96) / 72441.47) ** (1 / -.0878)
+    return kilopascals * 1000
+
+
+#function to get the temperature in celsius outside the balloon at an altitude in meters
+#(a simplified standard atmosphere).
+def exterior_temperature_at_altitude(altitude):
+    if altitude < 11000:
+        return 20 - 6.5 * altitude / 1000
+    if altitude < 20000:
+        return -51.5
+    return -51.5 + (altitude - 20000) / 1000
+
+
+#function to get the geiger counts per minute at an altitude in meters.
+#the count rises to a maximum around 20 km (the Pfotzer maximum) and falls off above it.
+def geiger_cpm_at_altitude(altitude):
+    return 20 + 600 * math.exp(-((altitude - 20000) / 7000.0) ** 2)
+
+
+#function to generate the times an Arduino logged readings at, with gaps and duplicates.
+#arg random_generator: the random.Random to use.
+#arg start, end: the times to generate readings between.
+#arg period: the average number of seconds between readings.
+#arg jitter: how far in seconds each reading can be from its period.
+#arg whole_seconds: if True the times are rounded to whole seconds (as the interior Arduino logs them).
+def reading_times(random_generator, start, end, period, jitter, whole_seconds=False):
+    time = start
+    while time < end:
+        if random_generator.random() < GAP_PROBABILITY:
+            #the Arduino stops logging for a while.
+            time += random_generator.uniform(period, MAX_GAP)
+            continue
+        logged = float(int(time)) if whole_seconds else time
+        yield logged
+        if random_generator.random() < DUPLICATE_PROBABILITY:
+            yield logged
+        time += period + random_generator.uniform(-jitter, jitter)
+
+
+#function to format a position in degrees as NMEA ddmm.mmmm (or dddmm.mmmm) with its direction.
+#arg degrees: the signed position in degrees.
+#arg degree_digits: 2 for latitude or 3 for longitude.
+#arg directions: the direction letters for positive and negative positions, such as ('N', 'S').
+def nmea_coordinate(degrees, degree_digits, directions):
+    direction = directions[0] if degrees >= 0 else directions[1]
+    degrees = abs(degrees)
+    whole = int(degrees)
+    minutes = (degrees - whole) * 60
+    return ('%0' + str(degree_digits) + 'd%07.4f') % (whole, minutes), direction
+
+
+#function to write the rows of one sensor file.
+def write_rows(filename, keys, rows):
+    with open(filename, 'w') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(keys)
+        writer.writerows(rows)
+
+
+#function to generate the rows of interior.csv for the given flights.
+def interior_rows(random_generator, flights, duration):
+    for flight in range(flights):
+        start = START_TIME + flight * duration
+        for time in reading_times(random_generator, start, start + duration, INTERIOR_PERIOD, 0, True):
+            altitude = flight_altitude(time - start, duration)
+            pressure = pressure_at_altitude(altitude) + random_generator.gauss(0, 15)
+            temperature = 30 - altitude / 2000.0 + random_generator.gauss(0, .2)
+            humidity = max(0, 55 - altitude / 1000.0 + random_generator.gauss(0, .5))
+            yield ['%.8f' % temperature, '%.4f' % pressure, '%.8f' % humidity, '%d' % time,
+                   '%.4f' % (pressure * 1.0016)]
+
+
+#function to generate the rows of pressure.csv for the given flights.
+def pressure_rows(random_generator, flights, duration):
+    for flight in range(flights):
+        start = START_TIME + flight * duration
+        for time in reading_times(random_generator, start + 2, start + duration, PRESSURE_PERIOD, .05):
+            altitude = flight_altitude(time - start, duration)
+            pressure = pressure_at_altitude(altitude) + random_generator.gauss(0, 20)
+            yield ['%.6f' % time, '%.1f' % pressure, '%.2f' % max(0, 60 - altitude / 800.0),
+                   '%.2f' % (exterior_temperature_at_altitude(altitude) + random_generator.gauss(0, .3)),
+                   '%.2f' % (altitude + random_generator.gauss(0, 3)), '%.1f' % random_generator.choice((1120, 1130)),
+                   '%d' % random_generator.randint(320, 350), '0', '%d' % random_generator.randint(0, 20)]
+
+
+#function to generate the rows of gps.csv for the given flights.
+#the GPS has no fix for the first part of the time on the pad of each flight.
+def gps_rows(random_generator, flights, duration):
+    for flight in range(flights):
+        start = START_TIME + flight * duration
+        for time in reading_times(random_generator, start, start + duration, GPS_PERIOD, .01):
+            seconds = time - start
+            gps_timestamp = time_module.strftime('%H%M%S', time_module.gmtime(time)) + ('%.3f' % (time % 1))[1:]
+            if seconds < PAD_FRACTION * duration / 2:
+                yield ['%.6f' % time, gps_timestamp, '0000.0000', 'N', '00000.0000', 'E', '0', '00', '0.0', '0.0',
+                       '0.0']
+                continue
+            altitude = flight_altitude(seconds, duration)
+            #the balloon drifts east with the wind while it is in the air.
+            drift = (min(seconds, (PAD_FRACTION + ASCENT_FRACTION + DESCENT_FRACTION) * duration)
+                     - PAD_FRACTION * duration)
+            latitude = LAUNCH_LATITUDE + random_generator.gauss(0, .00002)
+            longitude = LAUNCH_LONGITUDE + max(0, drift) * .00005 + random_generator.gauss(0, .00002)
+            lat, lat_direction = nmea_coordinate(latitude, 2, ('N', 'S'))
+            lng, lng_direction = nmea_coordinate(longitude, 3, ('E', 'W'))
+            #the horizontal dilution of precision is occasionally much worse.
+            hdop = random_generator.uniform(.8, 3) if random_generator.random() > .02 else random_generator.uniform(5, 20)
+            yield ['%.6f' % time, gps_timestamp, lat, lat_direction, lng, lng_direction, '1',
+                   '%02d' % random_generator.randint(3, 10), '%.1f' % hdop, '%.1f' % (altitude + random_generator.gauss(0, 5)),
+                   '-27.8']
+
+
+#function to generate the rows of geiger.csv for the given flights.
+#the anemometer column is the cumulative number of rotations stored in a 16 bit integer, so it wraps around
+#into the negatives, and it occasionally restarts from 0.
+def geiger_rows(random_generator, flights, duration):
+    for flight in range(flights):
+        start = START_TIME + flight * duration
+        rotations = 0
+        for time in reading_times(random_generator, start + 16, start + duration, GEIGER_PERIOD, 0, True):
+            altitude = flight_altitude(time - start, duration)
+            if random_generator.random() < RESET_PROBABILITY:
+                rotations = 0
+            #the anemometer spins faster in the jet stream.
+            rotations += max(0, int(random_generator.gauss(40 + 400 * math.exp(-((altitude - 11000) / 4000.0) ** 2), 20)))
+            counter = (rotations + 2 ** 15) % 2 ** 16 - 2 ** 15
+            cpm = max(0, int(random_generator.gauss(geiger_cpm_at_altitude(altitude), 8)))
+            yield ['%d' % time, '%d' % cpm, '%d' % counter]
+
+
+#function to generate the four sensor files for one or more flights into a directory.
+#arg directory: the directory to write geiger.csv, pressure.csv, gps.csv and interior.csv to.
+#arg flights: the number of flights, one after another (a multi launch archive).
+#arg duration: the length in seconds of each flight. the number of rows grows in proportion to
+#flights * duration (about 20,000 GPS rows per FLIGHT_DURATION).
+#arg seed: the seed for the random numbers, so the same arguments always give the same files.
+#returns a dictionary of sensor name to the path of its file.
+def generate_flight(directory, flights=1, duration=FLIGHT_DURATION, seed=0):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    paths = {}
+    generators = [('geiger', GEIGER_KEYS, geiger_rows), ('pressure', PRESSURE_KEYS, pressure_rows),
+                  ('gps', GPS_KEYS, gps_rows), ('interior', INTERIOR_KEYS, interior_rows)]
+    for index, (name, keys, rows) in enumerate(generators):
+        #give every sensor its own random numbers so changing one doesn't change the others.
+        random_generator = random.Random(seed * len(generators) + index)
+        paths[name] = os.path.join(directory, name + '.csv')
+        write_rows(paths[name], keys, rows(random_generator, flights, duration))
+    return paths
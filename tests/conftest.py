@@ -0,0 +1,63 @@
+'''
+    File name: conftest.py
+    Python Version: 3.6
+    Description: Shared setup for the regression tests. The modules of this repository are scripts in its
+    top directory rather than a package, so that directory is put on the import path, and the tests run
+    in a temporary directory because many of the functions write files with fixed names (such as
+    altitude_added.csv) into the working directory.
+
+    The CSVs logged during the launch have columns that stop having values long before the end, so
+    filling them in leaves no rows; the tests that compare old and new cleaning functions run on a short
+    synthetic flight (see synthetic_flight.py) instead, generated once per test session.
+'''
+
+#import os to find the top directory of the repository.
+import os
+#import sys to put the top directory on the import path.
+import sys
+
+#import pytest for the fixtures.
+import pytest
+
+#the top directory of the repository, which has the modules and the CSVs logged during the launch.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#import the modules used to prepare the synthetic flight (after ROOT is on the import path).
+import altitude_calculator
+import synthetic_flight
+
+#the names of the sensor CSVs logged during the launch, in the order generate_combined_spreadsheet takes them.
+SENSOR_NAMES = ('geiger', 'pressure', 'gps', 'interior')
+#the length in seconds of the synthetic flight, long enough to go through every phase of a flight
+#but short enough to fill in one column at a time like the old functions did.
+FLIGHT_DURATION = 2000.0
+
+
+#fixture to run a test in its own temporary directory.
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+#fixture giving the paths of the sensor CSVs logged during the launch, in the order of SENSOR_NAMES.
+@pytest.fixture
+def sensor_files():
+    return [os.path.join(ROOT, name + '.csv') for name in SENSOR_NAMES]
+
+
+#fixture giving the directory of a synthetic flight with the sensor CSVs, master_sorted.csv (the sorted output of
+#generate_combined_spreadsheet) and altitude_added.csv. the files must not be changed by the tests.
+@pytest.fixture(scope='session')
+def flight_directory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('flight'))
+    synthetic_flight.generate_flight(directory, duration=FLIGHT_DURATION)
+    working_directory = os.getcwd()
+    os.chdir(directory)
+    try:
+        altitude_calculator.generate_sorted_combined_spreadsheet(*[name + '.csv' for name in SENSOR_NAMES])
+        altitude_calculator.add_altitude_if_pressure_present('master_sorted.csv')
+    finally:
+        os.chdir(working_directory)
+    return directory
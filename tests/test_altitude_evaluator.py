@@ -0,0 +1,56 @@
+'''
+    File name: test_altitude_evaluator.py
+    Python Version: 3.6
+    Description: Tests for the altitude evaluator and lookup table: only altitudes served from the cache count
+    as hits, the altitudes are exactly those of get_altitudes_from_pressures without a table, and the table
+    keeps the jumps of the NASA model at 2.483 and 22.707 kilopascals.
+'''
+
+#import numpy to compare the altitudes.
+import numpy
+#import pytest to run each cache size as its own test.
+import pytest
+
+#import the module under test.
+import altitude_calculator
+
+
+#test that a pressure repeated in one call but not remembered before it is a miss every time it is used.
+def test_repeats_within_a_call_are_misses():
+    evaluator = altitude_calculator.new_altitude_evaluator(cache_size=0)
+    altitude_calculator.evaluate_altitudes(evaluator, [90000.0, 90000.0, 80000.0])
+    altitude_calculator.evaluate_altitudes(evaluator, [90000.0, 90000.0])
+    statistics = altitude_calculator.altitude_cache_statistics(evaluator)
+    assert (statistics['hits'], statistics['misses'], statistics['hit_rate']) == (0, 5, 0.0)
+
+
+#test that the pressures remembered from an earlier call are hits, every time they are used.
+def test_remembered_pressures_are_hits():
+    evaluator = altitude_calculator.new_altitude_evaluator(cache_size=2)
+    altitude_calculator.evaluate_altitudes(evaluator, [90000.0, 90000.0, 80000.0])
+    altitude_calculator.evaluate_altitudes(evaluator, [90000.0, 70000.0, 90000.0, 70000.0])
+    statistics = altitude_calculator.altitude_cache_statistics(evaluator)
+    assert (statistics['hits'], statistics['misses'], statistics['evictions']) == (2, 5, 1)
+    assert statistics['size'] == 2
+
+
+#test that the evaluator gives exactly the altitudes of get_altitudes_from_pressures whatever it remembers.
+@pytest.mark.parametrize('cache_size', (0, 3, altitude_calculator.ALTITUDE_CACHE_SIZE))
+def test_evaluator_matches_model(cache_size):
+    pressures = [101325.0, 2483.0, 2482.9, 22707.0, 22707.1, 500.0, 101325.0, 0.5, 2483.0]
+    evaluator = altitude_calculator.new_altitude_evaluator(cache_size=cache_size)
+    expected = altitude_calculator.get_altitudes_from_pressures(pressures).tolist()
+    for attempt in range(2):
+        assert altitude_calculator.evaluate_altitudes(evaluator, pressures) == expected
+
+
+#test that the table reproduces the jumps of the model at its boundaries rather than smoothing them.
+def test_table_keeps_model_jumps():
+    table = altitude_calculator.new_altitude_table()
+    for boundary, jump in ((2483.0, 100.0), (22707.0, 3.0)):
+        pressures = numpy.array([boundary - 0.001, boundary, boundary + 0.001])
+        model = altitude_calculator.get_altitudes_from_pressures(pressures)
+        looked_up = altitude_calculator.table_altitudes(table, pressures)
+        assert numpy.all(numpy.abs(looked_up - model) <= table['max_error'])
+        assert abs(abs(model[0] - model[2]) - jump) < 1.0
+        assert abs(abs(looked_up[0] - looked_up[2]) - jump) < 1.0
@@ -0,0 +1,43 @@
+'''
+    File name: test_altitude_model.py
+    Python Version: 3.6
+    Description: Tests for the NASA model: get_altitudes_from_pressures gives the altitudes get_altitude_from_pressure
+    gives one pressure at a time in all three bands of the model and at the pressures where the bands meet
+    (2483 and 22707 pascals), where both take the middle band.
+'''
+
+#import math to work out the altitudes of the middle band.
+import math
+
+#import pytest for approx.
+import pytest
+
+#import the module under test.
+import altitude_calculator
+
+#pressures in pascals in each band of the model and on either side of where the bands meet.
+PRESSURES = [101290.0, 90000.0, 50000.0, 22707.1, 22707.0, 22706.9, 10000.0, 2483.1, 2483.0, 2482.9, 1000.0, 1.0]
+
+
+#test that the altitudes of a whole array of pressures are those of one pressure at a time.
+@pytest.mark.parametrize('reference_pressure', (altitude_calculator.SEA_LEVEL_PRESSURE, 98000.0))
+def test_batch_matches_scalar(reference_pressure):
+    altitudes = altitude_calculator.get_altitudes_from_pressures(PRESSURES, reference_pressure)
+    expected = [altitude_calculator.get_altitude_from_pressure(pressure, reference_pressure) for pressure in PRESSURES]
+    assert altitudes.tolist() == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+
+#test that the pressures where the bands meet are in the middle band, and the pressures beside them in the others.
+def test_band_edges():
+    altitudes = dict(zip(PRESSURES, altitude_calculator.get_altitudes_from_pressures(PRESSURES).tolist()))
+    middle = lambda pressure: 11019.12 - 6369.43 * math.log(pressure / 1000 / 22.65)
+    for pressure in (22707.0, 22706.9, 2483.1, 2483.0):
+        assert altitudes[pressure] == pytest.approx(middle(pressure), rel=1e-12)
+        assert altitude_calculator.get_altitude_from_pressure(pressure) == pytest.approx(middle(pressure), rel=1e-12)
+    assert altitudes[22707.1] == pytest.approx(
+        44397.5 - 44388.3 * ((22707.1 / altitude_calculator.SEA_LEVEL_PRESSURE) ** .19026), rel=1e-12)
+    assert altitudes[2482.9] == pytest.approx(72441.47 * ((2482.9 / 2488.0) ** -.0878) - 47454.96, rel=1e-12)
+    #the model jumps where the bands meet, so neighbouring pressures are not close in altitude.
+    assert abs(altitudes[2482.9] - altitudes[2483.0]) > 50
+    assert altitudes[10000.0] > altitudes[22707.0] > altitudes[50000.0] > altitudes[101290.0]
+    assert altitudes[101290.0] == pytest.approx(0.0, abs=10)
@@ -0,0 +1,77 @@
+'''
+    File name: test_anemometer.py
+    Python Version: 3.6
+    Description: Regression tests for the anemometer rpm recovery: recover_rpm_rows (one reading at a time,
+    carrying its state between calls) and recover_rpm_arrays (whole numpy arrays at once) give exactly the
+    same rpm, rotations, intervals, wraps and resets.
+'''
+
+#import csv to read the geiger CSVs.
+import csv
+#import os to build the paths of the geiger CSVs.
+import os
+
+#import numpy for the arrays given to recover_rpm_arrays.
+import numpy
+
+#import the module under test.
+import anemometer
+#import the top directory of the repository, where the launch CSVs are.
+from conftest import ROOT
+
+
+#function to check that recover_rpm_rows and recover_rpm_arrays agree on a list of (time, raw count) readings.
+#the rows are recovered in several calls sharing one state, like an incremental run.
+def check_same_recovery(readings):
+    rows = [{'time': repr(time), 'anemometer_rpm': str(count)} for time, count in readings]
+    state = anemometer.new_recovery_state()
+    recovered = []
+    for start in range(0, len(rows), 7):
+        recovered.extend(anemometer.recover_rpm_rows(rows[start:start + 7], state))
+    arrays = anemometer.recover_rpm_arrays(numpy.array([time for time, count in readings]),
+                                           numpy.array([count for time, count in readings]))
+    assert len(recovered) == len(readings)
+    for key in ('rotations', 'interval', 'wraps', 'reset'):
+        assert [row[key] for row in recovered] == arrays[key].tolist(), key
+    for index, row in enumerate(recovered):
+        rpm = arrays['anemometer_rpm'][index]
+        if row['anemometer_rpm'] == '':
+            assert numpy.isnan(rpm), index
+        else:
+            assert row['anemometer_rpm'] == rpm, index
+
+
+#function to read the (time, raw count) readings of a geiger CSV.
+def read_readings(filename):
+    with open(filename, 'r') as original_file:
+        return [(float(row['time']), int(row['anemometer_rpm'])) for row in csv.DictReader(original_file)]
+
+
+#test the readings logged during the launch.
+def test_arrays_match_rows_on_launch():
+    check_same_recovery(read_readings(os.path.join(ROOT, 'geiger.csv')))
+
+
+#test the readings of the synthetic flight.
+def test_arrays_match_rows_on_synthetic_flight(flight_directory):
+    check_same_recovery(read_readings(os.path.join(flight_directory, 'geiger.csv')))
+
+
+#test the cases the logs may not have: the signed counter wrapping past 32,767 several times, resets
+#(including one on the first reading and one straight after another), readings at the same time and
+#a long gap that allows more rotations than a short one.
+def test_arrays_match_rows_on_edge_cases():
+    readings = [(0.0, 40000 % 65536 - 65536), (1.0, 32000), (2.0, 32700), (3.0, -32700), (4.0, -32000),
+                (4.0, -31990), (5.0, 12), (6.0, 3), (7.0, 1), (8.0, 500), (100.0, 30000), (101.0, -30000),
+                (102.0, -29900), (103.0, 0), (104.0, 0), (105.0, 32767), (106.0, -32768)]
+    check_same_recovery(readings)
+    check_same_recovery(readings[1:])
+    check_same_recovery([])
+
+
+#test that load_readings gives the readings read_readings gives, ready for recover_rpm_arrays.
+def test_load_readings_matches_csv(tmp_path, flight_directory):
+    filename = os.path.join(flight_directory, 'geiger.csv')
+    times, counts = anemometer.load_readings(filename, cache_directory=str(tmp_path))
+    assert list(zip(times.tolist(), counts.tolist())) == read_readings(filename)
+    assert counts.dtype.kind == 'i'
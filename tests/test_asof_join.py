@@ -0,0 +1,78 @@
+'''
+    File name: test_asof_join.py
+    Python Version: 3.6
+    Description: Regression tests for the as-of join: asof_join (a sorted merge of rows) and asof_join_arrays
+    (a binary search over numpy arrays) attach exactly the same values, in every mode and with or without
+    a tolerance.
+'''
+
+#import csv to read the sensor CSVs.
+import csv
+#import os to build the paths of the sensor CSVs.
+import os
+
+#import numpy for the arrays given to asof_join_arrays.
+import numpy
+#import pytest to run each case as its own test.
+import pytest
+
+#import the module under test.
+import altitude_calculator
+#import the top directory of the repository, where the launch CSVs are.
+from conftest import ROOT
+
+#the tolerances each mode is tested with: none, less than the time between interior readings and more.
+TOLERANCES = (None, 0.5, 3.0)
+
+
+#function to check that asof_join and asof_join_arrays give the same values for the same times.
+#a value of None from asof_join is NaN from asof_join_arrays.
+def check_same_values(times, reference, mode, tolerance):
+    rows = [{'time': repr(time)} for time in times]
+    expected = [value for row, value in altitude_calculator.asof_join(rows, reference, mode, tolerance)]
+    values = altitude_calculator.asof_join_arrays(numpy.array(times), [time for time, value in reference],
+                                                 [value for time, value in reference], mode, tolerance).tolist()
+    assert len(values) == len(expected)
+    for time, value, expected_value in zip(times, values, expected):
+        if expected_value is None:
+            assert numpy.isnan(value), time
+        else:
+            assert value == expected_value, time
+
+
+#fixture giving the altitude from the interior sensor during the launch as a list of (time, altitude).
+@pytest.fixture(scope='module')
+def interior_altitudes():
+    return list(altitude_calculator.read_altitude_series(os.path.join(ROOT, 'interior.csv')))
+
+
+#test every mode and tolerance on the launch data: the geiger, pressure and gps readings given the altitude
+#from the interior sensor.
+@pytest.mark.parametrize('mode', altitude_calculator.ASOF_MODES)
+@pytest.mark.parametrize('tolerance', TOLERANCES)
+@pytest.mark.parametrize('sensor', ('geiger', 'pressure', 'gps'))
+def test_asof_join_arrays_matches_asof_join(mode, tolerance, sensor, interior_altitudes):
+    with open(os.path.join(ROOT, sensor + '.csv'), 'r') as original_file:
+        times = [float(row['time']) for row in csv.DictReader(original_file)]
+    check_same_values(times, interior_altitudes, mode, tolerance)
+
+
+#test the cases the launch data may not have: times before the first and after the last reference point,
+#several reference points at the same time, times exactly on a reference point and no reference at all.
+@pytest.mark.parametrize('mode', altitude_calculator.ASOF_MODES)
+@pytest.mark.parametrize('tolerance', TOLERANCES)
+def test_asof_join_arrays_matches_asof_join_on_edge_cases(mode, tolerance):
+    reference = [(2.0, 10.0), (4.0, 20.0), (4.0, 30.0), (4.0, 40.0), (7.0, 70.0), (7.5, 75.0)]
+    times = [0.0, 2.0, 2.5, 3.0, 4.0, 4.0, 5.2, 7.0, 7.25, 7.5, 9.0, 20.0]
+    check_same_values(times, reference, mode, tolerance)
+    check_same_values(times, [], mode, tolerance)
+
+
+#test that load_altitude_arrays gives the same times and altitudes as read_altitude_series, when it builds the cache
+#and when it reads it again.
+def test_load_altitude_arrays_matches_read_altitude_series(tmp_path, interior_altitudes):
+    for attempt in range(2):
+        times, altitudes = altitude_calculator.load_altitude_arrays(os.path.join(ROOT, 'interior.csv'),
+                                                                    cache_directory=str(tmp_path))
+        assert times.tolist() == [time for time, altitude in interior_altitudes]
+        assert altitudes.tolist() == [altitude for time, altitude in interior_altitudes]
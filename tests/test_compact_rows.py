@@ -0,0 +1,128 @@
+'''
+    File name: test_compact_rows.py
+    Python Version: 3.6
+    Description: Tests for compact rows: the transforms produce rows of the row type of their schema, the
+    functions taking dictionaries (adapters over the functions taking compact rows) give the same rows as the
+    compact functions and update dictionaries in place the way they always have, and extracting several
+    outputs in one pass writes the same bytes as filter_file does for each of them.
+'''
+
+#import csv to read the test files.
+import csv
+#import os to build the paths of the synthetic flight.
+import os
+
+#import the modules under test.
+import altitude_calculator
+import anemometer
+import compact_rows
+
+
+#the outputs extracted from the synthetic flight: output filename to the keys to include in it.
+EXTRACT_OUTPUTS = {'geiger_out.csv': ['geiger_cpm', 'anemometer_rpm'], 'gps_out.csv': ['lat', 'lng', 'hdop'],
+                   'interior_out.csv': ['interior_temperature'], 'pressure_out.csv': ['exterior_pressure']}
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#function to read a csv as a list of dictionaries.
+def read_dictionaries(filename):
+    with open(filename, 'r') as original_file:
+        return list(csv.DictReader(original_file))
+
+
+#function to read a csv as its header and a list of compact rows.
+def read_compact(filename):
+    with open(filename, 'r') as original_file:
+        header, rows = compact_rows.read_header_and_rows(original_file)
+        return header, list(rows)
+
+
+#test that a row type is shared by every schema with the same columns and reads its cells by name.
+def test_row_type():
+    make_row = compact_rows.row_maker(['time', 'altitude'])
+    row = make_row(['1.5', '20'])
+    assert row == ('1.5', '20')
+    assert row.time == '1.5' and row.altitude == '20'
+    assert type(row) is compact_rows.row_type(('time', 'altitude'))
+    assert type(row).fieldnames == ('time', 'altitude')
+
+
+#test that dictionaries become compact rows and back, with None (a short row of csv.DictReader) an empty cell.
+def test_from_dicts_and_to_dicts():
+    dictionaries = [{'time': '1', 'lat': '2', 'lng': None}, {'lng': '5', 'time': '3', 'lat': '4'}]
+    rows = list(compact_rows.from_dicts(dictionaries, ['time', 'lng']))
+    assert rows == [('1', ''), ('3', '5')]
+    assert type(rows[0]) is compact_rows.row_type(['time', 'lng'])
+    assert list(compact_rows.to_dicts(rows, ['time', 'lng'])) == [{'time': '1', 'lng': ''}, {'time': '3', 'lng': '5'}]
+    assert list(compact_rows.from_dicts(dictionaries, ['lat'])) == [('2',), ('4',)]
+
+
+#test that add_altitude_rows gives the rows add_altitude_compact_rows gives, updating the dictionaries in place.
+def test_add_altitude_rows_matches_compact(flight_directory):
+    master = os.path.join(flight_directory, 'master_sorted.csv')
+    header, rows = read_compact(master)
+    expected = list(altitude_calculator.add_altitude_compact_rows(rows, header))
+    assert any(type(row) is compact_rows.row_type(header) for row in expected)
+    dictionaries = read_dictionaries(master)
+    added = list(altitude_calculator.add_altitude_rows(dictionaries))
+    assert all(row is dictionary for row, dictionary in zip(added, dictionaries))
+    assert [[row[key] for key in header] for row in added] == [list(row[:len(header)]) for row in expected]
+
+
+#test that filter_rows gives the rows filter_compact_rows gives.
+def test_filter_rows_matches_compact(flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    header, rows = read_compact(added)
+    for keys in (['geiger_cpm', 'anemometer_rpm'], ['lat'], []):
+        fieldnames = ['time', 'altitude'] + keys
+        expected = list(altitude_calculator.filter_compact_rows(rows, header, keys))
+        assert len(expected) > 0
+        assert all(type(row) is compact_rows.row_type(fieldnames) for row in expected)
+        filtered = list(altitude_calculator.filter_rows(read_dictionaries(added), keys))
+        assert filtered == [dict(zip(fieldnames, row)) for row in expected]
+
+
+#test that the anemometer corrections from dictionaries give the rows the compact corrections give, with the state
+#carried between calls the same way.
+def test_anemometer_rows_match_compact(flight_directory):
+    geiger = os.path.join(flight_directory, 'geiger.csv')
+    header, rows = read_compact(geiger)
+    overflow_corrected = list(anemometer.overflow_corrected_compact_rows(rows, header))
+    assert all(type(row) is compact_rows.row_type(anemometer.ANEMOMETER_KEYS) for row in overflow_corrected)
+    dictionaries = list(anemometer.overflow_corrected_rows(read_dictionaries(geiger)))
+    assert dictionaries == list(compact_rows.to_dicts(overflow_corrected, anemometer.ANEMOMETER_KEYS))
+    compact_state = anemometer.new_reset_state()
+    dictionary_state = anemometer.new_reset_state()
+    expected = []
+    corrected = []
+    for start in range(0, len(overflow_corrected), 100):
+        expected.extend(anemometer.reset_corrected_compact_rows(overflow_corrected[start:start + 100], compact_state))
+        corrected.extend(anemometer.reset_corrected_rows(dictionaries[start:start + 100], dictionary_state))
+    assert corrected == list(compact_rows.to_dicts(expected, anemometer.ANEMOMETER_KEYS))
+    assert all(row is dictionary for row, dictionary in zip(corrected, dictionaries))
+    assert compact_state == dictionary_state
+
+
+#test that extract_files, extract_rows and extract_files_from_sensors write the same bytes as one filter_file call
+#per output, and count the rows they write.
+def test_extract_matches_filter_file(in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    os.mkdir('files')
+    os.mkdir('rows')
+    os.mkdir('sensors')
+    counts = altitude_calculator.extract_files(added, EXTRACT_OUTPUTS, 'files')
+    assert altitude_calculator.extract_rows(read_dictionaries(added), EXTRACT_OUTPUTS, 'rows') == counts
+    sensor_files = [os.path.join(flight_directory, name + '.csv') for name in ('geiger', 'pressure', 'gps', 'interior')]
+    assert altitude_calculator.extract_files_from_sensors(*sensor_files, outputs=EXTRACT_OUTPUTS,
+                                                          directory='sensors') == counts
+    for output_name, keys_to_include in EXTRACT_OUTPUTS.items():
+        altitude_calculator.filter_file(added, keys_to_include, 'filtered.csv')
+        expected = read_bytes('filtered.csv')
+        assert counts[output_name] == len(read_dictionaries('filtered.csv')) > 0
+        for directory in ('files', 'rows', 'sensors'):
+            assert read_bytes(os.path.join(directory, output_name)) == expected
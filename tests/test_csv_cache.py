@@ -0,0 +1,57 @@
+'''
+    File name: test_csv_cache.py
+    Python Version: 3.6
+    Description: Tests for csv_cache.py: the cache is rebuilt when its CSV changes, a CSV rewritten in place
+    with the same size and modification time is only noticed when the load is verified, and each build writes
+    a temporary file of its own.
+'''
+
+#import os to set the modification time of the test CSV.
+import os
+
+#import the module under test.
+import csv_cache
+
+
+#function to write a CSV and set its modification time.
+def write_csv(text, mtime):
+    with open('data.csv', 'w') as new_file:
+        new_file.write(text)
+    os.utime('data.csv', (mtime, mtime))
+
+
+#test that the columns are parsed with their types and that a change to the size of the CSV rebuilds the cache.
+def test_load_columns(in_tmp_path):
+    write_csv('time,count,name\n1.5,3,a\n2.5,,b\n', 1000000000)
+    columns = csv_cache.load_columns('data.csv')
+    assert columns['time'].tolist() == [1.5, 2.5]
+    assert columns['count'].tolist() == [3, None]
+    assert columns['name'].tolist() == ['a', 'b']
+    write_csv('time,count,name\n1.5,3,a\n2.5,4,b\n', 1000000000)
+    assert csv_cache.load_columns('data.csv')['count'].tolist() == [3, 4]
+
+
+#test that a rewrite keeping the size and modification time is served from the cache unless verify is True.
+def test_verify_notices_rewrite_with_same_mtime(in_tmp_path):
+    write_csv('time,count\n1,3\n2,4\n', 1000000000)
+    assert csv_cache.load_column('data.csv', 'count').tolist() == [3, 4]
+    write_csv('time,count\n1,5\n2,6\n', 1000000000)
+    assert csv_cache.load_column('data.csv', 'count').tolist() == [3, 4]
+    assert csv_cache.load_column('data.csv', 'count', verify=True).tolist() == [5, 6]
+    #a touch without a change is still served from the cache.
+    os.utime('data.csv', (1000000100, 1000000100))
+    assert csv_cache.load_column('data.csv', 'count').tolist() == [5, 6]
+
+
+#test that a cache is built in a temporary file of its own (not one every build of it shares), which is gone once
+#the cache is built.
+def test_build_uses_own_temporary_file(in_tmp_path):
+    write_csv('time,count\n1,3\n2,4\n', 1000000000)
+    os.mkdir('cache')
+    cache_path = os.path.join('cache', 'data.cache')
+    #what a build sharing a fixed temporary name would have to write to.
+    os.mkdir(cache_path + '.tmp')
+    csv_cache.build_cache('data.csv', cache_path)
+    assert csv_cache.load_column('data.csv', 'count', cache_directory='cache').tolist() == [3, 4]
+    assert sorted(os.listdir('cache')) == sorted([os.path.basename(csv_cache.cache_path_for('data.csv', 'cache')),
+                                                  'data.cache', 'data.cache.tmp'])
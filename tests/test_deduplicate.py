@@ -0,0 +1,128 @@
+'''
+    File name: test_deduplicate.py
+    Python Version: 3.6
+    Description: Regression tests for deduplicate_csv: every way of deduplicating (in memory, remembering only
+    a window of a sorted file and the external sort-and-merge) writes exactly what the old
+    fully_deduplicate_csv and time_based_deduplicate_csv wrote, which are kept here as they were.
+'''
+
+#import csv to read and write the test files.
+import csv
+#import os to build the paths of the synthetic flight.
+import os
+
+#import pytest to run each mode as its own test.
+import pytest
+
+#import the module under test.
+import altitude_calculator
+
+#the keyword arguments of deduplicate_csv for each way of deduplicating, and whether it needs a sorted file.
+MODES = (
+    ({}, False),
+    ({'assume_sorted': True}, True),
+    ({'chunk_size': 500}, False),
+)
+
+
+#the old fully_deduplicate_csv (writing to output_name instead of deduped.csv).
+def old_fully_deduplicate_csv(filename, output_name):
+    with open(filename, 'r') as in_file, open(output_name, 'w') as out_file:
+        seen = set()
+        for line in in_file:
+            if line not in seen:
+                seen.add(line)
+                out_file.write(line)
+
+
+#the old time_based_deduplicate_csv (writing to output_name instead of time_deduped.csv).
+def old_time_based_deduplicate_csv(filename, output_name):
+    with open(filename, 'r') as in_file, open(output_name, 'w') as out_file:
+        reader = csv.DictReader(in_file)
+        writer = csv.DictWriter(out_file, altitude_calculator.KEYS)
+        writer.writeheader()
+        seen = set()
+        for row in reader:
+            time = row['time']
+            if time not in seen:
+                seen.add(time)
+                writer.writerow(row)
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#fixture writing the synthetic flight with duplicates added as with_duplicates.csv (still sorted by time)
+#and the same rows in reverse order as reversed.csv. returns the number of rows added.
+@pytest.fixture
+def duplicated_files(in_tmp_path, flight_directory):
+    with open(os.path.join(flight_directory, 'altitude_added.csv'), 'r') as original_file:
+        reader = csv.reader(original_file)
+        header = next(reader)
+        rows = list(reader)
+    time_position = header.index('time')
+    pressure_position = header.index('calibrated_pressure')
+    duplicated = []
+    added = 0
+    for index, row in enumerate(rows):
+        duplicated.append(row)
+        if index % 7 == 0:
+            #a completely duplicate row.
+            duplicated.append(list(row))
+            added += 1
+        if index % 11 == 0:
+            #a row at the same time with a different value.
+            changed = list(row)
+            changed[pressure_position] = '1.5'
+            assert changed[time_position] == row[time_position]
+            duplicated.append(changed)
+            added += 1
+    for filename, file_rows in (('with_duplicates.csv', duplicated), ('reversed.csv', duplicated[::-1])):
+        with open(filename, 'w') as new_file:
+            writer = csv.writer(new_file)
+            writer.writerow(header)
+            writer.writerows(file_rows)
+    return added
+
+
+#test that removing completely duplicate rows writes what the old fully_deduplicate_csv wrote.
+@pytest.mark.parametrize('options, needs_sorted', MODES)
+def test_full_deduplication_matches_old(options, needs_sorted, duplicated_files):
+    filenames = ('with_duplicates.csv',) if needs_sorted else ('with_duplicates.csv', 'reversed.csv')
+    for filename in filenames:
+        old_fully_deduplicate_csv(filename, 'old.csv')
+        removed = altitude_calculator.deduplicate_csv(filename, 'new.csv', **options)
+        assert read_bytes('new.csv') == read_bytes('old.csv')
+        assert removed > 0
+
+
+#test that removing rows with a time already seen writes what the old time_based_deduplicate_csv wrote.
+@pytest.mark.parametrize('options, needs_sorted', MODES)
+def test_time_deduplication_matches_old(options, needs_sorted, duplicated_files):
+    filenames = ('with_duplicates.csv',) if needs_sorted else ('with_duplicates.csv', 'reversed.csv')
+    for filename in filenames:
+        old_time_based_deduplicate_csv(filename, 'old.csv')
+        removed = altitude_calculator.deduplicate_csv(filename, 'new.csv', by_time=True, **options)
+        assert read_bytes('new.csv') == read_bytes('old.csv')
+        assert removed >= duplicated_files
+
+
+#test that the wrappers with the old names still write what the old functions wrote.
+def test_old_names_match_old(duplicated_files):
+    old_fully_deduplicate_csv('reversed.csv', 'old.csv')
+    altitude_calculator.fully_deduplicate_csv('reversed.csv', 'new.csv')
+    assert read_bytes('new.csv') == read_bytes('old.csv')
+    old_time_based_deduplicate_csv('reversed.csv', 'old.csv')
+    altitude_calculator.time_based_deduplicate_csv('reversed.csv', 'new.csv')
+    assert read_bytes('new.csv') == read_bytes('old.csv')
+
+
+#test that fieldnames=None keeps the columns of a file that isn't in the format of generate_combined_spreadsheet.
+def test_time_deduplication_keeps_own_header(in_tmp_path):
+    with open('sensor.csv', 'w') as new_file:
+        new_file.write('time,geiger_cpm\n1,10\n1,11\n2,12\n')
+    altitude_calculator.deduplicate_csv('sensor.csv', 'new.csv', by_time=True, fieldnames=None)
+    assert read_bytes('new.csv') == b'time,geiger_cpm\r\n1,10\r\n2,12\r\n'
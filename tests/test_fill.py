@@ -0,0 +1,70 @@
+'''
+    File name: test_fill.py
+    Python Version: 3.6
+    Description: Regression tests for fill_rows: fill_in_missing_data fills every column in one pass with
+    exactly the output of the old cascade of fill_in_missing_points, one column (and one file) at a time.
+'''
+
+#import csv to write the small hand-made file.
+import csv
+#import os to build the paths of the synthetic flight.
+import os
+
+#import the module under test.
+import altitude_calculator
+
+
+#function to fill in every column the way fill_in_missing_data used to: fill_in_missing_points applied to each
+#column of KEYS but time in turn, each reading the file written for the column before.
+#returns the filename of the last file written.
+def cascade_fill(filename):
+    previous_filename = filename
+    for count, key in enumerate(key for key in altitude_calculator.KEYS if key != 'time'):
+        new_filename = str(count) + '.csv'
+        altitude_calculator.fill_in_missing_points(previous_filename, key, new_filename)
+        previous_filename = new_filename
+    return previous_filename
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#test that fill_in_missing_data writes the same bytes as the cascade on the synthetic flight (with its altitudes).
+def test_fill_matches_cascade(in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    altitude_calculator.fill_in_missing_data(added, 'filled.csv')
+    expected = read_bytes(cascade_fill(added))
+    #the flight has enough rows left once filled for the comparison to mean something.
+    assert expected.count(b'\n') > 1000
+    assert read_bytes('filled.csv') == expected
+
+
+#test the cases the synthetic flight may not have: ties between the value before and after a row, rows before
+#the first value of a column and rows after the last value of an earlier column (which the cascade drops).
+def test_fill_matches_cascade_on_edge_cases(in_tmp_path):
+    keys = altitude_calculator.KEYS
+    rows = [
+        {'time': '1', 'geiger_cpm': '', 'lat': '5'},
+        {'time': '2', 'geiger_cpm': '10', 'lat': ''},
+        {'time': '3', 'geiger_cpm': '', 'lat': ''},
+        {'time': '4', 'geiger_cpm': '20', 'lat': '6'},
+        {'time': '4', 'geiger_cpm': '', 'lat': ''},
+        {'time': '7', 'geiger_cpm': '30', 'lat': ''},
+        {'time': '8', 'geiger_cpm': '', 'lat': '7'},
+        {'time': '9', 'geiger_cpm': '', 'lat': ''},
+    ]
+    with open('edge.csv', 'w') as new_file:
+        writer = csv.DictWriter(new_file, keys)
+        writer.writeheader()
+        for row in rows:
+            #every other column has a value in every row so only geiger_cpm and lat need filling.
+            full_row = dict((key, '0') for key in keys)
+            full_row.update(row)
+            writer.writerow(full_row)
+    altitude_calculator.fill_in_missing_data('edge.csv', 'filled.csv')
+    expected = read_bytes(cascade_fill('edge.csv'))
+    assert expected.count(b'\n') > 1
+    assert read_bytes('filled.csv') == expected
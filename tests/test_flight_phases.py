@@ -0,0 +1,99 @@
+'''
+    File name: test_flight_phases.py
+    Python Version: 3.6
+    Description: Tests for flight_phases.py on the synthetic flight, whose launch, burst and landing times are
+    known from PAD_FRACTION, ASCENT_FRACTION and DESCENT_FRACTION: the events are found within a tolerance of
+    them, and the phases between them add up to the whole flight with the altitudes and rates it was made with.
+'''
+
+#import csv to read the events and phases written.
+import csv
+#import os to build the path of altitude_added.csv of the synthetic flight.
+import os
+
+#import pytest for approx.
+import pytest
+
+#import the module under test and the module the synthetic flight was made with.
+import flight_phases
+import synthetic_flight
+#import the length of the synthetic flight.
+from conftest import FLIGHT_DURATION
+
+#the column of altitude_added.csv with the altitudes calculated from the pressure.
+ALTITUDE_KEY = 'calculated_altitude'
+#the times the synthetic flight launched, burst and landed.
+LAUNCH_TIME = synthetic_flight.START_TIME + synthetic_flight.PAD_FRACTION * FLIGHT_DURATION
+BURST_TIME = LAUNCH_TIME + synthetic_flight.ASCENT_FRACTION * FLIGHT_DURATION
+LANDING_TIME = BURST_TIME + synthetic_flight.DESCENT_FRACTION * FLIGHT_DURATION
+#how far (in seconds) an event may be found from when it happened: the smoothing window, since the
+#descent slows to the landing rate gradually.
+TOLERANCE = flight_phases.SMOOTHING_WINDOW
+
+
+#fixture analyzing altitude_added.csv of the synthetic flight in a temporary directory.
+#returns the events and phases.
+@pytest.fixture
+def analyzed(in_tmp_path, flight_directory):
+    return flight_phases.analyze_flight(os.path.join(flight_directory, 'altitude_added.csv'),
+                                        altitude_key=ALTITUDE_KEY)
+
+
+#function to read a csv as a list of dictionaries.
+def read_dictionaries(filename):
+    with open(filename, 'r') as original_file:
+        return list(csv.DictReader(original_file))
+
+
+#test that the launch, burst and landing are found near when they happened, and confirmed after it.
+def test_events_match_flight(analyzed):
+    events, phases = analyzed
+    assert [event['event'] for event in events] == ['launch', 'burst', 'landing']
+    for event, expected in zip(events, (LAUNCH_TIME, BURST_TIME, LANDING_TIME)):
+        assert abs(event['time'] - expected) <= TOLERANCE
+        assert event['time'] <= event['detected_at'] <= event['time'] + flight_phases.CONFIRM_SECONDS + TOLERANCE
+    assert events[1]['altitude'] == pytest.approx(synthetic_flight.BURST_ALTITUDE, abs=200)
+
+
+#test that the phases follow each other, cover every row, and have the altitudes and rates of the flight.
+def test_phase_aggregates(analyzed, flight_directory):
+    events, phases = analyzed
+    assert [phase['phase'] for phase in phases] == ['pad', 'ascent', 'descent', 'landed']
+    rows = read_dictionaries(os.path.join(flight_directory, 'altitude_added.csv'))
+    altitudes = [float(row[ALTITUDE_KEY]) for row in rows if len(row[ALTITUDE_KEY]) > 0]
+    #rows without an altitude count towards the phase they are in.
+    assert sum(phase['rows'] for phase in phases) == len(rows)
+    assert min(phase['min_altitude'] for phase in phases) == min(altitudes)
+    assert max(phase['max_altitude'] for phase in phases) == max(altitudes)
+    #each event is between the phases it separates (the first row of a phase may have no altitude).
+    for previous, phase, event in zip(phases, phases[1:], events):
+        assert previous['end_time'] <= event['time'] <= phase['start_time'] < event['time'] + 1
+    for phase in phases:
+        assert phase['start_time'] <= phase['end_time']
+        assert phase['duration'] == pytest.approx(phase['end_time'] - phase['start_time'])
+    pad, ascent, descent, landed = phases
+    #the ascent climbs at a steady rate, the descent falls and the balloon is still on the pad and once landed.
+    ascent_rate = (synthetic_flight.BURST_ALTITUDE - synthetic_flight.PAD_ALTITUDE) / \
+        (synthetic_flight.ASCENT_FRACTION * FLIGHT_DURATION)
+    assert ascent['mean_rate'] == pytest.approx(ascent_rate, rel=0.05)
+    assert ascent['max_altitude'] == events[1]['altitude']
+    assert descent['mean_rate'] < flight_phases.DESCENT_RATE
+    assert abs(landed['mean_rate']) < flight_phases.LANDED_RATE
+    assert landed['max_altitude'] < synthetic_flight.PAD_ALTITUDE + 100
+    #the synthetic flight is colder and has more counts high up.
+    assert ascent['interior_temperature_mean'] < pad['interior_temperature_mean']
+    assert ascent['geiger_cpm_mean'] > pad['geiger_cpm_mean']
+    for key in ('interior_temperature', 'geiger_cpm'):
+        for phase in phases:
+            assert phase[key + '_min'] <= phase[key + '_mean'] <= phase[key + '_max']
+
+
+#test that the events and phases written are those returned.
+def test_written_files(analyzed):
+    events, phases = analyzed
+    written_events = read_dictionaries('flight_events.csv')
+    assert [row['event'] for row in written_events] == [event['event'] for event in events]
+    assert [float(row['time']) for row in written_events] == pytest.approx([event['time'] for event in events])
+    written_phases = read_dictionaries('flight_phases.csv')
+    assert [row['phase'] for row in written_phases] == [phase['phase'] for phase in phases]
+    assert [int(row['rows']) for row in written_phases] == [phase['rows'] for phase in phases]
@@ -0,0 +1,144 @@
+'''
+    File name: test_gps.py
+    Python Version: 3.6
+    Description: Tests for gps.py on a hand-checked track: decoding the NMEA coordinates, which readings are
+    valid and why the others aren't, the ground speed and heading between valid readings, and how much the
+    streaming simplification keeps at different tolerances.
+'''
+
+#import csv to write the hand-checked readings and read the tracks.
+import csv
+#import math to work out the expected distances.
+import math
+#import os to build the paths of the launch and synthetic gps files.
+import os
+
+#import numpy to compare the decoded arrays.
+import numpy
+#import pytest for approx.
+import pytest
+
+#import the module under test.
+import gps
+#import the top directory of the repository, where the launch CSVs are.
+from conftest import ROOT
+
+#the meters in a degree of latitude (and of longitude at the equator).
+METERS_PER_DEGREE = math.radians(1) * gps.EARTH_RADIUS
+
+#the hand-checked readings: (time, lat, lat_direction, lng, lng_direction, fix_quality, hdop).
+READINGS = [
+    #searching for a fix.
+    ('0', '0000.0000', 'N', '00000.0000', 'E', '0', '0.0'),
+    #42 degrees north, 71 degrees west.
+    ('1', '4200.0000', 'N', '07100.0000', 'W', '1', '1.0'),
+    #0.054 minutes (0.0009 degrees) further north, 10 seconds later.
+    ('11', '4200.0540', 'N', '07100.0000', 'W', '1', '1.2'),
+    #a reading with too high an hdop, somewhere else entirely.
+    ('15', '4300.0000', 'N', '07200.0000', 'W', '1', '9.0'),
+    #a fix without an hdop.
+    ('16', '4200.0540', 'N', '07100.0000', 'W', '1', '0.0'),
+    #a fix with a good hdop but a latitude beyond the pole.
+    ('17', '9500.0000', 'N', '07100.0000', 'W', '1', '1.0'),
+    #0.06 minutes (0.001 degrees) further east, 10 seconds after the last valid reading.
+    ('21', '4200.0540', 'N', '07059.9400', 'W', '1', '1.0'),
+]
+
+
+#fixture writing the hand-checked readings as readings.csv in a temporary directory.
+@pytest.fixture
+def readings_file(in_tmp_path):
+    with open('readings.csv', 'w') as new_file:
+        writer = csv.writer(new_file)
+        writer.writerow(['time', 'lat', 'lat_direction', 'lng', 'lng_direction', 'fix_quality', 'num_satelites',
+                         'hdop', 'altitude'])
+        for time, lat, lat_direction, lng, lng_direction, fix_quality, hdop in READINGS:
+            writer.writerow([time, lat, lat_direction, lng, lng_direction, fix_quality, '07', hdop, '100.0'])
+    return 'readings.csv'
+
+
+#test that NMEA coordinates are decoded to signed decimal degrees, and minutes past 60 are nan.
+def test_decode_coordinates():
+    decoded = gps.decode_coordinates([4230.0, 3330.0, 12345.6, 7061.0], ['N', 'S', 'W', 'E'], 'S')
+    assert decoded[:2].tolist() == [42.5, -33.5]
+    assert decoded[2] == pytest.approx(123.76)
+    assert numpy.isnan(decoded[3])
+    assert gps.decode_coordinates([12345.6], ['W'], 'W')[0] == pytest.approx(-123.76)
+
+
+#test which readings are valid, the count of every reason the others aren't, and the speed and heading between
+#the valid readings.
+def test_decode_hand_checked_track(readings_file):
+    state = gps.new_gps_state()
+    track = next(gps.decode_gps_chunks(readings_file, state, drop_invalid=False))
+    assert track['valid'].tolist() == [0, 1, 1, 0, 0, 0, 1]
+    assert (state['rows'], state['valid'], state['no_fix'], state['bad_hdop'], state['high_hdop'],
+            state['bad_position']) == (7, 3, 1, 1, 1, 1)
+    assert state['no_fix'] + state['bad_hdop'] + state['high_hdop'] + state['bad_position'] == \
+        state['rows'] - state['valid']
+    assert track['latitude'][2] == pytest.approx(42.0009)
+    assert track['longitude'][6] == pytest.approx(-70.999)
+    #the first valid reading has no reading before it.
+    assert numpy.isnan(track['ground_speed'][1]) and numpy.isnan(track['heading'][1])
+    #100 meters due north in 10 seconds.
+    assert track['ground_speed'][2] == pytest.approx(0.0009 * METERS_PER_DEGREE / 10, rel=1e-9)
+    assert track['heading'][2] == pytest.approx(0.0, abs=1e-9)
+    #0.001 degrees of longitude due east at 42 degrees north in 10 seconds (from the reading at 11, not 15).
+    east = 0.001 * METERS_PER_DEGREE * math.cos(math.radians(42.0009))
+    assert track['ground_speed'][6] == pytest.approx(east / 10, rel=1e-6)
+    assert track['heading'][6] == pytest.approx(90.0, abs=0.001)
+    #the invalid readings have no speed or heading.
+    assert numpy.isnan(track['ground_speed'][[0, 3, 4, 5]]).all()
+
+
+#test that the track written has just the valid readings, and carries the previous reading between chunks.
+def test_decode_gps_file(readings_file):
+    state = gps.decode_gps_file(readings_file, 'track.csv', chunk_size=2)
+    with open('track.csv', 'r') as track_file:
+        rows = list(csv.DictReader(track_file))
+    assert [row['time'] for row in rows] == ['1.000000', '11.000000', '21.000000']
+    assert [row['heading'] for row in rows] == ['', '0.00', '90.00']
+    assert rows[1]['latitude'] == '42.0009000'
+    assert state['valid'] == 3 and state['rows'] == 7
+
+
+#test that the counts of the launch and synthetic gps readings add up.
+def test_counts_add_up(in_tmp_path, flight_directory):
+    for filename in (os.path.join(ROOT, 'gps.csv'), os.path.join(flight_directory, 'gps.csv')):
+        state = gps.decode_gps_file(filename, 'track.csv')
+        assert state['valid'] > 0
+        assert state['no_fix'] + state['bad_hdop'] + state['high_hdop'] + state['bad_position'] == \
+            state['rows'] - state['valid']
+
+
+#function to simplify readings every 10 meters north of the equator, with the sixth one 20 meters east.
+#returns the numbers of the readings kept.
+def simplify_offset_line(tolerance, max_window=gps.MAX_WINDOW):
+    readings = []
+    for number in range(11):
+        east = 20.0 if number == 5 else 0.0
+        readings.append((number * 10.0 / METERS_PER_DEGREE, east / METERS_PER_DEGREE, 0.0, number))
+    return list(gps.simplify_track(gps.new_simplify_state(tolerance, max_window), readings))
+
+
+#test that a tolerance wider than the offset keeps just the ends, and a narrow one keeps the readings around it.
+def test_simplify_tolerance():
+    assert simplify_offset_line(50.0) == [0, 10]
+    #the reading before the offset can't be left out once the line reaches it (it is 14.9 meters from the line
+    #from the first reading to the offset one), and the offset one is 20 meters from the line on either side of it.
+    assert simplify_offset_line(5.0) == [0, 4, 5, 6, 10]
+    #a full window keeps a reading whatever the tolerance.
+    assert simplify_offset_line(50.0, max_window=3) == [0, 3, 6, 9, 10]
+
+
+#test that the simplified track of the synthetic flight keeps its ends and leaves most readings out.
+def test_simplify_gps_file(in_tmp_path, flight_directory):
+    gps_state, simplify_state = gps.simplify_gps_file(os.path.join(flight_directory, 'gps.csv'), 'simplified.csv',
+                                                      tolerance=25)
+    gps.decode_gps_file(os.path.join(flight_directory, 'gps.csv'), 'track.csv')
+    with open('simplified.csv', 'r') as simplified_file, open('track.csv', 'r') as track_file:
+        simplified = list(csv.DictReader(simplified_file))
+        track = list(csv.DictReader(track_file))
+    assert simplify_state['rows'] == gps_state['valid'] == len(track)
+    assert simplify_state['kept'] == len(simplified) < len(track) / 2
+    assert simplified[0] == track[0] and simplified[-1] == track[-1]
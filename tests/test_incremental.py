@@ -0,0 +1,86 @@
+'''
+    File name: test_incremental.py
+    Python Version: 3.6
+    Description: Regression tests for incremental.py: running a step on a file after every append (including
+    appends that stop in the middle of a line) and once more with final=True writes exactly what running
+    the matching function on the whole file writes.
+'''
+
+#import os to build the paths of the synthetic flight.
+import os
+
+#import pytest to run each step as its own test.
+import pytest
+
+#import the modules under test.
+import altitude_calculator
+import anemometer
+import incremental
+
+#the fractions of the input written before each incremental run. some fall in the middle of a line.
+APPEND_FRACTIONS = (0.0001, 0.013, 0.25, 0.2501, 0.5, 0.77, 0.99, 1.0)
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#function to grow a copy of a file a piece at a time, running an incremental step after every piece
+#and a final run at the end.
+#arg source: the complete file.
+#arg step: a function taking the input, output and checkpoint filenames and final.
+#returns the filename of the output.
+def run_while_growing(source, step):
+    data = read_bytes(source)
+    written = 0
+    with open('growing.csv', 'wb') as growing_file:
+        for fraction in APPEND_FRACTIONS:
+            end = int(len(data) * fraction)
+            growing_file.write(data[written:end])
+            growing_file.flush()
+            written = end
+            step('growing.csv', 'incremental.csv', 'checkpoint.json', False)
+    step('growing.csv', 'incremental.csv', 'checkpoint.json', True)
+    return 'incremental.csv'
+
+
+#test that adding the altitude as the file grows matches add_altitude_if_pressure_present on the whole file.
+def test_incremental_altitude_matches_full(in_tmp_path, flight_directory):
+    master = os.path.join(flight_directory, 'master_sorted.csv')
+    altitude_calculator.add_altitude_if_pressure_present(master)
+    output = run_while_growing(master, lambda input_name, output_name, checkpoint_name, final:
+                               incremental.incremental_altitude(input_name, output_name, checkpoint_name, final=final))
+    assert read_bytes(output) == read_bytes('altitude_added.csv')
+
+
+#test that deduplicating by time as the file grows matches time_based_deduplicate_csv on the whole file,
+#remembering every time or only the window of a sorted file.
+@pytest.mark.parametrize('assume_sorted', (False, True))
+def test_incremental_dedup_matches_full(assume_sorted, in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    altitude_calculator.time_based_deduplicate_csv(added, 'deduped.csv')
+    output = run_while_growing(added, lambda input_name, output_name, checkpoint_name, final:
+                               incremental.incremental_dedup(input_name, output_name, checkpoint_name,
+                                                             assume_sorted=assume_sorted, final=final))
+    assert read_bytes(output) == read_bytes('deduped.csv')
+
+
+#test that filling in as the file grows matches fill_in_missing_data on the whole file, with the rows still
+#waiting for a value carried over from one run to the next in the checkpoint.
+def test_incremental_fill_matches_full(in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    altitude_calculator.fill_in_missing_data(added, 'filled.csv')
+    output = run_while_growing(added, incremental.incremental_fill)
+    expected = read_bytes('filled.csv')
+    assert expected.count(b'\n') > 1000
+    assert read_bytes(output) == expected
+
+
+#test that correcting the anemometer as the file grows matches correct_overflows then correct_lack_of_reset.
+def test_incremental_anemometer_matches_full(in_tmp_path, flight_directory):
+    anemometer.correct_overflows(os.path.join(flight_directory, 'geiger.csv'))
+    anemometer.correct_lack_of_reset('overflow_corrected.csv')
+    output = run_while_growing(os.path.join(flight_directory, 'geiger.csv'), incremental.incremental_anemometer)
+    assert read_bytes(output) == read_bytes('reset_corrected.csv')
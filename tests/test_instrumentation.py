@@ -0,0 +1,129 @@
+'''
+    File name: test_instrumentation.py
+    Python Version: 3.6
+    Description: Tests for instrumentation.py: while it is off the hooks record nothing and pass the rows
+    through untouched; while it is on the decorator counts and times every call and adds up the sizes of the
+    files named by its arguments, the streams are counted and timed, the peak counters keep the largest size
+    recorded (by fill_rows and deduplicate too), and the profile and memory trace end up in the report.
+'''
+
+#import json to read the report written.
+import json
+
+#import pytest for the fixtures.
+import pytest
+
+#import the module under test and the module whose functions record the peak counters.
+import altitude_calculator
+import instrumentation
+
+
+#fixture making sure every test starts and ends with instrumentation off and nothing recorded.
+@pytest.fixture(autouse=True)
+def clean_instrumentation():
+    instrumentation.disable()
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+#function writing the text of one file to another, instrumented with both filenames.
+@instrumentation.instrumented(name='copy', inputs=('filename',), outputs=('output_name',))
+def copy_file(filename, output_name, fail=False):
+    with open(filename, 'r') as original_file, open(output_name, 'w') as new_file:
+        new_file.write(original_file.read())
+    if fail:
+        raise ValueError('failed after writing')
+    return output_name
+
+
+#function writing a file with a fixed name, instrumented with a function giving the name.
+@instrumentation.instrumented(outputs=(lambda arguments: 'fixed.csv',))
+def write_fixed(text):
+    with open('fixed.csv', 'w') as new_file:
+        new_file.write(text)
+
+
+#test that while instrumentation is off the hooks record nothing and the streams are passed through as they are.
+def test_disabled_records_nothing(in_tmp_path):
+    rows = iter([1, 2, 3])
+    assert instrumentation.counted('stage', 'rows_in', rows) is rows
+    assert instrumentation.timed_rows('stage', rows) is rows
+    instrumentation.add_count('stage', 'rows_out', 5)
+    instrumentation.record_peak('stage', 'peak_buffer', 5)
+    with open('in.csv', 'w') as new_file:
+        new_file.write('time\n1\n')
+    assert copy_file('in.csv', 'out.csv') == 'out.csv'
+    assert instrumentation.report() == {'stages': {}}
+
+
+#test that the decorator counts and times every call, even one that raises, and adds up the sizes of the files
+#named by the arguments (the input when the call starts and the output once it has finished).
+def test_instrumented_calls_and_file_bytes(in_tmp_path):
+    with open('in.csv', 'w') as new_file:
+        new_file.write('time\n' + '1\n' * 50)
+    instrumentation.enable()
+    copy_file('in.csv', 'out.csv')
+    with pytest.raises(ValueError):
+        copy_file('in.csv', 'other.csv', fail=True)
+    copy_file(output_name='missing.csv', filename='in.csv', fail=False)
+    write_fixed('abc')
+    statistics = instrumentation.report()['stages']
+    assert (statistics['copy']['calls'], statistics['copy']['input_file_bytes'],
+            statistics['copy']['output_file_bytes']) == (3, 3 * 105, 3 * 105)
+    assert statistics['copy']['wall_seconds'] > 0 and statistics['copy']['cpu_seconds'] >= 0
+    #the name is the module and function name unless one is given.
+    assert statistics['test_instrumentation.write_fixed']['output_file_bytes'] == 3
+    assert statistics['test_instrumentation.write_fixed']['input_file_bytes'] == 0
+
+
+#test that streams are counted and timed as they are read, and counts are added up.
+def test_counted_and_timed_rows():
+    instrumentation.enable()
+    counted = instrumentation.counted('stage', 'rows_in', iter(range(10)))
+    timed = instrumentation.timed_rows('stage', (value * 2 for value in counted if value % 2 == 0))
+    assert list(timed) == [0, 4, 8, 12, 16]
+    instrumentation.add_count('stage', 'rows_out', 3)
+    statistics = instrumentation.report()['stages']['stage']
+    assert (statistics['calls'], statistics['rows_in'], statistics['rows_out']) == (1, 10, 8)
+    assert statistics['wall_seconds'] > 0
+    assert statistics['rows_per_second'] == statistics['rows_out'] / statistics['wall_seconds']
+
+
+#test that the peak counters keep the largest size recorded, including those recorded by fill_rows and
+#deduplicate.
+def test_peak_counters():
+    instrumentation.enable()
+    for size in (3, 7, 5):
+        instrumentation.record_peak('stage', 'peak_buffer', size)
+    assert instrumentation.report()['stages']['stage']['peak_buffer'] == 7
+    #the value of a is only found in the fourth row, so the first four rows are pending at once.
+    rows = [{'time': str(time), 'a': 'x' if time == 3 else '', 'b': 'y'} for time in range(6)]
+    state = altitude_calculator.new_fill_state(['a', 'b'])
+    assert [row['time'] for row in altitude_calculator.fill_rows(state, rows)] == ['0', '1', '2', '3']
+    #six different rows out of ten.
+    unique = list(altitude_calculator.deduplicate([1, 2, 1, 3, 4, 2, 5, 6, 6, 1], key=str))
+    assert unique == [1, 2, 3, 4, 5, 6]
+    statistics = instrumentation.report()['stages']
+    assert statistics['altitude_calculator.fill_rows']['peak_buffer'] == 4
+    assert statistics['altitude_calculator.deduplicate']['peak_dedup_size'] == 6
+
+
+#test that profiling and tracing memory put a summary of each in the report once instrumentation is turned off.
+def test_profile_and_memory(in_tmp_path):
+    instrumentation.enable(profile=True, trace_memory=True)
+    altitude_calculator.get_altitudes_from_pressures([90000.0] * 1000)
+    assert 'profile' not in instrumentation.report()
+    instrumentation.disable()
+    instrumentation.write_report('report.json')
+    with open('report.json', 'r') as report_file:
+        report = json.load(report_file)
+    assert 0 < len(report['profile']) <= instrumentation.SUMMARY_SIZE
+    assert any('get_altitudes_from_pressures' in entry['function'] for entry in report['profile'])
+    cumulative = [entry['cumulative_seconds'] for entry in report['profile']]
+    assert cumulative == sorted(cumulative, reverse=True)
+    assert report['memory']['peak_bytes'] > 0
+    assert 0 < len(report['memory']['largest_allocations']) <= instrumentation.SUMMARY_SIZE
+    instrumentation.reset()
+    assert instrumentation.report() == {'stages': {}}
@@ -0,0 +1,156 @@
+'''
+    File name: test_live_ingest.py
+    Python Version: 3.6
+    Description: Regression tests for live_ingest.py: an unpaced replay of the launch CSVs writes the same
+    file as the batch functions, and the counts of late, dropped and bad rows match the rows delivered.
+'''
+
+#import asyncio for the in-memory feeds and consumers.
+import asyncio
+#import os to build the paths of the copied CSVs.
+import os
+
+#import the modules under test.
+import altitude_calculator
+import live_ingest
+
+#the header of each sensor CSV used by the in-memory feeds (a subset of the columns of the real ones).
+HEADERS = ('time,geiger_cpm,anemometer_rpm', 'time,exterior_pressure', 'time,lat', 'time,calibrated_pressure')
+
+
+#function to create an in-memory feed of lines.
+#arg lines: the lines (without the header or newlines).
+#arg header: the header of the feed.
+#arg wait_until: an optional function called before each row; the feed waits until it returns True.
+async def memory_feed(lines, header, wait_until=None):
+    yield (header + '\n').encode('utf-8')
+    for line in lines:
+        while wait_until is not None and not wait_until():
+            await asyncio.sleep(0)
+        yield (line + '\n').encode('utf-8')
+
+
+#function to read the rows published on a queue until None, letting the event loop run after each row
+#so the ingester gets ahead of it.
+async def consume_slowly(queue, rows):
+    while True:
+        row = await queue.get()
+        if row is None:
+            return rows
+        rows.append(row)
+        await asyncio.sleep(0.001)
+
+
+#function to ingest the geiger feed rows at the given times (the other feeds send no rows) into a small queue
+#with a slow consumer.
+#returns the rows the consumer received and the metrics.
+def ingest_slowly(times, overflow, queue_size=2):
+    async def go():
+        feeds = [memory_feed(['%d,1,2' % time for time in times], HEADERS[0])]
+        feeds += [memory_feed([], header) for header in HEADERS[1:]]
+        queue = asyncio.Queue(maxsize=queue_size)
+        consumer = asyncio.ensure_future(consume_slowly(queue, []))
+        metrics = await live_ingest.ingest(feeds, queue, max_lateness=None, overflow=overflow)
+        return await consumer, metrics
+    return live_ingest.run(go())
+
+
+#test that an unpaced replay writes exactly what merging the CSVs and adding the altitude writes.
+def test_unpaced_replay_matches_add_altitude(in_tmp_path, sensor_files):
+    altitude_calculator.generate_sorted_combined_spreadsheet(*sensor_files, output_name='master_sorted.csv')
+    altitude_calculator.add_altitude_if_pressure_present('master_sorted.csv')
+    metrics = live_ingest.run(live_ingest.ingest_to_csv(sensor_files, 'live.csv', speed=None, max_lateness=None))
+    with open('altitude_added.csv', 'rb') as expected, open('live.csv', 'rb') as written:
+        expected_bytes = expected.read()
+        assert written.read() == expected_bytes
+    assert metrics['rows_out'] == expected_bytes.count(b'\n') - 1
+    assert (metrics['late_rows'], metrics['dropped_rows'], metrics['bad_rows'], metrics['feed_errors']) == (0, 0, 0, {})
+
+
+#test that a garbled line in a paced replay is counted as a bad row and the rest of the feed is still read.
+def test_paced_replay_skips_garbled_rows(in_tmp_path, sensor_files):
+    filenames = []
+    for filename in sensor_files:
+        with open(filename, 'r') as original_file:
+            lines = [next(original_file) for count in range(21)]
+        if filename.endswith('interior.csv'):
+            lines.insert(3, 'garbage,,,\n')
+        filenames.append(os.path.basename(filename))
+        with open(filenames[-1], 'w') as new_file:
+            new_file.writelines(lines)
+    metrics = live_ingest.run(live_ingest.ingest_to_csv(filenames, 'live.csv', speed=1e6))
+    assert metrics['bad_rows'] == 1
+    assert metrics['rows_in']['interior'] == 20
+    assert metrics['feed_errors'] == {}
+
+
+#test that a row with a garbled pressure is counted as a bad row instead of stopping the ingester.
+def test_garbled_pressure_is_a_bad_row():
+    async def go():
+        feeds = [memory_feed(['1,1,2', '4,1,2'], HEADERS[0]), memory_feed([], HEADERS[1]), memory_feed([], HEADERS[2]),
+                 memory_feed(['2,101325', '3,101x00', '5,90000'], HEADERS[3])]
+        queue = asyncio.Queue()
+        consumer = asyncio.ensure_future(consume_slowly(queue, []))
+        metrics = await live_ingest.ingest(feeds, queue)
+        return await consumer, metrics
+    rows, metrics = live_ingest.run(go())
+    assert [int(row[0]) for row in rows] == [1, 2, 4, 5]
+    assert metrics['bad_rows'] == 1
+    assert metrics['rows_in']['interior'] == 2
+    assert metrics['feed_errors'] == {}
+    altitude_position = altitude_calculator.KEYS.index('calculated_altitude')
+    assert float(rows[1][altitude_position]) == altitude_calculator.get_altitude_from_pressure(101325.0)
+
+
+#test that a feed stopped by an error other than OSError has the error recorded.
+def test_feed_errors_are_recorded():
+    async def broken_feed():
+        yield (HEADERS[1] + '\n').encode('utf-8')
+        raise RuntimeError('link lost')
+    async def go():
+        feeds = [memory_feed(['1,1,2'], HEADERS[0]), broken_feed()]
+        feeds += [memory_feed([], header) for header in HEADERS[2:]]
+        return await live_ingest.ingest(feeds, asyncio.Queue())
+    metrics = live_ingest.run(go())
+    assert metrics['feed_errors'] == {'pressure': 'RuntimeError: link lost'}
+    assert metrics['rows_out'] == 1
+
+
+#test that rows_out only counts the rows the consumer receives when the oldest rows are dropped.
+def test_drop_oldest_counts_delivered_rows():
+    rows, metrics = ingest_slowly(range(200), 'drop_oldest')
+    assert metrics['dropped_rows'] > 0
+    assert metrics['rows_out'] == len(rows)
+    assert metrics['rows_out'] + metrics['dropped_rows'] == 200
+    times = [int(row[0]) for row in rows]
+    assert times == sorted(times)
+    #the newest rows are kept.
+    assert times[-1] == 199
+
+
+#test that blocking on a full queue delivers every row in order.
+def test_block_delivers_every_row():
+    rows, metrics = ingest_slowly(range(200), 'block')
+    assert [int(row[0]) for row in rows] == list(range(200))
+    assert metrics['rows_out'] == 200
+    assert metrics['dropped_rows'] == 0
+    assert metrics['blocked_puts'] > 0
+
+
+#test that a row arriving after a later row was published is counted as late, and dropped unless drop_late is False.
+def test_late_rows_are_counted():
+    for drop_late, expected in ((True, [10, 11, 12]), (False, [10, 11, 5, 12])):
+        async def go():
+            metrics = live_ingest.new_ingest_metrics()
+            queue = asyncio.Queue()
+            feeds = [memory_feed(['10,1,2', '11,1,2'], HEADERS[0]),
+                     #the pressure rows only arrive once the geiger rows have been published.
+                     memory_feed(['5,100', '12,100'], HEADERS[1], lambda: metrics['rows_out'] >= 2)]
+            feeds += [memory_feed([], header) for header in HEADERS[2:]]
+            consumer = asyncio.ensure_future(consume_slowly(queue, []))
+            await live_ingest.ingest(feeds, queue, max_lateness=0, drop_late=drop_late, metrics=metrics)
+            return await consumer, metrics
+        rows, metrics = live_ingest.run(go())
+        assert [int(row[0]) for row in rows] == expected
+        assert metrics['late_rows'] == 1
+        assert metrics['rows_out'] == len(expected)
@@ -0,0 +1,107 @@
+'''
+    File name: test_merge_by_time.py
+    Python Version: 3.6
+    Description: Tests for merge_by_time and generate_sorted_combined_spreadsheet: the merged rows are a stable
+    sort of the streams written one after another, rows going back in time are counted for their stream, and
+    in strict mode the first of them stops the merge and no partial master file is left behind.
+'''
+
+#import csv to read the master files.
+import csv
+#import os to build the paths of the synthetic flight.
+import os
+#import shutil to copy the sensor files of the synthetic flight before editing one.
+import shutil
+
+#import pytest to check the errors raised.
+import pytest
+
+#import the module under test.
+import altitude_calculator
+#import the names of the sensor files.
+from conftest import SENSOR_NAMES
+
+
+#function to make a stream of rows with the given times, each row knowing its stream and its place in it.
+def stream_of(number, times):
+    return [{'time': repr(time), 'stream': number, 'position': position} for position, time in enumerate(times)]
+
+
+#test that rows come out in time order, with rows of the same time in the order of the streams.
+def test_merge_is_stable_sort():
+    streams = [stream_of(0, [1.0, 2.0, 2.0, 5.0]), stream_of(1, []), stream_of(2, [0.5, 2.0, 6.0]),
+               stream_of(3, [2.0])]
+    out_of_order = [0] * len(streams)
+    merged = list(altitude_calculator.merge_by_time(streams, out_of_order))
+    expected = sorted([row for stream in streams for row in stream], key=lambda row: float(row['time']))
+    assert merged == expected
+    assert [(row['stream'], row['position']) for row in merged if row['time'] == '2.0'] == [(0, 1), (0, 2), (2, 1),
+                                                                                          (3, 0)]
+    assert out_of_order == [0, 0, 0, 0]
+
+
+#test that every row with an earlier time than the row before it in its stream is counted, and still merged.
+def test_out_of_order_counts():
+    streams = [stream_of(0, [1.0, 3.0, 2.0, 2.5, 1.5]), stream_of(1, [0.0, 4.0])]
+    out_of_order = [0] * len(streams)
+    merged = list(altitude_calculator.merge_by_time(streams, out_of_order))
+    assert len(merged) == 7
+    assert out_of_order == [2, 0]
+
+
+#test that strict mode raises at the first row out of time order, without reading the rest of the streams.
+def test_strict_merge_stops_at_first_out_of_order_row():
+    read = []
+
+    #function to make a stream remembering how far it was read.
+    def recorded(times):
+        for row in stream_of(0, times):
+            read.append(row['position'])
+            yield row
+    out_of_order = [0]
+    with pytest.raises(ValueError):
+        list(altitude_calculator.merge_by_time([recorded([1.0, 2.0, 1.5, 3.0, 4.0, 0.5])], out_of_order, strict=True))
+    assert read == [0, 1, 2]
+    assert out_of_order == [1]
+
+
+#function to copy the sensor files of the synthetic flight into the working directory, swapping two rows in the
+#middle of interior.csv if unsorted is True.
+#returns the filenames of the copies in the order of SENSOR_NAMES.
+def copy_sensor_files(flight_directory, unsorted):
+    filenames = [name + '.csv' for name in SENSOR_NAMES]
+    for filename in filenames:
+        shutil.copy(os.path.join(flight_directory, filename), filename)
+    if unsorted:
+        with open('interior.csv', 'r') as interior_file:
+            lines = interior_file.readlines()
+        middle = len(lines) // 2
+        lines[middle], lines[middle + 1] = lines[middle + 1], lines[middle]
+        with open('interior.csv', 'w') as interior_file:
+            interior_file.writelines(lines)
+    return filenames
+
+
+#test that the sorted master file of the synthetic flight is the combined master file sorted by time
+#(a stable sort, so rows of the same time are in the order of the sensor files).
+def test_sorted_spreadsheet_matches_sorted_combined(in_tmp_path, flight_directory):
+    filenames = copy_sensor_files(flight_directory, False)
+    report = altitude_calculator.generate_sorted_combined_spreadsheet(*filenames, output_name='sorted.csv')
+    assert report == dict((filename, 0) for filename in filenames)
+    altitude_calculator.generate_combined_spreadsheet(*filenames)
+    with open('master_unprocessed.csv', 'r') as combined_file, open('sorted.csv', 'r') as sorted_file:
+        combined = list(csv.reader(combined_file))
+        merged = list(csv.reader(sorted_file))
+    assert merged[0] == combined[0] == altitude_calculator.KEYS
+    time_position = altitude_calculator.KEYS.index('time')
+    assert merged[1:] == sorted(combined[1:], key=lambda row: float(row[time_position]))
+
+
+#test that an unsorted sensor file is counted, and in strict mode raises naming it and leaves no master file.
+def test_unsorted_file_is_reported(in_tmp_path, flight_directory):
+    filenames = copy_sensor_files(flight_directory, True)
+    report = altitude_calculator.generate_sorted_combined_spreadsheet(*filenames, output_name='sorted.csv')
+    assert report == {'geiger.csv': 0, 'pressure.csv': 0, 'gps.csv': 0, 'interior.csv': 1}
+    with pytest.raises(ValueError, match='not sorted by time: interior.csv$'):
+        altitude_calculator.generate_sorted_combined_spreadsheet(*filenames, output_name='strict.csv', strict=True)
+    assert not os.path.exists('strict.csv')
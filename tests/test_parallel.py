@@ -0,0 +1,55 @@
+'''
+    File name: test_parallel.py
+    Python Version: 3.6
+    Description: Regression tests for parallel.py: filling a master file one range of rows per process writes
+    exactly what fill_in_missing_data writes in a single pass, however small the ranges are and however
+    sparse the columns (the geiger and anemometer columns of the synthetic flight have a value in fewer
+    than one row in a hundred, so most ranges have to start from values found several ranges back).
+'''
+
+#import os to build the paths of the synthetic flight.
+import os
+
+#import pytest to run each split of the file as its own test.
+import pytest
+
+#import the modules under test.
+import altitude_calculator
+import parallel
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#test that the parallel fill matches the serial fill for ranges of several sizes, scanning back from the end of
+#each range from a few lines up to more than the whole range, on one process and on several.
+@pytest.mark.parametrize('chunk_bytes, overlap_bytes', ((8 * 1024, 512), (8 * 1024, 64 * 1024), (100 * 1024, 4096),
+                                                        (10 * 1024 * 1024, parallel.OVERLAP_BYTES)))
+@pytest.mark.parametrize('workers', (1, 3))
+def test_parallel_fill_matches_serial_fill(chunk_bytes, overlap_bytes, workers, in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    altitude_calculator.fill_in_missing_data(added, 'serial.csv')
+    parallel.parallel_fill_in_missing_data(added, 'parallel.csv', workers, chunk_bytes, overlap_bytes)
+    expected = read_bytes('serial.csv')
+    assert expected.count(b'\n') > 1000
+    assert read_bytes('parallel.csv') == expected
+    #the partial outputs are removed.
+    assert sorted(os.listdir('.')) == ['parallel.csv', 'serial.csv']
+
+
+#test that the last values found for each range by scanning backwards are the last values of each column in it.
+def test_last_values_in_range(flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    with open(added, 'rb') as data_file:
+        header = data_file.readline().decode('utf-8').strip().split(',')
+        header_end = data_file.tell()
+        for start, end in parallel.split_into_ranges(added, header_end, 16 * 1024):
+            expected = {}
+            for row in parallel.read_rows_between(data_file, header, start, end):
+                for key in header:
+                    if key != 'time' and len(row[key]) > 0:
+                        expected[key] = (row[key], float(row['time']))
+            assert parallel.last_values_in_range(added, start, end, overlap_bytes=256) == expected
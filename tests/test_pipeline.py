@@ -0,0 +1,39 @@
+'''
+    File name: test_pipeline.py
+    Python Version: 3.6
+    Description: Tests for the command line of pipeline.py: an --input file keeps its own columns, and the
+    default stages write what the separate altitude, deduplication and fill functions write.
+'''
+
+#import os to build the paths of the synthetic flight.
+import os
+
+#import the modules under test.
+import altitude_calculator
+import pipeline
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#test that an --input file with columns other than KEYS is written with its own columns.
+def test_input_keeps_its_own_columns(in_tmp_path, capsys):
+    with open('filtered.csv', 'w') as new_file:
+        new_file.write('time,altitude,geiger_cpm\n1,10,\n1,10,5\n2,,6\n3,30,\n')
+    pipeline.main(['--input', 'filtered.csv', '--stages', 'dedup,fill', '--output', 'cleaned.csv'])
+    #the last row has no geiger_cpm at or after it, so the fill drops it like fill_in_missing_data would.
+    assert read_bytes('cleaned.csv') == b'time,altitude,geiger_cpm\r\n1,10,6\r\n2,10,6\r\n'
+    assert 'wrote 2 rows to cleaned.csv' in capsys.readouterr().out
+
+
+#test that the default stages from a master file write what the separate functions write.
+def test_input_matches_separate_steps(in_tmp_path, flight_directory, capsys):
+    master = os.path.join(flight_directory, 'master_sorted.csv')
+    altitude_calculator.add_altitude_if_pressure_present(master)
+    altitude_calculator.time_based_deduplicate_csv('altitude_added.csv', 'time_deduped.csv')
+    altitude_calculator.fill_in_missing_data('time_deduped.csv', 'filled.csv')
+    pipeline.main(['--input', master, '--output', 'cleaned.csv'])
+    assert read_bytes('cleaned.csv') == read_bytes('filled.csv')
@@ -0,0 +1,92 @@
+'''
+    File name: test_resample.py
+    Python Version: 3.6
+    Description: Tests for resample.py: every level of a pyramid is byte for byte the CSV resample_file writes
+    at its interval (the means don't depend on how the values were grouped into bins), and a pyramid built
+    with levels of its own is read rather than built again.
+'''
+
+#import shutil to copy the synthetic flight before editing it.
+import shutil
+#import os to build the paths of the synthetic flight and the pyramids.
+import os
+
+#import pytest to run each set of levels as its own test.
+import pytest
+
+#import the module under test.
+import resample
+
+
+#function to read the bytes of a file.
+def read_bytes(filename):
+    with open(filename, 'rb') as original_file:
+        return original_file.read()
+
+
+#test that every level of the pyramid of the synthetic flight matches resample_file at its interval.
+@pytest.mark.parametrize('levels', (resample.LEVELS, (2, 6, 30, 90, 1800)))
+def test_levels_match_resample_file(levels, in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    manifest = resample.build_pyramid(added, 'pyramid', levels)
+    for level in manifest['levels']:
+        count = resample.resample_file(added, level['interval'], 'single.csv')
+        assert count == level['rows']
+        assert read_bytes(os.path.join('pyramid', level['filename'])) == read_bytes('single.csv')
+
+
+#test that the means of values that lose precision when added one at a time, and of infinite and nan values,
+#are the same in the pyramid and from resample_file.
+def test_levels_match_resample_file_on_edge_cases(in_tmp_path):
+    with open('edge.csv', 'w') as new_file:
+        new_file.write('time,small,special\n')
+        for index in range(120):
+            small = ['0.1', '1e16', '-1e16', '0.7', '3.3e-5'][index % 5]
+            special = ['1', 'inf', '-inf', 'nan', ''][index % 5] if index < 60 else ['1', 'inf', '2'][index % 3]
+            new_file.write('%s,%s,%s\n' % (index * 0.5, small, special))
+    manifest = resample.build_pyramid('edge.csv', 'pyramid', (1, 5, 20, 60))
+    for level in manifest['levels']:
+        resample.resample_file('edge.csv', level['interval'], 'single.csv')
+        assert read_bytes(os.path.join('pyramid', level['filename'])) == read_bytes('single.csv')
+
+
+#test that reading a pyramid built with levels of its own doesn't build it again.
+def test_custom_levels_are_not_rebuilt(in_tmp_path, flight_directory):
+    added = os.path.join(flight_directory, 'altitude_added.csv')
+    levels = [5, 50, 500]
+    resample.build_pyramid(added, 'pyramid', levels)
+    manifest_path = os.path.join('pyramid', resample.MANIFEST_NAME)
+    modified = os.path.getmtime(manifest_path)
+    os.utime(manifest_path, (modified - 100, modified - 100))
+    rows = list(resample.pyramid_rows(added, max_rows=100, directory='pyramid'))
+    assert 0 < len(rows) <= 100
+    assert resample.load_pyramid(added, 'pyramid')['levels'][0]['interval'] == 5
+    assert os.path.getmtime(manifest_path) == modified - 100
+    #asking for other levels does build it again.
+    assert [level['interval'] for level in resample.load_pyramid(added, 'pyramid', [10, 100])['levels']] == [10, 100]
+
+
+#test that a pyramid is built again when its CSV is edited in place without changing its size.
+def test_edit_in_place_rebuilds(in_tmp_path, flight_directory):
+    shutil.copy(os.path.join(flight_directory, 'altitude_added.csv'), 'added.csv')
+    os.utime('added.csv', (1000000000, 1000000000))
+    resample.build_pyramid('added.csv', 'pyramid', (10, 60))
+    with open('added.csv', 'rb') as data_file:
+        data = data_file.read()
+    #change the first digit of a measurement in a row in the middle of the file.
+    line_start = data.index(b'\n', len(data) // 2) + 1
+    header = data[:data.index(b'\n')].decode('utf-8').split(',')
+    line_end = data.index(b'\n', line_start)
+    cells = data[line_start:line_end].decode('utf-8').split(',')
+    column = next(position for position, cell in enumerate(cells) if len(cell) > 0 and cell[0] in '123456789'
+                  and header[position] != 'time')
+    cells[column] = str(int(cells[column][0]) % 9 + 1) + cells[column][1:]
+    edited = data[:line_start] + ','.join(cells).encode('utf-8') + data[line_end:]
+    assert len(edited) == len(data) and edited != data
+    with open('added.csv', 'wb') as data_file:
+        data_file.write(edited)
+    os.utime('added.csv', (1000000100, 1000000100))
+    manifest = resample.load_pyramid('added.csv', 'pyramid')
+    for level in manifest['levels']:
+        resample.resample_file('added.csv', level['interval'], 'single.csv')
+        assert read_bytes(os.path.join('pyramid', level['filename'])) == read_bytes('single.csv')
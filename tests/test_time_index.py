@@ -0,0 +1,111 @@
+'''
+    File name: test_time_index.py
+    Python Version: 3.6
+    Description: Tests for time_index.py: an index is current for an unchanged CSV, is extended when rows are
+    appended and is built again when the CSV is rewritten (even keeping its size), and range queries give
+    the same rows as reading the whole CSV.
+'''
+
+#import csv to read the test CSV without the index.
+import csv
+#import os to set the modification time of the test CSV.
+import os
+
+#import pytest to run each range as its own test.
+import pytest
+
+#import the module under test.
+import time_index
+
+
+#function to write the test CSV: rows at times 0, 0.5, 1, ... with two rows at every tenth time.
+#arg rows: the number of times.
+#arg first: the first time (as a number of half seconds).
+#arg mode: 'w' to write a new CSV with its header or 'a' to append rows to it.
+#arg value: the text the value of every row starts with.
+def write_rows(rows, first=0, mode='w', value='v'):
+    with open('data.csv', mode) as data_file:
+        if mode == 'w':
+            data_file.write('time,value\n')
+        for half_seconds in range(first, first + rows):
+            data_file.write('%r,%s%d\n' % (half_seconds / 2.0, value, half_seconds))
+            if half_seconds % 10 == 0:
+                data_file.write('%r,%s%d\n' % (half_seconds / 2.0, value, half_seconds))
+
+
+#function to set the modification time of the test CSV.
+def set_mtime(mtime):
+    os.utime('data.csv', (mtime, mtime))
+
+
+#function to read the rows of the test CSV from start to end without the index.
+def rows_between(start, end):
+    with open('data.csv', 'r') as data_file:
+        return [row for row in csv.DictReader(data_file)
+                if (start is None or float(row['time']) >= start) and (end is None or float(row['time']) <= end)]
+
+
+#test that range queries give the rows reading the whole CSV gives, including ranges starting on a repeated time.
+@pytest.mark.parametrize('start, end', ((None, None), (None, 3.0), (5.0, None), (5.0, 5.0), (4.75, 20.25),
+                                        (-1.0, 0.0), (500.0, 600.0), (10.0, 9.0)))
+def test_range_queries(start, end, in_tmp_path):
+    write_rows(300)
+    index = time_index.build_index('data.csv', every=7)
+    assert index['rows'] == 330
+    assert list(time_index.time_range_rows('data.csv', start, end)) == rows_between(start, end)
+    assert time_index.write_time_range('data.csv', start, end, 'range.csv') == len(rows_between(start, end))
+
+
+#test that an unchanged CSV is current and its index is loaded as it was saved.
+def test_unchanged_is_current(in_tmp_path):
+    write_rows(100)
+    index = time_index.build_index('data.csv', every=10)
+    assert time_index.index_status('data.csv', index) == 'current'
+    assert time_index.load_index('data.csv') == index
+
+
+#test that rows appended to the CSV (including a line still being written) are indexed without building it again.
+def test_appended_is_extended(in_tmp_path):
+    write_rows(100)
+    time_index.build_index('data.csv', every=10)
+    write_rows(50, first=100, mode='a')
+    with open('data.csv', 'a') as data_file:
+        data_file.write('80.0,partial')
+    index = time_index.load_index('data.csv')
+    assert index['rows'] == 165
+    assert index['last_time'] == 74.5
+    assert list(time_index.time_range_rows('data.csv', 45.0, 60.0)) == rows_between(45.0, 60.0)
+
+
+#function to rewrite the middle of the test CSV, well away from its first and last CHECK_BYTES, keeping its size:
+#the rows between two times move by a byte (a value one character longer, then one a character shorter).
+def rewrite_middle():
+    with open('data.csv', 'r') as data_file:
+        text = data_file.read()
+    text = text.replace('\n400.0,v800\n', '\n400.0,vv800\n', 1).replace('\n500.0,v1000\n', '\n500.0,v100\n', 1)
+    with open('data.csv', 'w') as data_file:
+        data_file.write(text)
+
+
+#test that a CSV rewritten in the middle with the same size (and the same first and last bytes) is stale.
+def test_same_size_rewrite_is_stale(in_tmp_path):
+    write_rows(2000)
+    size = os.path.getsize('data.csv')
+    set_mtime(1000000000)
+    index = time_index.build_index('data.csv', every=10)
+    rewrite_middle()
+    set_mtime(1000000100)
+    assert os.path.getsize('data.csv') == size
+    assert time_index.index_status('data.csv', index) == 'stale'
+    assert list(time_index.time_range_rows('data.csv', 450.0, 455.0)) == rows_between(450.0, 455.0)
+    assert time_index.index_status('data.csv', time_index.load_index('data.csv')) == 'current'
+
+
+#test that a CSV rewritten in the middle before rows were appended to it is stale, even though it has grown.
+def test_rewrite_then_append_is_stale(in_tmp_path):
+    write_rows(2000)
+    index = time_index.build_index('data.csv', every=10)
+    rewrite_middle()
+    write_rows(10, first=2000, mode='a')
+    assert time_index.index_status('data.csv', index) == 'stale'
+    assert list(time_index.time_range_rows('data.csv', 450.0, 455.0)) == rows_between(450.0, 455.0)
@@ -0,0 +1,247 @@
+'''
+    File name: time_index.py
+    Python Version: 3.6
+    Description: Provides a sparse index of the times in a time sorted CSV (such as altitude_added.csv
+    or time_deduped.csv) so that a slice of time, like the ten minutes either side of the burst, can be
+    read by seeking straight to it instead of reading the file from the start.
+
+    The index records the time and byte offset of every INDEX_EVERY-th row in a JSON sidecar file next
+    to the CSV (the CSV's filename followed by .index). A range query looks up the last indexed row
+    before the start of the range, seeks to it and reads rows until the end of the range, so at most
+    INDEX_EVERY rows before the range are read. The rows come out as dictionaries, the same as
+    csv.DictReader, so they can be passed straight to the row functions, for example:
+    altitude_calculator.filter_rows(time_range_rows('altitude_added.csv', burst - 600, burst + 600), keys)
+
+    The sidecar remembers how much of the CSV it covers, the modification time of the CSV and hashes of
+    the first and last bytes of that part. If the CSV has only been appended to, the index is brought up
+    to date by reading just the new rows; if it was changed in any other way the index is stale and is
+    built again. A CSV that is the same size but has a new modification time is treated as rewritten.
+    A CSV that has grown has every indexed row checked: each must still start a line at its offset with
+    its time, so a rewrite that moved the rows before appending is noticed too. The one change that
+    can't be seen is a rewrite keeping the size, the first and last bytes and the modification time
+    (which some copying tools, such as cp -p and rsync -t, set back).
+'''
+
+#import bisect to find the indexed row before a time.
+import bisect
+#import the python CSV module to parse the rows.
+import csv
+#import hashlib to check that the part of the CSV covered by the index hasn't changed.
+import hashlib
+#import json to store the index.
+import json
+#import os to check the size of the CSV and replace the sidecar file.
+import os
+
+#the default number of rows between indexed rows.
+INDEX_EVERY = 1000
+#the number of bytes at the start and end of the indexed part of the CSV that are hashed to detect changes.
+CHECK_BYTES = 4096
+#the extension added to the filename of a CSV for its index.
+INDEX_EXTENSION = '.index'
+
+
+#function to get the path of the index of a CSV.
+def index_path_for(filename):
+    return filename + INDEX_EXTENSION
+
+
+#function to get the SHA-1 hash of the bytes of a file between two offsets.
+def hash_bytes(data_file, start, end):
+    data_file.seek(start)
+    return hashlib.sha1(data_file.read(end - start)).hexdigest()
+
+
+#function to record the hashes of the first and last CHECK_BYTES of the indexed part of a CSV in its index,
+#along with the modification time of the CSV.
+def update_hashes(data_file, index):
+    index['mtime'] = os.fstat(data_file.fileno()).st_mtime
+    index['head_sha1'] = hash_bytes(data_file, 0, min(index['size'], CHECK_BYTES))
+    index['tail_sha1'] = hash_bytes(data_file, max(0, index['size'] - CHECK_BYTES), index['size'])
+
+
+#function to create an empty index of a CSV, reading just its header.
+#arg filename: the filename of the CSV.
+#arg every: the number of rows between indexed rows.
+def new_index(filename, every=INDEX_EVERY):
+    with open(filename, 'rb') as data_file:
+        header = data_file.readline()
+    fieldnames = next(csv.reader([header.decode('utf-8')]), [])
+    if 'time' not in fieldnames:
+        raise ValueError(filename + ' has no time column')
+    return {
+        'source': os.path.abspath(filename),
+        'every': every,
+        'fieldnames': fieldnames,
+        'time_column': fieldnames.index('time'),
+        #the offset of the first row (after the header).
+        'header_end': len(header),
+        #the number of bytes of the CSV covered by the index (always the end of a complete line).
+        'size': len(header),
+        #the number of rows covered by the index and the time of the last of them.
+        'rows': 0,
+        'last_time': None,
+        #[time, offset] of every every-th row.
+        'entries': [],
+    }
+
+
+#function to add the rows of a CSV after the part covered by an index to the index.
+#only complete lines are indexed, so a row still being written is left for the next update.
+#arg data_file: the CSV opened in binary mode.
+#arg index: the index (updated in place).
+#raises ValueError if the rows aren't sorted by time.
+def extend_index(data_file, index):
+    data_file.seek(index['size'])
+    time_column = index['time_column']
+    for line in data_file:
+        if not line.endswith(b'\n'):
+            break
+        row = next(csv.reader([line.decode('utf-8')]), [])
+        if len(row) > 0:
+            time = float(row[time_column])
+            if index['last_time'] is not None and time < index['last_time']:
+                raise ValueError('%s is not sorted by time at offset %d' % (index['source'], index['size']))
+            if index['rows'] % index['every'] == 0:
+                index['entries'].append([time, index['size']])
+            index['rows'] += 1
+            index['last_time'] = time
+        index['size'] += len(line)
+    update_hashes(data_file, index)
+
+
+#function to check that every indexed row of a CSV still starts a line at its offset and has its time.
+#arg data_file: the CSV opened in binary mode.
+#arg index: the index.
+def entries_match(data_file, index):
+    for time, offset in index.get('entries', []):
+        #the byte before the row must end the line before it.
+        data_file.seek(offset - 1)
+        if data_file.read(1) != b'\n':
+            return False
+        row = next(csv.reader([data_file.readline().decode('utf-8', 'replace')]), [])
+        try:
+            if float(row[index['time_column']]) != time:
+                return False
+        except (IndexError, ValueError):
+            return False
+    return True
+
+
+#function to check an index (or the manifest of a resample.py pyramid) against its CSV.
+#returns 'current' if the index covers the whole CSV, 'appended' if rows have only been added to the end
+#of the CSV since it was indexed, or 'stale' if the CSV was changed in any other way.
+def index_status(filename, index):
+    if index['source'] != os.path.abspath(filename):
+        return 'stale'
+    statistics = os.stat(filename)
+    if statistics.st_size < index['size']:
+        return 'stale'
+    #a CSV of the same size with a new modification time has been rewritten (or at least touched).
+    if statistics.st_size == index['size'] and statistics.st_mtime != index.get('mtime'):
+        return 'stale'
+    with open(filename, 'rb') as data_file:
+        if hash_bytes(data_file, 0, min(index['size'], CHECK_BYTES)) != index['head_sha1'] or \
+                hash_bytes(data_file, max(0, index['size'] - CHECK_BYTES), index['size']) != index['tail_sha1']:
+            return 'stale'
+        if statistics.st_size == index['size']:
+            return 'current'
+        #appending changes the modification time as well, so check that the rows indexed haven't moved.
+        if not entries_match(data_file, index):
+            return 'stale'
+    return 'appended'
+
+
+#function to write an index to its sidecar file without ever leaving a half written index behind.
+def save_index(index, index_path):
+    temporary_path = index_path + '.tmp'
+    with open(temporary_path, 'w') as index_file:
+        json.dump(index, index_file)
+    os.rename(temporary_path, index_path)
+
+
+#function to build the index of a CSV from scratch and save it.
+#arg filename: the filename of a time sorted CSV.
+#arg every: the number of rows between indexed rows.
+#arg index_path: the sidecar file to save it to (next to the CSV by default).
+def build_index(filename, every=INDEX_EVERY, index_path=None):
+    index = new_index(filename, every)
+    with open(filename, 'rb') as data_file:
+        extend_index(data_file, index)
+    save_index(index, index_path if index_path is not None else index_path_for(filename))
+    return index
+
+
+#function to get an up to date index of a CSV, building it if there isn't one or it is stale and
+#indexing just the new rows if the CSV has been appended to.
+#arg filename: the filename of a time sorted CSV.
+#arg every: the number of rows between indexed rows for a new index.
+#arg index_path: the sidecar file of the index (next to the CSV by default).
+def load_index(filename, every=INDEX_EVERY, index_path=None):
+    if index_path is None:
+        index_path = index_path_for(filename)
+    if not os.path.exists(index_path):
+        return build_index(filename, every, index_path)
+    with open(index_path, 'r') as index_file:
+        index = json.load(index_file)
+    status = index_status(filename, index)
+    if status == 'stale':
+        return build_index(filename, index['every'], index_path)
+    if status == 'appended':
+        with open(filename, 'rb') as data_file:
+            extend_index(data_file, index)
+        save_index(index, index_path)
+    return index
+
+
+#function to find the offset to start reading from to find every row at or after a time.
+#arg index: the index of the CSV.
+#arg start: the time, or None for the first row.
+def start_offset(index, start):
+    if start is None:
+        return index['header_end']
+    times = [time for time, offset in index['entries']]
+    #the last indexed row before start (rows at start itself may come before an indexed row with the same time).
+    position = bisect.bisect_left(times, start) - 1
+    if position < 0:
+        return index['header_end']
+    return index['entries'][position][1]
+
+
+#function to read the rows of a time sorted CSV with times from start to end (inclusive).
+#arg filename: the filename of the CSV.
+#arg start: the earliest time to include, or None to start from the first row.
+#arg end: the latest time to include, or None to read to the end of the file.
+#arg index: the index to use (by default the index is loaded, and built or updated if necessary).
+#yields each row as a dictionary, like csv.DictReader.
+def time_range_rows(filename, start=None, end=None, index=None):
+    if index is None:
+        index = load_index(filename)
+    fieldnames = index['fieldnames']
+    with open(filename, 'rb') as data_file:
+        data_file.seek(start_offset(index, start))
+        lines = (line.decode('utf-8') for line in data_file)
+        for row in csv.DictReader(lines, fieldnames):
+            time = float(row['time'])
+            if start is not None and time < start:
+                continue
+            if end is not None and time > end:
+                return
+            yield row
+
+
+#function to write the rows of a time sorted CSV from start to end (inclusive) to a new CSV with the same columns.
+#arg filename: the filename of the CSV.
+#arg start, end: the range of time (see time_range_rows).
+#arg output_name: the filename of the CSV to create.
+#returns the number of rows written.
+def write_time_range(filename, start, end, output_name):
+    index = load_index(filename)
+    count = 0
+    with open(output_name, 'w') as out_file:
+        writer = csv.DictWriter(out_file, index['fieldnames'])
+        writer.writeheader()
+        for row in time_range_rows(filename, start, end, index):
+            writer.writerow(row)
+            count += 1
+    return count